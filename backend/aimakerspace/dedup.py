@@ -0,0 +1,113 @@
+import re
+import zlib
+from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"\w+")
+# Mersenne prime for the universal hash family; hashes stay below 2**31
+_PRIME = (1 << 31) - 1
+
+T = TypeVar("T")
+
+
+class MinHashDeduplicator(Generic[T]):
+    """
+    Detects near-duplicate texts with MinHash signatures and LSH banding.
+
+    Each text is reduced to the set of its word shingles, and a signature
+    of num_perm minimum hashes estimates the Jaccard similarity of two such
+    sets by the fraction of positions where they agree. Signatures are cut
+    into bands; texts sharing any band are candidates, and a candidate is a
+    duplicate if its estimated similarity reaches threshold. Lookups cost a
+    few dict probes however many texts have been seen.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+        self._payloads: List[T] = []
+        self.texts_seen = 0
+        self.duplicates_found = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {" ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        return ((self._a * hashes[np.newaxis, :] + self._b) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def find(self, text: str) -> Tuple[Optional[T], np.ndarray]:
+        """
+        Look up a near-duplicate of text among the texts added so far.
+
+        :return: The payload of the most similar duplicate, or None, and
+            the text's signature for a following add()
+        """
+        signature = self.signature(text)
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+        return (self._payloads[best] if best is not None else None), signature
+
+    def add(self, signature: np.ndarray, payload: T):
+        """Register a text, by the signature find() returned, as a possible original"""
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        self._payloads.append(payload)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, []).append(index)
+
+    def check(self, text: str, payload: T) -> Optional[T]:
+        """
+        Return the payload of a near-duplicate of text, or register text
+        under payload and return None.
+        """
+        self.texts_seen += 1
+        original, signature = self.find(text)
+        if original is not None:
+            self.duplicates_found += 1
+            return original
+        self.add(signature, payload)
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "texts_seen": self.texts_seen,
+            "duplicates_found": self.duplicates_found,
+            "unique_texts": len(self._signatures),
+        }
@@ -0,0 +1,259 @@
+"""
+Builds persistent indices for a directory of documents, off the request path.
+
+PDFs and .txt files are parsed across a process pool and embedded with
+bounded concurrency into indices laid out like the server's index store,
+each under the id the server gives an upload with the same content. With
+the default output directory, the server serves them by that id and
+deduplicates later uploads of the same files onto them.
+
+A manifest of each file's mtime, size and content hash makes re-runs
+process only new or changed files.
+
+    python -m backend.aimakerspace.index build <dir> [--out DIR]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from backend.aimakerspace.dedup import MinHashDeduplicator
+from backend.aimakerspace.index_store import IndexStore
+from backend.aimakerspace.ingestion import IngestionPipeline
+from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
+from backend.aimakerspace.text_utils import PDFLoader, TextFileLoader
+from backend.aimakerspace.vectordatabase import VectorDatabase
+from backend.app.core.config import settings
+from backend.app.core.indexing import content_index_id, create_text_splitter, page_hash
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+DOCUMENT_SUFFIXES = (".pdf", ".txt")
+HASH_READ_BYTES = 1024 * 1024
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_READ_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_file(path: str) -> Tuple[List[str], Dict[int, str]]:
+    """
+    Extracts a document's pages and the pages skipped while doing so.
+
+    Module-level so it can run in a worker process; a .txt file is one page.
+    """
+    if path.lower().endswith(".txt"):
+        return TextFileLoader(path).load_documents(), {}
+    loader = PDFLoader(
+        path,
+        page_timeout=settings.pdf_page_timeout_seconds or None,
+        document_timeout=settings.pdf_document_timeout_seconds or None
+    )
+    return loader.load_documents(), loader.skipped_pages
+
+
+def load_manifest(out: Path) -> Dict[str, Dict[str, Any]]:
+    path = out / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def save_manifest(out: Path, files: Dict[str, Dict[str, Any]]):
+    out.mkdir(parents=True, exist_ok=True)
+    tmp_path = out / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, out / MANIFEST_NAME)
+
+
+class DirectoryIndexer:
+    """
+    Indexes every document under a directory into an index store.
+
+    Files whose mtime and size match the manifest are skipped without being
+    read; the rest are hashed, and only those whose content has no index
+    yet are parsed and embedded. At most workers + concurrency documents
+    are held in memory at once.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        out: Path,
+        executor: Executor,
+        workers: int = 1,
+        concurrency: int = 2,
+        embedding_model_factory: Callable[[], EmbeddingModel] = None,
+    ):
+        self.root = Path(root)
+        self.out = Path(out)
+        self.executor = executor
+        self.workers = workers
+        self.concurrency = concurrency
+        self.embedding_model_factory = embedding_model_factory or (
+            lambda: EmbeddingModel(embeddings_model_name=settings.embedding_model)
+        )
+        self.store = IndexStore(self.out, max_resident_bytes=0)
+        self.manifest = load_manifest(self.out)
+        # Index id -> task building it, so files with equal content embed once
+        self._builds: Dict[str, asyncio.Task] = {}
+        self.stats = {"unchanged": 0, "indexed": 0, "reused": 0, "failed": 0, "removed": 0}
+
+    def documents(self) -> List[Path]:
+        return sorted(
+            path for path in self.root.rglob("*")
+            if path.is_file() and path.suffix.lower() in DOCUMENT_SUFFIXES
+        )
+
+    async def build(self) -> Dict[str, int]:
+        paths = self.documents()
+        names = {path.relative_to(self.root).as_posix() for path in paths}
+        for name in [name for name in self.manifest if name not in names]:
+            # Its index stays: uploads of the same content may still use it
+            del self.manifest[name]
+            self.stats["removed"] += 1
+
+        in_memory = asyncio.Semaphore(self.workers + self.concurrency)
+        embedding = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._index_file(path, in_memory, embedding) for path in paths))
+        save_manifest(self.out, self.manifest)
+        return self.stats
+
+    async def _index_file(self, path: Path, in_memory: asyncio.Semaphore, embedding: asyncio.Semaphore):
+        loop = asyncio.get_running_loop()
+        name = path.relative_to(self.root).as_posix()
+        stat = path.stat()
+        entry = self.manifest.get(name)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size \
+                and self.store.contains(entry["index_id"]):
+            self.stats["unchanged"] += 1
+            return
+
+        async with in_memory:
+            try:
+                content_hash = await loop.run_in_executor(None, file_hash, path)
+                index_id = content_index_id(content_hash)
+                build = self._builds.get(index_id)
+                if build is None and not self.store.contains(index_id):
+                    build = self._builds[index_id] = asyncio.ensure_future(
+                        self._build(path, name, index_id, embedding)
+                    )
+                    await build
+                    self.stats["indexed"] += 1
+                else:
+                    if build is not None:
+                        await build
+                    self.stats["reused"] += 1
+            except Exception as e:
+                logger.error(f"Failed to index {name}: {e}")
+                self.stats["failed"] += 1
+                return
+
+        self.manifest[name] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": content_hash,
+            "index_id": index_id,
+        }
+        # Keep progress if a long run is interrupted
+        save_manifest(self.out, self.manifest)
+
+    async def _build(self, path: Path, name: str, index_id: str, embedding: asyncio.Semaphore):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        pages, skipped_pages = await loop.run_in_executor(self.executor, parse_file, str(path))
+        async with embedding:
+            metadata = await self._embed(path, index_id, pages, skipped_pages)
+        logger.info(
+            f"Indexed {name}: {metadata['chunk_count']} chunks from "
+            f"{metadata['page_count']} pages in {time.perf_counter() - started:.1f}s"
+        )
+
+    async def _embed(
+        self,
+        path: Path,
+        index_id: str,
+        pages: List[str],
+        skipped_pages: Dict[int, str]
+    ) -> Dict[str, Any]:
+        embedding_model = self.embedding_model_factory()
+        vector_db = VectorDatabase(embedding_model=embedding_model)
+
+        def make_metadata(page: int, chunk_idx: int, total_chunks: int) -> Dict[str, Any]:
+            # Same chunk metadata as server uploads, so the index is served alike
+            return {
+                "index_id": index_id,
+                "page": page,
+                "chunk_id": f"{index_id}_p{page}_c{chunk_idx}",
+                "chunk_index": chunk_idx,
+                "total_chunks": total_chunks
+            }
+
+        pipeline = IngestionPipeline(
+            create_text_splitter(),
+            embedding_model,
+            batch_size=settings.embedding_batch_size,
+            max_concurrent_batches=settings.embedding_concurrency,
+            deduplicator=(
+                MinHashDeduplicator(threshold=settings.dedup_threshold)
+                if settings.dedup_chunks else None
+            )
+        )
+        stats = await pipeline.run(iter(pages), vector_db, make_metadata)
+        if not vector_db.count():
+            raise ValueError("No content extracted")
+
+        metadata = {
+            "filename": path.name,
+            "page_count": len(pages),
+            "chunk_count": vector_db.count(),
+            "page_hashes": [page_hash(text) for text in pages],
+            "deduplicated_chunks": stats["chunks_deduplicated"],
+            "skipped_pages": [
+                {"page": page, "reason": reason} for page, reason in skipped_pages.items()
+            ],
+            "status": "indexed"
+        }
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.store.save, index_id, vector_db, metadata)
+        return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index new and changed documents under a directory")
+    build.add_argument("directory", type=Path)
+    build.add_argument(
+        "--out", type=Path, default=Path(settings.upload_dir) / "indices",
+        help="Index store directory (default: the server's)"
+    )
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parsing processes")
+    build.add_argument("--concurrency", type=int, default=2, help="Documents embedded at once")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        indexer = DirectoryIndexer(
+            args.directory, args.out, executor, workers=args.workers, concurrency=args.concurrency
+        )
+        stats = asyncio.run(indexer.build())
+    print(", ".join(f"{count} {name}" for name, count in stats.items()))
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
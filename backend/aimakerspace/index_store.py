@@ -0,0 +1,163 @@
+"""
+Disk-backed store for document vector indices
+Indices are persisted under a root directory, loaded on first use and
+kept in memory within a byte budget, least recently used first out
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from backend.aimakerspace.vectordatabase import VectorDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class IndexStore:
+    """Persistent vector indices with LRU memory residency"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_resident_bytes: int = 512 * 1024 * 1024,
+        executor: Optional[Executor] = None
+    ):
+        self.root = Path(root)
+        self.max_resident_bytes = max_resident_bytes
+        # Runs aget's loads from disk; None uses the event loop's default executor
+        self.executor = executor
+        self.resident: "OrderedDict[str, VectorDatabase]" = OrderedDict()
+        self.resident_sizes: Dict[str, int] = {}
+        self.resident_bytes = 0
+        # Metadata of resident indices; the rest stays in file.json on disk
+        self.file_metadata: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _index_dir(self, file_id: str) -> Path:
+        # file_ids are generated uuids, but never let one escape the root
+        return self.root / Path(file_id).name
+
+    def save(self, file_id: str, vector_db: VectorDatabase, metadata: Dict[str, Any]):
+        """Persist an index with its file metadata and keep it resident"""
+        index_dir = self._index_dir(file_id)
+        vector_db.save(str(index_dir))
+        with open(index_dir / "file.json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+
+        with self._lock:
+            self._make_resident(file_id, vector_db)
+            self.file_metadata[file_id] = metadata
+
+    def get(self, file_id: str) -> Optional[VectorDatabase]:
+        """Get an index, loading it from disk if it is not resident"""
+        with self._lock:
+            vector_db = self._get_resident(file_id)
+            if vector_db is not None:
+                return vector_db
+            index_dir = self._index_dir(file_id)
+            if not (index_dir / "index.json").exists():
+                return None
+
+        # Parse outside the lock, so lookups of resident indices never wait on a load
+        vector_db = VectorDatabase.load(str(index_dir))
+        with self._lock:
+            resident = self._get_resident(file_id)
+            if resident is not None:
+                # Loaded meanwhile by another caller
+                return resident
+            if not (index_dir / "index.json").exists():
+                # Deleted meanwhile
+                return None
+            self.loads += 1
+            logger.info(f"Loaded index from disk: {file_id}")
+            self._make_resident(file_id, vector_db)
+            return vector_db
+
+    async def aget(self, file_id: str) -> Optional[VectorDatabase]:
+        """Get an index from the event loop, loading it on the executor if needed"""
+        with self._lock:
+            vector_db = self._get_resident(file_id)
+        if vector_db is not None:
+            return vector_db
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.get, file_id)
+
+    def _get_resident(self, file_id: str) -> Optional[VectorDatabase]:
+        vector_db = self.resident.get(file_id)
+        if vector_db is not None:
+            self.resident.move_to_end(file_id)
+            self.hits += 1
+        return vector_db
+
+    def get_metadata(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Get a document's file metadata, reading it from disk if needed"""
+        with self._lock:
+            metadata = self.file_metadata.get(file_id)
+            if metadata is not None:
+                return metadata
+
+            metadata_path = self._index_dir(file_id) / "file.json"
+            if not metadata_path.exists():
+                return None
+            with open(metadata_path, encoding="utf-8") as f:
+                metadata = json.load(f)
+            # Kept in memory only alongside its index
+            if file_id in self.resident:
+                self.file_metadata[file_id] = metadata
+            return metadata
+
+    def contains(self, file_id: str) -> bool:
+        return file_id in self.resident or (self._index_dir(file_id) / "index.json").exists()
+
+    def delete(self, file_id: str):
+        """Remove an index from memory and disk"""
+        with self._lock:
+            self._evict(file_id)
+            shutil.rmtree(self._index_dir(file_id), ignore_errors=True)
+
+    def _make_resident(self, file_id: str, vector_db: VectorDatabase):
+        self._evict(file_id)
+        size = vector_db.nbytes()
+        self.resident[file_id] = vector_db
+        self.resident_sizes[file_id] = size
+        self.resident_bytes += size
+
+        # Evict least recently used indices, but always keep the newest one
+        while self.resident_bytes > self.max_resident_bytes and len(self.resident) > 1:
+            oldest = next(iter(self.resident))
+            self._evict(oldest)
+            self.evictions += 1
+            logger.info(f"Evicted index from memory: {oldest}")
+
+    def _evict(self, file_id: str):
+        self.file_metadata.pop(file_id, None)
+        if self.resident.pop(file_id, None) is not None:
+            self.resident_bytes -= self.resident_sizes.pop(file_id, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get residency statistics"""
+        on_disk = (
+            sum(1 for entry in os.scandir(self.root) if entry.is_dir() and not entry.name.startswith("."))
+            if self.root.exists() else 0
+        )
+        lookups = self.hits + self.loads
+        return {
+            "indices_on_disk": on_disk,
+            "resident_indices": len(self.resident),
+            "resident_bytes": self.resident_bytes,
+            "max_resident_bytes": self.max_resident_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
@@ -0,0 +1,206 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from backend.aimakerspace.dedup import MinHashDeduplicator
+from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
+from backend.aimakerspace.openai_utils.tokens import estimate_tokens
+from backend.aimakerspace.text_utils import (
+    ChunkSpan,
+    CharacterTextSplitter,
+    DocumentText,
+    RecursiveTextSplitter,
+)
+from backend.aimakerspace.vectordatabase import VectorDatabase
+
+_DONE = object()
+
+MetadataFactory = Callable[[int, int, int], Dict[str, Any]]
+
+
+def default_metadata(page: int, chunk_index: int, total_chunks: int) -> Dict[str, Any]:
+    return {"page": page, "chunk_index": chunk_index, "total_chunks": total_chunks}
+
+
+class IngestionPipeline:
+    """
+    Streams pages through splitting and embedding into a VectorDatabase.
+
+    Pages are pulled from a (blocking) iterator in an executor thread, split
+    into chunks, grouped into embedding batches and embedded by a few
+    concurrent workers. Each stage hands off through a bounded queue, so
+    parsing, splitting and embedding overlap while a slow stage holds the
+    earlier ones back instead of letting work pile up in memory.
+
+    Chunks travel and are stored as (page, start, end) spans; their text is
+    only sliced out of the page for the embedding request.
+
+    With a deduplicator, near-duplicate chunks (running headers, licence
+    boilerplate, repeated reference fragments) are not embedded: each is
+    recorded under "duplicates" in the metadata of the first chunk like it,
+    which holds the only vector row for all of them.
+    """
+
+    def __init__(
+        self,
+        splitter: Union[CharacterTextSplitter, RecursiveTextSplitter],
+        embedding_model: EmbeddingModel,
+        batch_size: int = 64,
+        max_concurrent_batches: int = 2,
+        max_queued_pages: int = 8,
+        executor: Optional[Executor] = None,
+        deduplicator: Optional[MinHashDeduplicator] = None,
+    ):
+        self.splitter = splitter
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_queued_pages = max_queued_pages
+        self.executor = executor
+        self.deduplicator = deduplicator
+        self.pages_parsed = 0
+        self.chunks_created = 0
+        self.chunks_deduplicated = 0
+        self.embedding_tokens_saved = 0
+        self.vector_nbytes = 0
+        self.chunks_embedded = 0
+        self.batches_embedded = 0
+        self.parsing_done = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pages_parsed": self.pages_parsed,
+            "parsing_done": self.parsing_done,
+            "chunks_created": self.chunks_created,
+            "chunks_embedded": self.chunks_embedded,
+            "batches_embedded": self.batches_embedded,
+            "chunks_deduplicated": self.chunks_deduplicated,
+            "embedding_tokens_saved": self.embedding_tokens_saved,
+            "index_bytes_saved": self.chunks_deduplicated * self.vector_nbytes,
+        }
+
+    async def run(
+        self,
+        pages: Iterator[str],
+        vector_db: VectorDatabase,
+        make_metadata: MetadataFactory = default_metadata,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ingest pages into vector_db, appending vectors as batches complete.
+
+        :param pages: Page texts in page order; page numbers start at 1
+        :param vector_db: Database receiving each chunk with its metadata,
+            keyed by span, and the pages as its document
+        :param make_metadata: Builds a chunk's metadata from its page number,
+            index within the page and the page's chunk count
+        :param on_progress: Called with get_stats() after each parsed page and
+            each embedded batch
+        :return: Final pipeline statistics
+        """
+        loop = asyncio.get_running_loop()
+        page_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queued_pages)
+        batch_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrent_batches)
+        page_texts: List[str] = []
+
+        def report():
+            if on_progress is not None:
+                on_progress(self.get_stats())
+
+        async def parse():
+            iterator = iter(pages)
+            try:
+                while True:
+                    # The loader blocks on PDF parsing, so pull pages off-loop
+                    text = await loop.run_in_executor(self.executor, next, iterator, _DONE)
+                    if text is _DONE:
+                        break
+                    page_texts.append(text)
+                    self.pages_parsed += 1
+                    report()
+                    await page_queue.put((self.pages_parsed, text))
+            finally:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    try:
+                        close()
+                    except ValueError:
+                        # Still running in the executor after cancellation
+                        pass
+            self.parsing_done = True
+            report()
+            await page_queue.put(_DONE)
+
+        def find_duplicates(text: str, chunks: List[Tuple[ChunkSpan, Dict[str, Any]]]) -> List[bool]:
+            duplicates = []
+            for (_, start, end), metadata in chunks:
+                original = self.deduplicator.check(text[start:end], metadata)
+                if original is not None:
+                    original.setdefault("duplicates", []).append(
+                        {**metadata, "start": start, "end": end}
+                    )
+                    self.embedding_tokens_saved += estimate_tokens(text[start:end])
+                duplicates.append(original is not None)
+            return duplicates
+
+        async def split():
+            batch: List[Tuple[ChunkSpan, Dict[str, Any]]] = []
+            while True:
+                item = await page_queue.get()
+                if item is _DONE:
+                    break
+                page, text = item
+                offsets = self.splitter.split_offsets(text)
+                chunks = [
+                    ((page, start, end), make_metadata(page, chunk_index, len(offsets)))
+                    for chunk_index, (start, end) in enumerate(offsets)
+                ]
+                if self.deduplicator is not None:
+                    # MinHash is CPU work; keep it off the event loop
+                    duplicates = await loop.run_in_executor(
+                        self.executor, find_duplicates, text, chunks
+                    )
+                    self.chunks_deduplicated += sum(duplicates)
+                    chunks = [chunk for chunk, duplicate in zip(chunks, duplicates) if not duplicate]
+                for chunk in chunks:
+                    batch.append(chunk)
+                    self.chunks_created += 1
+                    if len(batch) >= self.batch_size:
+                        await batch_queue.put(batch)
+                        batch = []
+            if batch:
+                await batch_queue.put(batch)
+            for _ in range(self.max_concurrent_batches):
+                await batch_queue.put(_DONE)
+
+        async def embed():
+            while True:
+                batch = await batch_queue.get()
+                if batch is _DONE:
+                    break
+                texts = [page_texts[page - 1][start:end] for (page, start, end), _ in batch]
+                embeddings = await self.embedding_model.async_get_embeddings(texts)
+                for (span, metadata), embedding in zip(batch, embeddings):
+                    vector = np.array(embedding)
+                    self.vector_nbytes = vector.nbytes
+                    vector_db.insert(span, vector, metadata)
+                self.chunks_embedded += len(batch)
+                self.batches_embedded += 1
+                report()
+
+        tasks = [asyncio.ensure_future(parse()), asyncio.ensure_future(split())]
+        tasks.extend(
+            asyncio.ensure_future(embed()) for _ in range(self.max_concurrent_batches)
+        )
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # A failed stage stops the others; their queues would never drain
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        vector_db.document = DocumentText.from_pages(page_texts)
+        return self.get_stats()
@@ -5,12 +5,30 @@ import os
 load_dotenv()
 
 
+def usage_to_dict(usage) -> dict:
+    """Normalizes an OpenAI usage object, including cached prompt tokens."""
+    if usage is None:
+        return {}
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) if details else None
+
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "total_tokens": usage.total_tokens or 0,
+        "cached_tokens": cached_tokens or 0,
+    }
+
+
 class ChatOpenAI:
     def __init__(self, model_name: str = "gpt-4.1-mini"):
         self.model_name = model_name
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         if self.openai_api_key is None:
             raise ValueError("OPENAI_API_KEY is not set")
+        # Usage of the most recent run or astream call
+        self.last_usage = {}
 
     def run(self, messages, text_only: bool = True, **kwargs):
         if not isinstance(messages, list):
@@ -20,18 +38,38 @@ class ChatOpenAI:
         response = client.chat.completions.create(
             model=self.model_name, messages=messages, **kwargs
         )
+        self.last_usage = usage_to_dict(getattr(response, "usage", None))
 
         if text_only:
             return response.choices[0].message.content
 
         return response
-    
+
+    async def arun(self, messages, text_only: bool = True, **kwargs):
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        client = AsyncOpenAI()
+        response = await client.chat.completions.create(
+            model=self.model_name, messages=messages, **kwargs
+        )
+        self.last_usage = usage_to_dict(getattr(response, "usage", None))
+
+        if text_only:
+            return response.choices[0].message.content
+
+        return response
+
     async def astream(self, messages, **kwargs):
         if not isinstance(messages, list):
             raise ValueError("messages must be a list")
         
         client = AsyncOpenAI()
+        self.last_usage = {}
+        # The final chunk carries token usage for the whole stream
+        kwargs.setdefault("stream_options", {"include_usage": True})
 
+        stream = None
         try:
             # Need to await here - streaming returns an AsyncStream after awaiting
             stream = await client.chat.completions.create(
@@ -42,6 +80,8 @@ class ChatOpenAI:
             )
 
             async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    self.last_usage = usage_to_dict(chunk.usage)
                 if chunk.choices and len(chunk.choices) > 0:
                     content = chunk.choices[0].delta.content
                     if content is not None:
@@ -50,3 +90,8 @@ class ChatOpenAI:
             # Log the error but don't raise it - let the caller handle it
             print(f"OpenAI streaming error: {type(e).__name__}: {str(e)}")
             raise
+        finally:
+            # Runs when the caller stops early too (aclose or cancellation),
+            # so an abandoned stream stops generating tokens upstream
+            if stream is not None:
+                await stream.close()
@@ -19,11 +19,26 @@ class EmbeddingModel:
             )
         openai.api_key = self.openai_api_key
         self.embeddings_model_name = embeddings_model_name
+        # Token usage of the most recent call, and across all calls
+        self.last_usage = {}
+        self.tokens_used = 0
+
+    def _record_usage(self, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            self.last_usage = {}
+            return
+        self.last_usage = {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "total_tokens": usage.total_tokens or 0,
+        }
+        self.tokens_used += self.last_usage["total_tokens"]
 
     async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
         embedding_response = await self.async_client.embeddings.create(
             input=list_of_text, model=self.embeddings_model_name
         )
+        self._record_usage(embedding_response)
 
         return [embeddings.embedding for embeddings in embedding_response.data]
 
@@ -31,6 +46,7 @@ class EmbeddingModel:
         embedding = await self.async_client.embeddings.create(
             input=text, model=self.embeddings_model_name
         )
+        self._record_usage(embedding)
 
         return embedding.data[0].embedding
 
@@ -38,6 +54,7 @@ class EmbeddingModel:
         embedding_response = self.client.embeddings.create(
             input=list_of_text, model=self.embeddings_model_name
         )
+        self._record_usage(embedding_response)
 
         return [embeddings.embedding for embeddings in embedding_response.data]
 
@@ -45,6 +62,7 @@ class EmbeddingModel:
         embedding = self.client.embeddings.create(
             input=text, model=self.embeddings_model_name
         )
+        self._record_usage(embedding)
 
         return embedding.data[0].embedding
 
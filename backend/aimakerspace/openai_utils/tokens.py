@@ -0,0 +1,80 @@
+import math
+import re
+from typing import Dict, List
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Per-message overhead of the chat format, and tokens priming the reply
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a string without a tokenizer.
+
+    English prose averages about four characters per token, while code,
+    numbers and punctuation split into more tokens than their length suggests,
+    so the larger of the two counts is used.
+
+    :param text: The text to estimate
+    :return: Estimated token count
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), len(_TOKEN_PATTERN.findall(text)))
+
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Estimates the prompt tokens of a list of chat messages.
+
+    :param messages: Messages with 'role' and 'content' keys
+    :return: Estimated token count including chat format overhead
+    """
+    total = REPLY_PRIMING_TOKENS
+    for message in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content") or "")
+    return total
+
+
+def estimate_usage(prompt_tokens: int, completion: str) -> Dict[str, int]:
+    """
+    Estimates the usage of a streamed completion cut short before the API
+    reported it.
+
+    :param prompt_tokens: Prompt tokens sent
+    :param completion: The text received so far
+    :return: Usage in the shape of the API's usage counts
+    """
+    completion_tokens = estimate_tokens(completion)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Truncates text so its estimated token count fits within max_tokens.
+
+    :param text: The text to truncate
+    :param max_tokens: Token budget
+    :return: The longest prefix of text, cut at a word boundary where possible
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    end = max_tokens * 4
+    while end > 0 and estimate_tokens(text[:end]) > max_tokens:
+        end = int(end * 0.9)
+
+    cut = text.rfind(" ", 0, end)
+    return text[: cut if cut > 0 else end]
+
+
+if __name__ == "__main__":
+    print(estimate_tokens("Hello, world!"))
+    print(estimate_message_tokens([{"role": "user", "content": "Hello, world!"}]))
+    print(truncate_to_tokens("The quick brown fox jumps over the lazy dog", 5))
@@ -0,0 +1,150 @@
+"""
+Compares text splitters on chunk count, embedding tokens and retrieval hit-rate.
+
+Questions are half the words of sentences sampled from the document; a
+question is a hit when one of the top-k retrieved chunks contains its whole
+sentence. Chunks are embedded with a local hashed bag-of-words model by
+default, so the benchmark runs offline; pass --openai to use the embedding
+API instead.
+
+    python -m backend.aimakerspace.splitter_benchmark [document.pdf|.txt]
+"""
+import argparse
+import asyncio
+import random
+import re
+import time
+import zlib
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from backend.aimakerspace.openai_utils.tokens import estimate_tokens
+from backend.aimakerspace.text_utils import (
+    CharacterTextSplitter,
+    PDFLoader,
+    RecursiveTextSplitter,
+    TextFileLoader,
+)
+
+_WORD_PATTERN = re.compile(r"\w+")
+_SENTENCE_PATTERN = re.compile(r"[^.!?\n]{40,300}[.!?]")
+
+Embed = Callable[[List[str]], List[np.ndarray]]
+
+
+def hashed_embeddings(texts: List[str], dimensions: int = 1024) -> List[np.ndarray]:
+    """Bag-of-words vectors with words hashed into a fixed number of buckets."""
+    vectors = []
+    for text in texts:
+        vector = np.zeros(dimensions)
+        for word in _WORD_PATTERN.findall(text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % dimensions] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def openai_embeddings(texts: List[str]) -> List[np.ndarray]:
+    from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
+
+    embeddings = asyncio.run(EmbeddingModel().async_get_embeddings(texts))
+    return [np.asarray(embedding) for embedding in embeddings]
+
+
+def sample_questions(pages: Sequence[str], count: int, seed: int = 0) -> List[str]:
+    sentences = [
+        match.group(0).strip()
+        for page in pages
+        for match in _SENTENCE_PATTERN.finditer(page)
+    ]
+    random.Random(seed).shuffle(sentences)
+    return sentences[:count]
+
+
+def synthetic_document(pages: int = 40, seed: int = 0) -> List[str]:
+    """Pages of paragraphs of varied sentences, for runs without a document."""
+    rng = random.Random(seed)
+    vocabulary = [f"term{index}" for index in range(500)]
+    result = []
+    for _ in range(pages):
+        paragraphs = []
+        for _ in range(rng.randint(3, 7)):
+            sentences = [
+                " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 30))).capitalize() + "."
+                for _ in range(rng.randint(2, 9))
+            ]
+            paragraphs.append(" ".join(sentences))
+        result.append("\n\n".join(paragraphs))
+    return result
+
+
+def as_query(sentence: str, rng: random.Random) -> str:
+    words = sentence.split()
+    return " ".join(rng.sample(words, max(1, len(words) // 2)))
+
+
+def evaluate(splitter, pages: Sequence[str], questions: List[str], embed: Embed, k: int) -> Dict[str, float]:
+    started = time.perf_counter()
+    chunks = [chunk for page in pages for chunk in splitter.split(page)]
+    split_seconds = time.perf_counter() - started
+
+    matrix = np.stack(embed(chunks))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    rng = random.Random(0)
+    queries = [as_query(question, rng) for question in questions]
+    hits = 0
+    for question, query in zip(questions, embed(queries)):
+        scores = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+        top = np.argsort(scores)[::-1][:k]
+        hits += any(question in chunks[index] for index in top)
+
+    return {
+        "chunks": len(chunks),
+        "embedding_tokens": sum(estimate_tokens(chunk) for chunk in chunks),
+        "hit_rate": hits / len(questions) if questions else 0.0,
+        "split_ms": split_seconds * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", nargs="?", help="PDF or .txt document (default: synthetic)")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--chunk-overlap", type=int, default=300)
+    parser.add_argument("--chunk-tokens", type=int, default=400)
+    parser.add_argument("--overlap-tokens", type=int, default=40)
+    parser.add_argument("--openai", action="store_true", help="Embed with the OpenAI API")
+    args = parser.parse_args()
+
+    if args.path is None:
+        pages = synthetic_document()
+    elif args.path.lower().endswith(".pdf"):
+        pages = PDFLoader(args.path).load_documents()
+    else:
+        pages = TextFileLoader(args.path).load_documents()
+
+    questions = sample_questions(pages, args.questions)
+    embed = openai_embeddings if args.openai else hashed_embeddings
+    splitters = {
+        f"character {args.chunk_size}/{args.chunk_overlap}": CharacterTextSplitter(
+            args.chunk_size, args.chunk_overlap
+        ),
+        f"recursive {args.chunk_tokens}/{args.overlap_tokens} tokens": RecursiveTextSplitter(
+            args.chunk_tokens, args.overlap_tokens
+        ),
+    }
+
+    print(f"{len(pages)} pages, {len(questions)} questions, top-{args.k}")
+    print(f"{'splitter':<32}{'chunks':>8}{'tokens':>10}{'hit rate':>10}{'split ms':>10}")
+    for name, splitter in splitters.items():
+        result = evaluate(splitter, pages, questions, embed, args.k)
+        print(
+            f"{name:<32}{result['chunks']:>8}{result['embedding_tokens']:>10}"
+            f"{result['hit_rate']:>10.1%}{result['split_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,35 @@
+import codecs
+import contextlib
+import io
+import math
+import mmap
+import multiprocessing
 import os
-from typing import List
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing.connection import Connection, wait
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import PyPDF2
 
+from backend.aimakerspace.openai_utils.tokens import estimate_tokens
+
+# Bytes of a text file decoded at a time when streaming it
+TEXT_WINDOW_BYTES = 1024 * 1024
+
 
 class TextFileLoader:
+    """
+    Loads .txt files, or every .txt file under a directory.
+
+    load() keeps each file whole in documents. For corpora too large for
+    that, iter_windows() and iter_chunks() stream files through a memory
+    map instead, holding about one window and one chunk at a time.
+    """
+
     def __init__(self, path: str, encoding: str = "utf-8"):
         self.documents = []
         self.path = path
@@ -36,6 +62,53 @@ class TextFileLoader:
         self.load()
         return self.documents
 
+    def iter_files(self) -> Iterator[str]:
+        if os.path.isdir(self.path):
+            for root, _, files in os.walk(self.path):
+                for file in files:
+                    if file.endswith(".txt"):
+                        yield os.path.join(root, file)
+        elif os.path.isfile(self.path) and self.path.endswith(".txt"):
+            yield self.path
+        else:
+            raise ValueError(
+                "Provided path is neither a valid directory nor a .txt file."
+            )
+
+    def iter_windows(self, path: str, window_bytes: int = TEXT_WINDOW_BYTES) -> Iterator[str]:
+        """
+        Yields the text of a file in windows of about window_bytes.
+
+        The file is memory-mapped rather than read, and decoded
+        incrementally, so a character split across two windows is held
+        back and decoded with the next one.
+        """
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                # Empty files cannot be mapped
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                for offset in range(0, size, window_bytes):
+                    text = decoder.decode(mapped[offset:offset + window_bytes])
+                    if text:
+                        yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    def iter_chunks(
+        self,
+        splitter: Union["CharacterTextSplitter", "RecursiveTextSplitter"],
+        window_bytes: int = TEXT_WINDOW_BYTES,
+    ) -> Iterator[str]:
+        """Yields the chunks of every file in turn, without loading any file whole."""
+        for path in self.iter_files():
+            yield from split_stream(splitter, self.iter_windows(path, window_bytes))
+
 
 class CharacterTextSplitter:
     def __init__(
@@ -51,63 +124,572 @@ class CharacterTextSplitter:
         self.chunk_overlap = chunk_overlap
 
     def split(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the chunks split() would return, without copying them."""
+        return self.stream_offsets(text)[0]
+
+    def stream_offsets(self, text: str, resume: int = 0) -> Tuple[List[Tuple[int, int]], int, int, int]:
+        """
+        Offsets of the chunks of text from resume on, for text that more may follow.
+
+        Returns them with how many leading chunks appended text cannot
+        change, and where splitting picks up: keep text[restart:] and
+        continue the chunks at resume. Only the chunk that reaches the end
+        of text can still grow.
+        """
+        offsets = [
+            (i, min(i + self.chunk_size, len(text)))
+            for i in range(resume, len(text), self.chunk_size - self.chunk_overlap)
+        ]
+        if not offsets:
+            return offsets, 0, resume, resume
+        settled = next(index for index, (_, end) in enumerate(offsets) if end == len(text))
+        restart = offsets[settled][0]
+        return offsets, settled, restart, restart
+
+    def split_texts(self, texts: List[str]) -> List[str]:
         chunks = []
-        for i in range(0, len(text), self.chunk_size - self.chunk_overlap):
-            chunks.append(text[i : i + self.chunk_size])
+        for text in texts:
+            chunks.extend(self.split(text))
         return chunks
 
+
+class RecursiveTextSplitter:
+    """
+    Splits text into chunks of up to chunk_tokens estimated tokens at
+    natural boundaries.
+
+    Text is cut into sentences (and, for over-long sentences, words), which
+    are packed into chunks. A full chunk ends at the coarsest boundary it
+    can while staying at least MIN_FILL full: a paragraph, then a line,
+    then a sentence. Unless it ends a paragraph, the next chunk repeats its
+    last whole sentences, up to overlap_tokens.
+    """
+
+    # Paragraph, line, sentence and word boundaries, coarsest first
+    SEPARATORS = (
+        re.compile(r"\n\s*\n"),
+        re.compile(r"\n"),
+        re.compile(r"(?<=[.!?])\s+"),
+        re.compile(r"\s+"),
+    )
+    SENTENCE_LEVEL = 2
+    # Rank of a cut with no boundary, inside an over-long word
+    NO_BOUNDARY = len(SEPARATORS)
+    MIN_FILL = 0.7
+
+    def __init__(self, chunk_tokens: int = 400, overlap_tokens: int = 40):
+        assert (
+            chunk_tokens > overlap_tokens
+        ), "Chunk tokens must be greater than overlap tokens"
+
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
     def split_texts(self, texts: List[str]) -> List[str]:
         chunks = []
         for text in texts:
             chunks.extend(self.split(text))
         return chunks
 
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of the chunks of text."""
+        return self.stream_offsets(text)[0]
+
+    def stream_offsets(self, text: str, resume: int = 0) -> Tuple[List[Tuple[int, int]], int, int, int]:
+        """
+        Offsets of the chunks of text from resume on, for text that more may follow.
+
+        Returns them with how many leading chunks appended text cannot
+        change, and where splitting picks up: keep text[restart:] and
+        continue the chunks at resume. resume must be where an earlier call
+        said to continue. restart falls just after a sentence or coarser
+        boundary, since the pieces after one are cut the same however much
+        text follows.
+        """
+        pieces = self._pieces(text, 0, len(text), 0, 0)
+        tokens = [estimate_tokens(text[start:end]) for start, end, _ in pieces]
+
+        # Pieces up to the last sentence or coarser boundary that more text
+        # follows are final; later ones may still merge or split
+        text_end = len(text.rstrip())
+        stable = 0
+        for index, (_, end, rank) in enumerate(pieces):
+            if rank <= self.SENTENCE_LEVEL and end < text_end:
+                stable = index + 1
+
+        chunks = []
+        settled = 0
+        first = next((index for index, (start, _, _) in enumerate(pieces) if start >= resume), len(pieces))
+        resume_piece = first
+        while first < len(pieces):
+            # Take as many pieces as fit the budget, and at least one
+            stop = first + 1
+            total = tokens[first]
+            while stop < len(pieces) and total + tokens[stop] <= self.chunk_tokens:
+                total += tokens[stop]
+                stop += 1
+            last = stop - 1 if stop == len(pieces) else self._best_cut(pieces, tokens, first, stop, total)
+
+            start, end = pieces[first][0], pieces[last][1]
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if end > start:
+                chunks.append((start, end))
+            if last + 1 == len(pieces):
+                break
+
+            # Carry whole trailing sentences over, unless a paragraph ended here
+            next_first = last + 1
+            overlap = 0
+            while (
+                pieces[last][2] > 0
+                and next_first - 1 > first
+                and overlap + tokens[next_first - 1] <= self.overlap_tokens
+            ):
+                next_first -= 1
+                overlap += tokens[next_first]
+            # A chunk is final once every piece it was cut from is
+            if first == resume_piece and stop < stable:
+                settled = len(chunks)
+                resume_piece = next_first
+            first = next_first
+
+        if resume_piece == len(pieces):
+            return chunks, settled, len(text), len(text)
+        # Restart right after the boundary, so whitespace following it stays
+        # in the sentence it is counted in
+        restart_piece = resume_piece
+        while restart_piece > 0 and not (
+            restart_piece <= stable and pieces[restart_piece - 1][2] <= self.SENTENCE_LEVEL
+        ):
+            restart_piece -= 1
+        restart = pieces[restart_piece - 1][1] if restart_piece else 0
+        return chunks, settled, restart, pieces[resume_piece][0]
+
+    def _best_cut(self, pieces, tokens: List[int], first: int, stop: int, total: int) -> int:
+        """Index of the last piece of a full chunk, at the coarsest boundary that keeps it full enough."""
+        best = stop - 1
+        for last in range(stop - 1, first - 1, -1):
+            if total < self.chunk_tokens * self.MIN_FILL:
+                break
+            if pieces[last][2] < pieces[best][2]:
+                best = last
+            total -= tokens[last]
+        return best
+
+    def _pieces(
+        self, text: str, start: int, end: int, level: int, end_rank: int
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Cuts text[start:end] into sentences, or smaller pieces that fit the
+        budget, as (start, end, rank) where rank is the boundary ending the
+        piece: the index of its separator, or NO_BOUNDARY.
+        """
+        if level > self.SENTENCE_LEVEL and estimate_tokens(text[start:end]) <= self.chunk_tokens:
+            return [(start, end, end_rank)]
+        if level == len(self.SEPARATORS):
+            return self._hard_cut(text, start, end, end_rank)
+
+        pieces = []
+        position = start
+        for match in self.SEPARATORS[level].finditer(text, start, end):
+            if match.start() > position:
+                # Split the text before the separator, so finer separators
+                # cannot match inside this one and take over its rank
+                pieces.extend(self._pieces(text, position, match.start(), level + 1, level))
+            if pieces:
+                # Separators stay attached to the piece before them
+                piece_start, _, rank = pieces[-1]
+                pieces[-1] = (piece_start, match.end(), rank)
+            position = match.end()
+        if position < end:
+            pieces.extend(self._pieces(text, position, end, level + 1, end_rank))
+        return pieces
+
+    def _hard_cut(self, text: str, start: int, end: int, end_rank: int) -> List[Tuple[int, int, int]]:
+        # A single "word" over budget, such as a long URL or table row
+        pieces = []
+        while start < end:
+            stop = min(end, start + self.chunk_tokens * 4)
+            while stop - start > 1 and estimate_tokens(text[start:stop]) > self.chunk_tokens:
+                stop = start + (stop - start) * 3 // 4
+            pieces.append((start, stop, end_rank if stop == end else self.NO_BOUNDARY))
+            start = stop
+        return pieces
+
+
+def split_stream(
+    splitter: Union[CharacterTextSplitter, RecursiveTextSplitter], texts: Iterable[str]
+) -> Iterator[str]:
+    """
+    Splits a text that arrives in consecutive pieces, yielding its chunks.
+
+    Chunks that no later text can change are yielded as soon as they are
+    known; the rest of the text is carried into the next piece, so the
+    chunks are those of the whole text however it is cut into pieces. At
+    most about one chunk, plus the sentence it starts in, is carried.
+    """
+    carry = ""
+    resume = 0
+    for text in texts:
+        buffer = carry + text
+        offsets, settled, restart, resume = splitter.stream_offsets(buffer, resume)
+        for start, end in offsets[:settled]:
+            yield buffer[start:end]
+        carry = buffer[restart:]
+        resume -= restart
+    for start, end in splitter.stream_offsets(carry, resume)[0]:
+        yield carry[start:end]
+
+
+# A chunk as (page, start, end), with page numbers from 1 and offsets into the page
+ChunkSpan = Tuple[int, int, int]
+
+
+class DocumentText:
+    """
+    A document's page texts in a single buffer.
+
+    Chunks overlap, so storing each one as its own string holds most of the
+    text more than once. Chunks are kept as ChunkSpans instead and sliced
+    out of the buffer only when their text is needed.
+    """
+
+    def __init__(self, text: str = "", page_starts: Optional[List[int]] = None):
+        self.text = text
+        self.page_starts = page_starts or []
+
+    @classmethod
+    def from_pages(cls, pages: List[str]) -> "DocumentText":
+        page_starts = []
+        offset = 0
+        for page in pages:
+            page_starts.append(offset)
+            offset += len(page)
+        return cls("".join(pages), page_starts)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_starts)
+
+    def page_text(self, page: int) -> str:
+        start = self.page_starts[page - 1]
+        end = self.page_starts[page] if page < len(self.page_starts) else len(self.text)
+        return self.text[start:end]
+
+    def chunk_text(self, span: ChunkSpan) -> str:
+        page, start, end = span
+        page_start = self.page_starts[page - 1]
+        return self.text[page_start + start : page_start + end]
+
+
+# Below this many pages, extraction in a worker pool costs more than it saves
+MIN_PAGES_FOR_POOL = 8
+
+# In-memory PDFs are sent to pool workers as bytes up to this size; larger
+# ones are spooled to a temporary file that each worker opens instead
+MAX_IN_MEMORY_POOL_BYTES = 16 * 1024 * 1024
+
+# A PDF as a file path, its bytes, or a readable binary stream
+PDFSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+# Guarded extraction workers are spawned, not forked: a fork of a threaded
+# server inherits its locks in whatever state other threads left them
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# Guarded extraction processes alive at once, across all loaders
+_guarded_slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+
+
+def set_guarded_worker_limit(limit: int):
+    """Sets how many guarded extraction processes may run at once, across all loaders"""
+    global _guarded_slots
+    _guarded_slots = threading.BoundedSemaphore(max(1, limit))
+
+
+def open_pdf(source: PDFSource):
+    """Opens a PDF source as a binary stream, as a context manager"""
+    if isinstance(source, str):
+        return open(source, "rb")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # BytesIO shares a bytes object's buffer rather than copying it
+        return io.BytesIO(source)
+    # Streams belong to the caller and are left open
+    return contextlib.nullcontext(source)
+
+
+def extract_page_range(source: Union[str, bytes], start: int, stop: int) -> List[str]:
+    """
+    Extracts the text of pages [start, stop) of a PDF.
+
+    Module-level so it can run in a worker process; each worker opens the
+    PDF itself, so only the page texts cross back over the process boundary.
+    """
+    with open_pdf(source) as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _guarded_page_worker(source: Union[str, bytes], connection: Connection):
+    """
+    Worker process of guarded extraction: extracts the pages it is sent,
+    one at a time, until it is sent None or killed.
+    """
+    with open_pdf(source) as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        while (index := connection.recv()) is not None:
+            try:
+                connection.send((index, pdf_reader.pages[index].extract_text() or "", None))
+            except Exception as e:
+                connection.send((index, "", f"extraction failed: {e}"))
+
+
+class _GuardedWorker:
+    """A page extraction process that can be killed mid-page"""
+
+    def __init__(self, source: Union[str, bytes]):
+        self.connection, child = _MP_CONTEXT.Pipe()
+        self.process = _MP_CONTEXT.Process(
+            target=_guarded_page_worker, args=(source, child), daemon=True
+        )
+        self.process.start()
+        child.close()
+        # Page index being extracted, and when it was sent
+        self.page: Optional[int] = None
+        self.started = 0.0
+
+    def send(self, page: int):
+        self.page, self.started = page, time.monotonic()
+        self.connection.send(page)
+
+    def close(self, kill: bool = False):
+        if kill or self.page is not None:
+            self.process.kill()
+        else:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.process.join()
+        self.connection.close()
+
+
+def page_ranges(page_count: int, max_workers: int) -> List[Tuple[int, int]]:
+    """Splits pages into ranges, about two per worker so slow pages even out"""
+    size = max(1, math.ceil(page_count / (max_workers * 2)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
 
 class PDFLoader:
-    def __init__(self, path: str):
+    """
+    Loads PDFs into documents, one per page, so documents[i] is page i + 1.
+
+    The PDF can be a path or already in memory as bytes, a memoryview or a
+    binary stream, which is parsed directly without a temporary file.
+
+    With max_workers > 1, pages are extracted by ranges in parallel on the
+    given executor, or on a process pool created for the call.
+
+    With a page_timeout or document_timeout (seconds), pages are instead
+    extracted one at a time in up to max_workers dedicated processes, as
+    many as the process-wide guarded worker limit allows. A worker still
+    on a page after page_timeout is killed and replaced, and once
+    document_timeout has passed the remaining pages are abandoned. Such
+    pages load as empty text and are recorded in skipped_pages.
+
+    Without time budgets, PDFs under MIN_PAGES_FOR_POOL pages are extracted
+    in the calling process; with them, such PDFs get a single worker.
+    """
+
+    def __init__(
+        self,
+        path: PDFSource,
+        max_workers: int = 1,
+        executor: Optional[Executor] = None,
+        page_timeout: Optional[float] = None,
+        document_timeout: Optional[float] = None,
+    ):
         self.documents = []
-        self.path = path
+        self.source = path
+        self.path = path if isinstance(path, str) else "<in-memory PDF>"
+        self.max_workers = max_workers
+        self.executor = executor
+        self.page_timeout = page_timeout
+        self.document_timeout = document_timeout
+        # Page count of the file being read, known before its first page is yielded
+        self.page_count = None
+        # Reasons pages were skipped, by page number from 1
+        self.skipped_pages: Dict[int, str] = {}
 
     def load(self):
         try:
-            # Try to open the file first to verify access
-            with open(self.path, 'rb'):
-                pass
-            
-            # If we can open it, proceed with loading
             self.load_file()
-            
         except IOError as e:
             raise ValueError(f"Cannot access file at '{self.path}': {str(e)}")
         except Exception as e:
             raise ValueError(f"Error processing file at '{self.path}': {str(e)}")
 
     def load_file(self):
-        with open(self.path, 'rb') as file:
-            # Create PDF reader object
+        self.documents.extend(self.extract_pages(self.source))
+
+    def extract_pages(self, path: PDFSource) -> List[str]:
+        return list(self.iter_pages(path))
+
+    def iter_pages(self, path: Optional[PDFSource] = None) -> Iterator[str]:
+        """
+        Yields the text of each page in order, as soon as it is extracted.
+
+        Range results are yielded as they arrive, so callers can start on
+        the first pages while later ranges are still being extracted.
+        """
+        source = path if path is not None else self.source
+        guarded = self.page_timeout is not None or self.document_timeout is not None
+        with open_pdf(source) as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            
-            # Extract text from each page
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            self.documents.append(text)
+            page_count = self.page_count = len(pdf_reader.pages)
+            self.skipped_pages = {}
+
+            if not guarded and (page_count < MIN_PAGES_FOR_POOL or self.max_workers <= 1):
+                for page in pdf_reader.pages:
+                    yield page.extract_text() or ""
+                return
+
+            if not isinstance(source, str):
+                data = self._read_bytes(file)
+
+        extract = self._extract_guarded if guarded else self._extract_in_pool
+        if isinstance(source, str):
+            yield from extract(source, page_count)
+        elif len(data) <= MAX_IN_MEMORY_POOL_BYTES:
+            yield from extract(data, page_count)
+        else:
+            with tempfile.NamedTemporaryFile(suffix=".pdf") as spool:
+                spool.write(data)
+                spool.flush()
+                del data
+                yield from extract(spool.name, page_count)
+
+    @staticmethod
+    def _read_bytes(file: BinaryIO) -> bytes:
+        if isinstance(file, io.BytesIO):
+            return file.getvalue()
+        file.seek(0)
+        return file.read()
+
+    def _extract_in_pool(self, source: Union[str, bytes], page_count: int) -> Iterator[str]:
+        executor = self.executor or ProcessPoolExecutor(max_workers=self.max_workers)
+        futures = [
+            executor.submit(extract_page_range, source, start, stop)
+            for start, stop in page_ranges(page_count, self.max_workers)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            if self.executor is None:
+                executor.shutdown()
+
+    def _extract_guarded(self, source: Union[str, bytes], page_count: int) -> Iterator[str]:
+        page_timeout = self.page_timeout or math.inf
+        deadline = time.monotonic() + (self.document_timeout or math.inf)
+        # One killable worker is enough to hold the budgets for a short PDF
+        max_workers = self.max_workers if page_count >= MIN_PAGES_FOR_POOL else 1
+        queued = deque(range(page_count))
+        results: Dict[int, str] = {}
+        next_page = 0
+
+        def skip(page: int, reason: str):
+            self.skipped_pages[page + 1] = reason
+            results[page] = ""
+
+        # Wait for one worker slot, within the document budget, and take
+        # what others are free; replacements reuse the slot they replace
+        slots = _guarded_slots
+        remaining = deadline - time.monotonic()
+        if not slots.acquire(timeout=None if remaining == math.inf else max(0.0, remaining)):
+            for page in range(page_count):
+                skip(page, f"no extraction worker free within {self.document_timeout}s")
+                yield ""
+            return
+        acquired = 1
+        while acquired < min(max_workers, page_count) and slots.acquire(blocking=False):
+            acquired += 1
+
+        workers = []
+        try:
+            for _ in range(acquired):
+                workers.append(_GuardedWorker(source))
+            while next_page < page_count:
+                if next_page in results:
+                    yield results.pop(next_page)
+                    next_page += 1
+                    continue
+
+                if time.monotonic() >= deadline:
+                    for worker in workers:
+                        worker.close(kill=True)
+                    workers = []
+                    for page in range(next_page, page_count):
+                        if page not in results:
+                            skip(page, f"document time budget of {self.document_timeout}s exceeded")
+                    continue
+
+                for worker in workers:
+                    if worker.page is None and queued:
+                        worker.send(queued.popleft())
+                busy = [worker for worker in workers if worker.page is not None]
+                timeout = min([deadline] + [worker.started + page_timeout for worker in busy])
+                ready = wait(
+                    [worker.connection for worker in busy],
+                    timeout=max(0.0, timeout - time.monotonic())
+                )
+
+                now = time.monotonic()
+                for worker in busy:
+                    if worker.connection in ready:
+                        try:
+                            page, text, error = worker.connection.recv()
+                        except EOFError:
+                            # The worker died, e.g. out of memory, mid-page
+                            page, text, error = worker.page, "", "extraction worker exited"
+                        else:
+                            worker.page = None
+                        results[page] = text
+                        if error:
+                            skip(page, error)
+                    elif now - worker.started >= page_timeout:
+                        skip(worker.page, f"page time budget of {self.page_timeout}s exceeded")
+                    else:
+                        continue
+                    if worker.page is not None:
+                        # Dead or stuck: replace it for the pages still queued
+                        worker.close(kill=True)
+                        index = workers.index(worker)
+                        if queued:
+                            workers[index] = _GuardedWorker(source)
+                        else:
+                            del workers[index]
+        finally:
+            for worker in workers:
+                worker.close()
+            for _ in range(acquired):
+                slots.release()
 
     def load_directory(self):
         for root, _, files in os.walk(self.path):
             for file in files:
                 if file.lower().endswith('.pdf'):
-                    file_path = os.path.join(root, file)
-                    with open(file_path, 'rb') as f:
-                        pdf_reader = PyPDF2.PdfReader(f)
-                        
-                        # Extract text from each page
-                        text = ""
-                        for page in pdf_reader.pages:
-                            text += page.extract_text() + "\n"
-                        
-                        self.documents.append(text)
+                    self.documents.extend(self.extract_pages(os.path.join(root, file)))
 
     def load_documents(self):
         self.load()
@@ -1,7 +1,12 @@
+import json
+import os
+import shutil
+import tempfile
 import numpy as np
 from collections import defaultdict
-from typing import List, Tuple, Callable
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
 from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
+from backend.aimakerspace.text_utils import ChunkSpan, DocumentText
 import asyncio
 
 
@@ -13,26 +18,123 @@ def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
     return dot_product / (norm_a * norm_b)
 
 
+# Keys are either the chunk text itself or a span into the database's document
+Key = Union[str, ChunkSpan]
+
+
 class VectorDatabase:
     def __init__(self, embedding_model: EmbeddingModel = None):
         self.vectors = defaultdict(np.array)
-        self.embedding_model = embedding_model or EmbeddingModel()
+        # Text buffer that ChunkSpan keys point into
+        self.document: Optional[DocumentText] = None
+        # Optional per-key metadata, aligned with the insertion order of vectors
+        self.metadata: List[Dict[str, Any]] = []
+        # Deleted keys stay in place, so metadata stays aligned, until the next save
+        self.tombstones: Set[Hashable] = set()
+        self._embedding_model = embedding_model
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        # Created on first use so databases searched only by vector need no API key
+        if self._embedding_model is None:
+            self._embedding_model = EmbeddingModel()
+        return self._embedding_model
 
-    def insert(self, key: str, vector: np.array) -> None:
+    @embedding_model.setter
+    def embedding_model(self, embedding_model: EmbeddingModel) -> None:
+        self._embedding_model = embedding_model
+
+    def insert(self, key: Key, vector: np.array, metadata: Dict[str, Any] = None) -> None:
+        if key in self.tombstones:
+            # Revive a deleted key in its original slot
+            self.tombstones.discard(key)
+            if metadata is not None:
+                position = list(self.vectors).index(key)
+                if position < len(self.metadata):
+                    self.metadata[position] = metadata
+        elif metadata is not None and key not in self.vectors:
+            self.metadata.append(metadata)
         self.vectors[key] = vector
 
+    def delete(self, key: Key) -> None:
+        """Tombstones a key; it is skipped by searches and dropped on save."""
+        if key in self.vectors:
+            self.tombstones.add(key)
+
+    def _live_metadata(self) -> List[Dict[str, Any]]:
+        if not self.tombstones or len(self.metadata) != len(self.vectors):
+            return self.metadata
+        return [
+            entry for key, entry in zip(self.vectors, self.metadata)
+            if key not in self.tombstones
+        ]
+
+    def compact(self) -> None:
+        """Drops tombstoned keys and their metadata."""
+        if not self.tombstones:
+            return
+        self.metadata = self._live_metadata()
+        for key in self.tombstones:
+            del self.vectors[key]
+        self.tombstones = set()
+
+    def count(self) -> int:
+        """Number of live (not deleted) keys."""
+        return len(self.vectors) - len(self.tombstones)
+
+    def copy(self) -> "VectorDatabase":
+        """
+        Copies the database without copying the vectors themselves.
+
+        Metadata dicts are copied, so the copy can be edited and tombstoned
+        while the original is still being searched.
+        """
+        vector_db = VectorDatabase(embedding_model=self._embedding_model)
+        vector_db.document = self.document
+        vector_db.vectors.update(self.vectors)
+        vector_db.metadata = [dict(metadata) for metadata in self.metadata]
+        vector_db.tombstones = set(self.tombstones)
+        return vector_db
+
     def search(
         self,
         query_vector: np.array,
         k: int,
         distance_measure: Callable = cosine_similarity,
-    ) -> List[Tuple[str, float]]:
+    ) -> List[Tuple[Key, float]]:
+        tombstones = self.tombstones
         scores = [
             (key, distance_measure(query_vector, vector))
             for key, vector in self.vectors.items()
+            if key not in tombstones
         ]
         return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
 
+    def search_batch(self, query_vectors: np.ndarray, k: int) -> List[List[Tuple[Key, float]]]:
+        """
+        Cosine search for several queries at once.
+
+        Scores every query against every vector with one matrix product,
+        instead of one Python-level comparison per pair.
+        """
+        tombstones = self.tombstones
+        keys = [key for key in self.vectors if key not in tombstones]
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float64))
+        if not keys or not len(queries) or k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        matrix = np.stack([self.vectors[key] for key in keys]).astype(np.float64)
+        scores = queries @ matrix.T
+        scores /= np.outer(np.linalg.norm(queries, axis=1), np.linalg.norm(matrix, axis=1))
+
+        k = min(k, len(keys))
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top], kind="stable")]
+            results.append([(keys[i], float(row[i])) for i in top])
+        return results
+
     def search_by_text(
         self,
         query_text: str,
@@ -42,11 +144,82 @@ class VectorDatabase:
     ) -> List[Tuple[str, float]]:
         query_vector = self.embedding_model.get_embedding(query_text)
         results = self.search(query_vector, k, distance_measure)
-        return [result[0] for result in results] if return_as_text else results
+        return [self.text_of(result[0]) for result in results] if return_as_text else results
+
+    def text_of(self, key: Key) -> str:
+        """The text a key stands for, sliced from the document for span keys."""
+        if isinstance(key, tuple) and self.document is not None:
+            return self.document.chunk_text(key)
+        return key
 
-    def retrieve_from_key(self, key: str) -> np.array:
+    def retrieve_from_key(self, key: Key) -> np.array:
+        if key in self.tombstones:
+            return None
         return self.vectors.get(key, None)
 
+    def nbytes(self) -> int:
+        """Approximate memory held by the vectors, their keys and the document text."""
+        document_bytes = len(self.document.text) if self.document is not None else 0
+        return document_bytes + sum(
+            getattr(vector, "nbytes", 0) + (len(key) if isinstance(key, str) else 0)
+            for key, vector in self.vectors.items()
+        )
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the database to a directory as vectors.npy plus index.json.
+        Tombstoned keys are left out.
+
+        The files are written to a temporary directory first and swapped in,
+        so a crash never leaves a half-written index behind.
+        """
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_directory = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        try:
+            keys = [key for key in self.vectors if key not in self.tombstones]
+            metadata = self._live_metadata()
+            matrix = (
+                np.stack([np.asarray(self.vectors[key]) for key in keys])
+                if keys else np.zeros((0, 0))
+            )
+            np.save(os.path.join(tmp_directory, "vectors.npy"), matrix)
+            index = {
+                "keys": [list(key) if isinstance(key, tuple) else key for key in keys],
+                "metadata": metadata,
+            }
+            if self.document is not None:
+                index["document"] = {
+                    "text": self.document.text,
+                    "page_starts": self.document.page_starts,
+                }
+            with open(os.path.join(tmp_directory, "index.json"), "w", encoding="utf-8") as f:
+                json.dump(index, f)
+
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+            os.replace(tmp_directory, directory)
+        except BaseException:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, directory: str, embedding_model: EmbeddingModel = None) -> "VectorDatabase":
+        """Loads a database written by save."""
+        with open(os.path.join(directory, "index.json"), encoding="utf-8") as f:
+            index = json.load(f)
+        matrix = np.load(os.path.join(directory, "vectors.npy"))
+
+        vector_db = cls(embedding_model=embedding_model)
+        for key, vector in zip(index["keys"], matrix):
+            # JSON has no tuples; span keys come back as lists
+            vector_db.vectors[tuple(key) if isinstance(key, list) else key] = vector
+        vector_db.metadata = index["metadata"]
+        document = index.get("document")
+        if document is not None:
+            vector_db.document = DocumentText(document["text"], document["page_starts"])
+        return vector_db
+
     async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
         for text, embedding in zip(list_of_text, embeddings):
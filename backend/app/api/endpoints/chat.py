@@ -1,14 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import StreamingResponse
 from typing import AsyncGenerator, Dict
-import json
-import logging
 import asyncio
+import logging
+import time
 
 from backend.app.api.dependencies import get_api_key
-from backend.app.models.chat import ChatRequest, ChatResponse
+from backend.app.core.config import settings
+from backend.app.core.streaming import (
+    SSEFrameEncoder,
+    SSE_DONE,
+    ClientDisconnected,
+    encode_event
+)
+from backend.app.models.chat import ChatBatchRequest, ChatRequest, ChatResponse, CacheFeedbackRequest
 from backend.app.services.chat_service import ChatService
+from backend.app.services.semantic_cache import semantic_cache
 from backend.app.middleware.rate_limiter import api_key_limiter, RATE_LIMITS
+from backend.app.middleware.monitoring import stream_metrics
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -41,54 +50,69 @@ async def chat_message(
 
 @router.post("/stream")
 async def chat_stream(
+    req: Request,
     request: ChatRequest,
     api_key: str = Depends(get_api_key)
 ):
-    logger.info(f"Stream endpoint called with message: {request.message[:50]}...")
+    async def events() -> AsyncGenerator[Dict, None]:
+        nonlocal has_sent_content
+        async for chunk in chat_service.generate_stream(
+            file_id=request.file_id,
+            message=request.message,
+            history=request.history,
+            api_key=api_key
+        ):
+            if chunk.get("type") == "content":
+                has_sent_content = True
+            yield chunk
     
-    async def generate() -> AsyncGenerator[str, None]:
+    async def generate() -> AsyncGenerator[bytes, None]:
+        encoder = SSEFrameEncoder(
+            max_chars=settings.stream_coalesce_chars,
+            max_delay=settings.stream_coalesce_ms / 1000
+        )
+        started = time.time()
+        outcome = "completed"
+        stream_metrics.stream_started("chat.stream")
         try:
-            # Stream directly without collecting chunks first
-            has_sent_content = False
-            
-            async for chunk in chat_service.generate_stream(
-                file_id=request.file_id,
-                message=request.message,
-                history=request.history,
-                api_key=api_key
+            # Coalesce token deltas into Server-Sent Events frames, and stop
+            # pulling from the model as soon as the client goes away
+            async for frame in encoder.encode(
+                events(),
+                is_disconnected=req.is_disconnected,
+                poll_interval=settings.stream_disconnect_poll_ms / 1000
             ):
-                logger.info(f"Streaming chunk: type={chunk.get('type')}, content_length={len(chunk.get('content', ''))}")
-                
-                # Format as Server-Sent Events
-                data = json.dumps({
-                    "type": chunk["type"],
-                    "content": chunk.get("content", ""),
-                    "sources": chunk.get("sources", [])
-                })
-                yield f"data: {data}\n\n"
-                
-                if chunk.get("type") == "content":
-                    has_sent_content = True
-                
-                # Flush to ensure data is sent immediately
-                await asyncio.sleep(0)  # Allow other tasks to run
+                yield frame
             
             if not has_sent_content:
                 logger.error("No content chunks were sent")
                 # Add a fallback message
-                error_data = json.dumps({
+                yield encode_event({
                     "type": "content", 
                     "content": "I apologize, but I'm having trouble generating a response. Please try again."
                 })
-                yield f"data: {error_data}\n\n"
         
+        except ClientDisconnected:
+            outcome = "aborted"
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "aborted"
+            raise
         except Exception as e:
+            outcome = "failed"
             logger.error(f"Stream error: {type(e).__name__}: {str(e)}", exc_info=True)
-            error_data = json.dumps({"type": "error", "content": str(e)})
-            yield f"data: {error_data}\n\n"
+            yield encode_event({"type": "error", "content": str(e)})
         finally:
-            logger.info("Sending [DONE] signal")
-            yield "data: [DONE]\n\n"
+            stream_metrics.record_stream(
+                "chat.stream", outcome, time.time() - started, encoder.deltas_received
+            )
+            logger.info(
+                f"Stream {outcome}: {encoder.deltas_received} deltas in {encoder.frames_sent} frames"
+            )
+        
+        yield SSE_DONE
+    
+    has_sent_content = False
     
     return StreamingResponse(
         generate(),
@@ -101,6 +125,47 @@ async def chat_stream(
         }
     )
 
+@router.post("/batch")
+@api_key_limiter.limit(RATE_LIMITS["chat"])
+async def chat_batch(
+    request: Request,
+    batch: ChatBatchRequest,
+    api_key: str = Depends(get_api_key)
+):
+    if not batch.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(batch.questions) > settings.chat_batch_max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.chat_batch_max_questions} questions per batch"
+        )
+    
+    try:
+        results = await chat_service.generate_batch(
+            file_id=batch.file_id,
+            questions=batch.questions,
+            api_key=api_key
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def generate() -> AsyncGenerator[bytes, None]:
+        # One JSON line per question, in the order the answers finish
+        try:
+            async for result in results:
+                yield (result.model_dump_json() + "\n").encode("utf-8")
+        finally:
+            await results.aclose()
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Deliver each line as it is ready
+        }
+    )
+
 @router.delete("/history/{file_id}")
 async def clear_chat_history(
     file_id: str,
@@ -111,4 +176,17 @@ async def clear_chat_history(
     if not success:
         raise HTTPException(status_code=404, detail="File not found")
     
-    return {"message": "Chat history cleared successfully"}
\ No newline at end of file
+    return {"message": "Chat history cleared successfully"}
+
+@router.post("/cache/false-hit")
+async def report_cache_false_hit(
+    request: CacheFeedbackRequest,
+    api_key: str = Depends(get_api_key)
+) -> Dict[str, str]:
+    index_id = chat_service.pdf_service.resolve_index_id(request.file_id)
+    success = semantic_cache.report_false_hit(index_id, request.message)
+    
+    if not success:
+        raise HTTPException(status_code=404, detail="No recent cached answer for this question")
+    
+    return {"message": "False cache hit recorded"}
\ No newline at end of file
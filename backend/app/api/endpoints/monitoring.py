@@ -5,7 +5,20 @@ import platform
 from datetime import datetime
 
 from backend.app.api.dependencies import get_api_key
-from backend.app.middleware.monitoring import metrics_collector, performance_monitor
+from backend.app.middleware.monitoring import (
+    metrics_collector,
+    performance_monitor,
+    stream_metrics,
+    token_usage_collector
+)
+from backend.app.services.answer_cache import answer_cache
+from backend.app.services.chat_service import chat_flights
+from backend.app.services.content_registry import content_registry
+from backend.app.services.history_store import history_store
+from backend.app.services.history_summarizer import history_summarizer
+from backend.app.services.index_store import index_store
+from backend.app.services.ingestion_jobs import ingestion_jobs
+from backend.app.services.semantic_cache import semantic_cache
 
 router = APIRouter()
 
@@ -31,6 +44,28 @@ async def get_metrics(api_key: str = Depends(get_api_key)) -> Dict[str, Any]:
         "memory_usage_current_mb": psutil.Process().memory_info().rss / 1024 / 1024
     }
     
+    # Add LLM token usage metrics
+    metrics["token_usage"] = token_usage_collector.get_metrics()
+    
+    # Add streaming metrics, including streams aborted by the client
+    metrics["streams"] = stream_metrics.get_metrics()
+    
+    # Add answer cache metrics
+    metrics["answer_cache"] = answer_cache.get_stats()
+    metrics["semantic_cache"] = semantic_cache.get_stats()
+    metrics["chat_history"] = history_store.get_stats()
+    metrics["history_summaries"] = history_summarizer.get_stats()
+    metrics["chat_single_flight"] = chat_flights.get_stats()
+    
+    # Add background ingestion queue depth and job latency
+    metrics["ingestion_jobs"] = ingestion_jobs.get_stats()
+    
+    # Add index residency metrics
+    metrics["index_store"] = index_store.get_stats()
+    
+    # Add upload deduplication metrics
+    metrics["content_registry"] = content_registry.get_stats()
+    
     return metrics
 
 @router.get("/metrics/health")
@@ -72,6 +107,8 @@ async def reset_metrics(api_key: str = Depends(get_api_key)) -> Dict[str, str]:
     """Reset metrics (admin only)"""
     # In production, this should check for admin privileges
     metrics_collector.__init__()
+    token_usage_collector.__init__()
+    stream_metrics.__init__()
     performance_monitor.slow_queries.clear()
     
     return {"status": "Metrics reset successfully"}
\ No newline at end of file
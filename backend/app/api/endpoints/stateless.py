@@ -2,18 +2,27 @@
 Stateless API endpoints for Vercel deployment
 All data is returned to client, no server storage
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List, AsyncGenerator
 from pydantic import BaseModel
-import json
+import asyncio
 import logging
+import time
 
 from backend.app.api.dependencies import get_api_key
 from backend.app.services.pdf_service_stateless import stateless_pdf_service
 from backend.app.services.chat_service_stateless import stateless_chat_service
 from backend.app.models.chat import ChatMessage
 from backend.app.core.config import settings
+from backend.app.core.uploads import UPLOAD_OPENAPI, UploadTooLargeError, open_upload, receive_upload
+from backend.app.core.streaming import (
+    SSEFrameEncoder,
+    SSE_DONE,
+    ClientDisconnected,
+    encode_event
+)
+from backend.app.middleware.monitoring import stream_metrics
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -35,24 +44,29 @@ class StatelessChatRequest(BaseModel):
     chunk_metadata: List[Dict[str, Any]]
     history: List[ChatMessage] = []
 
-@router.post("/upload/process", response_model=ProcessedPDFResponse)
+@router.post("/upload/process", response_model=ProcessedPDFResponse, openapi_extra=UPLOAD_OPENAPI)
 async def process_pdf_stateless(
-    file: UploadFile = File(...),
+    request: Request,
     api_key: str = Depends(get_api_key)
 ):
     """
     Process PDF and return all data to client.
     Client stores this data for the chat session.
     """
-    # Validate file type
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    
-    # Check file size
-    contents = await file.read()
-    file_size_mb = len(contents) / (1024 * 1024)
-    
-    if file_size_mb > settings.max_upload_size_mb:
+    # Read in chunks as the body arrives, stopping as soon as the size
+    # limit is crossed
+    max_bytes = settings.max_upload_size_mb * 1024 * 1024
+    try:
+        file = await open_upload(request, max_bytes)
+        
+        # Validate file type
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+        
+        upload = await receive_upload(file, max_bytes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLargeError:
         raise HTTPException(
             status_code=413, 
             detail=f"File size exceeds maximum allowed size of {settings.max_upload_size_mb}MB"
@@ -61,7 +75,7 @@ async def process_pdf_stateless(
     try:
         # Process PDF and return all data
         result = await stateless_pdf_service.process_pdf_and_return_data(
-            file_content=contents,
+            file_content=upload.contents,
             filename=file.filename,
             api_key=api_key
         )
@@ -98,30 +112,52 @@ async def chat_stateless(
 
 @router.post("/chat/stateless/stream")
 async def chat_stateless_stream(
+    req: Request,
     request: StatelessChatRequest,
     api_key: str = Depends(get_api_key)
 ):
     """
     Streaming chat endpoint that receives all context data from client.
     """
-    async def generate() -> AsyncGenerator[str, None]:
+    async def generate() -> AsyncGenerator[bytes, None]:
+        encoder = SSEFrameEncoder(
+            max_chars=settings.stream_coalesce_chars,
+            max_delay=settings.stream_coalesce_ms / 1000
+        )
+        started = time.time()
+        outcome = "completed"
+        stream_metrics.stream_started("stateless.stream")
         try:
-            async for chunk in stateless_chat_service.generate_stream_with_context(
+            events = stateless_chat_service.generate_stream_with_context(
                 message=request.message,
                 chunks=request.chunks,
                 embeddings=request.embeddings,
                 chunk_metadata=request.chunk_metadata,
                 api_key=api_key,
                 history=request.history
+            )
+            async for frame in encoder.encode(
+                events,
+                is_disconnected=req.is_disconnected,
+                poll_interval=settings.stream_disconnect_poll_ms / 1000
             ):
-                data = json.dumps(chunk)
-                yield f"data: {data}\n\n"
+                yield frame
+        except ClientDisconnected:
+            outcome = "aborted"
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "aborted"
+            raise
         except Exception as e:
+            outcome = "failed"
             logger.error(f"Stream error: {str(e)}")
-            error_data = json.dumps({"type": "error", "content": str(e)})
-            yield f"data: {error_data}\n\n"
+            yield encode_event({"type": "error", "content": str(e)})
         finally:
-            yield "data: [DONE]\n\n"
+            stream_metrics.record_stream(
+                "stateless.stream", outcome, time.time() - started, encoder.deltas_received
+            )
+        
+        yield SSE_DONE
     
     return StreamingResponse(
         generate(),
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import JSONResponse
+from typing import Dict, Any, Optional
 import logging
 from pathlib import Path
 
 from backend.app.core.config import settings
+from backend.app.core.uploads import UPLOAD_OPENAPI, UploadTooLargeError, open_upload, receive_upload
 from backend.app.api.dependencies import get_api_key
 from backend.app.services import pdf_service_instance
-from backend.app.models.upload import UploadResponse
+from backend.app.models.upload import UploadResponse, UploadAcceptedResponse
+from backend.app.services.ingestion_jobs import IngestionJob, QueueFullError, ingestion_jobs
 from backend.app.middleware.rate_limiter import api_key_limiter, RATE_LIMITS
 from backend.app.middleware.request_validator import sanitize_filename
 
@@ -15,13 +18,30 @@ router = APIRouter()
 
 pdf_service = pdf_service_instance
 
-@router.post("/pdf", response_model=UploadResponse)
+@router.post("/pdf", response_model=UploadResponse, openapi_extra=UPLOAD_OPENAPI)
 @api_key_limiter.limit(RATE_LIMITS["upload"])
 async def upload_pdf(
     request: Request,
-    file: UploadFile = File(...),
+    background: Optional[bool] = Query(
+        None, description="Return 202 and index in the background (defaults to ASYNC_UPLOADS)"
+    ),
+    revision_of: Optional[str] = Query(
+        None, description="file_id this PDF is a new version of; only changed pages are re-embedded"
+    ),
     api_key: str = Depends(get_api_key)
 ) -> UploadResponse:
+    # Read the multipart body as it arrives, up to the start of the file
+    max_bytes = settings.max_upload_size_mb * 1024 * 1024
+    try:
+        file = await open_upload(request, max_bytes)
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File size exceeds maximum allowed size of {settings.max_upload_size_mb}MB"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Sanitize filename
     safe_filename = sanitize_filename(file.filename) if file.filename else "unknown.pdf"
     
@@ -29,47 +49,109 @@ async def upload_pdf(
     if not safe_filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Check file size
-    contents = await file.read()
-    file_size_mb = len(contents) / (1024 * 1024)
+    # Create upload directory if it doesn't exist
+    upload_dir = Path(settings.upload_dir)
+    upload_dir.mkdir(exist_ok=True)
     
-    if file_size_mb > settings.max_upload_size_mb:
+    if revision_of is not None:
+        # A new version keeps its file_id
+        if pdf_service.get_file_status(revision_of) is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        file_id = revision_of
+    else:
+        # Save file with unique name
+        file_id = pdf_service.generate_file_id()
+    file_path = upload_dir / f"{file_id}.pdf"
+    # Received and indexed under a temporary name, so a revision that fails
+    # never replaces the current version while its index is still served
+    part_path = upload_dir / f"{file_id}.pdf.part"
+    
+    # Stream the upload to disk, hashing it as it arrives
+    try:
+        upload = await receive_upload(file, max_bytes, destination=part_path)
+    except UploadTooLargeError:
         raise HTTPException(
             status_code=413, 
             detail=f"File size exceeds maximum allowed size of {settings.max_upload_size_mb}MB"
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    content_hash = upload.content_hash
     
-    # Create upload directory if it doesn't exist
-    upload_dir = Path(settings.upload_dir)
-    upload_dir.mkdir(exist_ok=True)
-    
-    # Save file with unique name
-    file_id = pdf_service.generate_file_id()
-    file_path = upload_dir / f"{file_id}.pdf"
+    # Identical content is already indexed: share its index
+    index_id = pdf_service.find_index(content_hash)
+    if index_id:
+        metadata = pdf_service.register_duplicate(file_id, index_id)
+        part_path.replace(file_path)
+        return UploadResponse(
+            file_id=file_id,
+            filename=file.filename,
+            size_bytes=upload.size_bytes,
+            page_count=metadata["page_count"],
+            chunk_count=metadata["chunk_count"],
+            message="PDF uploaded and indexed successfully"
+        )
     
     try:
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        if background if background is not None else settings.async_uploads:
+            # Index in the background; progress is reported by the status endpoint
+            ingestion_jobs.submit(
+                IngestionJob(
+                    file_id,
+                    part_path,
+                    safe_filename,
+                    upload.size_bytes,
+                    api_key,
+                    content_hash,
+                    revision=revision_of is not None,
+                    destination=file_path
+                )
+            )
+            logger.info(f"Queued PDF for background indexing: {file_id}")
+            
+            accepted = UploadAcceptedResponse(
+                file_id=file_id,
+                job_id=file_id,
+                filename=file.filename,
+                size_bytes=upload.size_bytes,
+                status="queued",
+                status_url=str(request.url_for("get_upload_status", file_id=file_id)),
+                message="PDF uploaded and queued for indexing"
+            )
+            return JSONResponse(status_code=202, content=accepted.model_dump())
         
         # Process and index the PDF
-        metadata = await pdf_service.process_pdf(file_path, file_id, api_key)
+        metadata = await pdf_service.process_pdf(
+            part_path,
+            file_id,
+            api_key,
+            content_hash=content_hash,
+            filename=safe_filename,
+            revision=revision_of is not None
+        )
+        # Save file
+        part_path.replace(file_path)
         
         logger.info(f"Successfully uploaded and processed PDF: {file_id}")
         
         return UploadResponse(
             file_id=file_id,
             filename=file.filename,
-            size_bytes=len(contents),
+            size_bytes=upload.size_bytes,
             page_count=metadata["page_count"],
             chunk_count=metadata["chunk_count"],
             message="PDF uploaded and indexed successfully"
         )
         
+    except QueueFullError as e:
+        if part_path.exists():
+            part_path.unlink()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
     except Exception as e:
-        # Clean up file if processing failed
-        if file_path.exists():
-            file_path.unlink()
+        # Clean up file if processing failed; a revised file keeps its
+        # previous version
+        if part_path.exists():
+            part_path.unlink()
         
         logger.error(f"Failed to process PDF: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to process PDF")
@@ -80,8 +162,28 @@ async def get_upload_status(
     api_key: str = Depends(get_api_key)
 ) -> Dict[str, Any]:
     status = pdf_service.get_file_status(file_id)
+    job_status = ingestion_jobs.get_status(file_id)
+    
+    if not status and not job_status:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    if job_status:
+        if status and job_status["stage"] not in ("indexed", "failed"):
+            # A new version is being indexed; the current one stays searchable
+            return {**status, "revision": job_status}
+        # Indexed file metadata takes precedence over job progress
+        return {**job_status, **(status or {})}
+    
+    return status
+
+@router.delete("/pdf/{file_id}")
+async def delete_pdf(
+    file_id: str,
+    api_key: str = Depends(get_api_key)
+) -> Dict[str, str]:
+    success = pdf_service.delete_file(file_id)
     
-    if not status:
+    if not success:
         raise HTTPException(status_code=404, detail="File not found")
     
-    return status
\ No newline at end of file
+    return {"message": "File deleted successfully"}
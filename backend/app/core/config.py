@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # API Keys
@@ -23,15 +23,71 @@ class Settings(BaseSettings):
     allowed_file_types: List[str] = [".pdf"]
     upload_dir: str = "uploads"
     
+    # Background Ingestion
+    async_uploads: bool = False  # Return 202 and index in the background by default
+    ingestion_workers: int = 2
+    ingestion_max_queued_jobs: int = 100
+    ingestion_max_queued_per_key: int = 10
+    
+    # PDF Extraction
+    pdf_extract_workers: int = 0  # 0 uses one worker process per CPU
+    pdf_page_timeout_seconds: float = 10.0  # Pages taking longer are skipped; 0 disables
+    pdf_document_timeout_seconds: float = 40.0  # Pages left after this are skipped; 0 disables
+    
     # Vector Database
-    chunk_size: int = 1500
+    text_splitter: str = "recursive"  # "recursive" (token budget, natural boundaries) or "character"
+    chunk_size: int = 1500  # Characters, for the character splitter
     chunk_overlap: int = 300
+    chunk_tokens: int = 400  # Estimated tokens, for the recursive splitter
+    chunk_overlap_tokens: int = 40
+    dedup_chunks: bool = True  # Embed near-duplicate chunks (MinHash) only once
+    dedup_threshold: float = 0.9  # Estimated Jaccard similarity of word shingles
     embedding_model: str = "text-embedding-3-small"
+    embedding_batch_size: int = 64
+    embedding_concurrency: int = 2
+    index_memory_budget_bytes: int = 512 * 1024 * 1024  # Indices kept in RAM; the rest stay on disk
     
     # Chat Configuration  
     chat_model: str = "gpt-4.1-mini"  # Using the latest GPT-4.1-mini model
     max_tokens: int = 2000
     temperature: float = 0.7
+    retrieval_top_k: int = 5
+    chat_batch_max_questions: int = 50  # Per /chat/batch request, embedded in one call
+    chat_batch_concurrency: int = 4  # Completions in flight per batch
+    
+    # Chat History
+    chat_history_max_turns: int = 50  # Per file; older turns are dropped
+    chat_history_max_bytes: int = 32 * 1024 * 1024  # All histories; least recently used are evicted
+    chat_history_spill_path: str = ""  # SQLite file evicted histories spill to; empty drops them
+    history_summary_enabled: bool = True  # Fold older turns into a rolling summary in the background
+    history_keep_turns: int = 3  # Latest turns always sent verbatim
+    history_summary_max_tokens: int = 300
+    history_summary_model: str = "gpt-4.1-nano"
+    
+    # Prompt Token Budgets (per chat model)
+    context_token_budgets: Dict[str, int] = {
+        "gpt-4.1-mini": 6000,
+        "gpt-4.1-nano": 3000,
+    }
+    default_context_token_budget: int = 4000
+    history_token_budgets: Dict[str, int] = {}
+    default_history_token_budget: int = 1500
+    prompt_layout: str = "prefix_cache"  # "prefix_cache" or "legacy"
+    
+    # Streaming
+    stream_coalesce_chars: int = 32
+    stream_coalesce_ms: int = 15
+    stream_log_sample_every: int = 50
+    stream_disconnect_poll_ms: int = 250
+    
+    # Answer Cache
+    answer_cache_enabled: bool = True
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_max_bytes: int = 16 * 1024 * 1024
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_max_entries_per_file: int = 256
+    semantic_cache_max_bytes: int = 16 * 1024 * 1024
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,41 @@
+"""
+Chunking and index ids shared by the server and the offline indexer
+Free of the services' module-level state, so the indexing CLI can import it
+"""
+import hashlib
+
+from backend.aimakerspace.text_utils import CharacterTextSplitter, RecursiveTextSplitter
+from backend.app.core.config import settings
+
+
+def create_text_splitter():
+    if settings.text_splitter == "character":
+        return CharacterTextSplitter(
+            chunk_size=settings.chunk_size,
+            chunk_overlap=settings.chunk_overlap
+        )
+    return RecursiveTextSplitter(
+        chunk_tokens=settings.chunk_tokens,
+        overlap_tokens=settings.chunk_overlap_tokens
+    )
+
+
+def page_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def content_index_id(content_hash: str) -> str:
+    """
+    Index id for a file's content hash.
+
+    Indices also depend on the embedding model and chunking settings, so
+    those are part of the id and a settings change never reuses a stale index.
+    """
+    if settings.text_splitter == "character":
+        chunking = f"character:{settings.chunk_size}:{settings.chunk_overlap}"
+    else:
+        chunking = f"recursive:{settings.chunk_tokens}:{settings.chunk_overlap_tokens}"
+    if settings.dedup_chunks:
+        chunking += f":dedup:{settings.dedup_threshold}"
+    key = f"{content_hash}:{settings.embedding_model}:{chunking}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
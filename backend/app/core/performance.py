@@ -5,9 +5,13 @@ from functools import wraps
 from typing import Any, Callable, TypeVar, ParamSpec
 import time
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
 import threading
 
+from backend.aimakerspace.text_utils import set_guarded_worker_limit
+from backend.app.core.config import settings
 from backend.app.middleware.monitoring import log_slow_query
 
 logger = logging.getLogger(__name__)
@@ -19,6 +23,46 @@ T = TypeVar("T")
 # Thread pool for CPU-bound operations
 thread_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cpu_worker")
 
+# Process pool for CPU-bound work that holds the GIL, such as PDF text extraction
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def process_pool_workers() -> int:
+    """Number of worker processes configured for the process pool"""
+    return settings.pdf_extract_workers or os.cpu_count() or 1
+
+# Timed-out PDF extraction runs in its own killable processes; cap them
+# across concurrent uploads like the pool
+set_guarded_worker_limit(process_pool_workers())
+
+# Threads that wait on PDF extraction, which can block for a whole
+# document's time budget; kept apart from thread_pool so waiting uploads
+# never hold up index loads and file writes. Sized like the worker limit,
+# since further waiters would only queue for a worker slot
+extraction_pool = ThreadPoolExecutor(
+    max_workers=process_pool_workers(), thread_name_prefix="pdf_extract"
+)
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool, creating it on first use"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Spawned workers don't inherit the server's threads and locks
+            _process_pool = ProcessPoolExecutor(
+                max_workers=process_pool_workers(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+def shutdown_process_pool():
+    """Shut down the shared process pool if it was started"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(cancel_futures=True)
+            _process_pool = None
+
 def measure_performance(operation_name: str):
     """Decorator to measure and log performance of operations"""
     def decorator(func: Callable[P, T]) -> Callable[P, T]:
@@ -0,0 +1,145 @@
+"""Coalescing of identical in-flight calls and event streams"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class _Failure:
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class _Call:
+    """One upstream call and the number of callers waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamFlight:
+    """
+    One upstream event stream fanned out to subscriber queues.
+
+    Events already produced are kept so that a subscriber joining late
+    still receives the whole stream.
+    """
+
+    def __init__(self, events: AsyncIterator[Any]):
+        self.events: List[Any] = []
+        self.queues: List[asyncio.Queue] = []
+        # _END or a _Failure, once the upstream has finished
+        self.end: Any = None
+        self.task = asyncio.ensure_future(self._produce(events))
+
+    async def _produce(self, events: AsyncIterator[Any]):
+        end: Any = _END
+        try:
+            async for event in events:
+                self.events.append(event)
+                for queue in self.queues:
+                    queue.put_nowait(event)
+        except Exception as e:
+            end = _Failure(e)
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                # Stops the upstream too when every subscriber has gone
+                await aclose()
+        self.end = end
+        for queue in self.queues:
+            queue.put_nowait(end)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        if self.end is not None:
+            queue.put_nowait(self.end)
+        self.queues.append(queue)
+        return queue
+
+
+class SingleFlight:
+    """
+    Shares one upstream call among concurrent identical requests.
+
+    Requests are identical when they have the same key. The first starts
+    the call in its own task; later ones, until it completes, wait on that
+    task, or for streams subscribe to its events through a queue of their
+    own. The call is cancelled only once every caller has gone. Nothing is
+    kept after completion: repeated requests are the answer cache's job.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Await call(), or the identical call already in flight.
+
+        :return: The result, and whether it was shared from another caller's call
+        """
+        flight = self._calls.get(key)
+        shared = flight is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.upstream_calls += 1
+            flight = self._calls[key] = _Call(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda _: self._forget(self._calls, key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+                self._forget(self._calls, key, flight)
+
+    async def stream(self, key: str, events: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Yield the events of events(), or of the identical stream already in flight."""
+        flight = self._streams.get(key)
+        if flight is None:
+            self.upstream_calls += 1
+            flight = self._streams[key] = _StreamFlight(events())
+            flight.task.add_done_callback(lambda _: self._forget(self._streams, key, flight))
+        else:
+            self.coalesced += 1
+
+        queue = flight.subscribe()
+        try:
+            while True:
+                event = await queue.get()
+                if event is _END:
+                    return
+                if isinstance(event, _Failure):
+                    raise event.error
+                yield event
+        finally:
+            flight.queues.remove(queue)
+            if not flight.queues and not flight.task.done():
+                flight.task.cancel()
+                self._forget(self._streams, key, flight)
+
+    @staticmethod
+    def _forget(flights: Dict[str, Any], key: str, flight: Any):
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,165 @@
+"""Server-Sent Events encoding for streamed chat responses"""
+
+import asyncio
+import json
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+# Fixed parts of a content frame, encoded once
+_CONTENT_PREFIX = b'data: {"type": "content", "content": '
+_FRAME_SUFFIX = b"}\n\n"
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client of a streamed response has gone away"""
+
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    """Encode a single event as an SSE frame"""
+    return b"data: " + json.dumps(event).encode("utf-8") + b"\n\n"
+
+
+def encode_content(content: str) -> bytes:
+    """Encode a content delta, serializing only the delta itself"""
+    return _CONTENT_PREFIX + json.dumps(content).encode("utf-8") + _FRAME_SUFFIX
+
+
+class SSEFrameEncoder:
+    """
+    Coalesces streamed content deltas into SSE frames.
+
+    Deltas are buffered until max_chars characters are pending or max_delay
+    seconds have passed since the first pending delta, whichever comes first.
+    Any other event flushes the pending content and is sent as its own frame,
+    so event ordering is preserved.
+
+    The upstream events are pulled by a producer task into a bounded queue,
+    so upstream reads overlap with frame writes and the consumer only sleeps
+    when nothing is ready.
+
+    When is_disconnected is given it is polled every poll_interval seconds;
+    once the client is gone the upstream events are closed and
+    ClientDisconnected is raised instead of reading the stream to the end.
+    """
+
+    def __init__(self, max_chars: int = 32, max_delay: float = 0.015, max_queued: int = 256):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self.max_queued = max_queued
+        self.frames_sent = 0
+        self.deltas_received = 0
+
+    async def encode(
+        self,
+        events: AsyncIterator[Dict[str, Any]],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        poll_interval: float = 0.25,
+    ) -> AsyncIterator[bytes]:
+        """Encode an event stream into SSE frames"""
+        loop = asyncio.get_running_loop()
+        queue: Deque[Dict[str, Any]] = deque()
+        state: Dict[str, Any] = {"done": False, "error": None, "ready": None, "space": None}
+
+        def wake(name: str):
+            future = state[name]
+            if future is not None and not future.done():
+                future.set_result(None)
+
+        async def produce():
+            try:
+                async for event in events:
+                    queue.append(event)
+                    wake("ready")
+                    if len(queue) >= self.max_queued:
+                        # Backpressure: wait until the consumer drains the queue
+                        state["space"] = loop.create_future()
+                        await state["space"]
+            except Exception as e:
+                state["error"] = e
+            finally:
+                state["done"] = True
+                wake("ready")
+                # Close the upstream promptly rather than leaving it to the
+                # garbage collector, so its HTTP stream is released
+                aclose = getattr(events, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+
+        producer = asyncio.ensure_future(produce())
+        pending: List[str] = []
+        pending_chars = 0
+        deadline = 0.0
+        next_poll = loop.time() + poll_interval
+
+        try:
+            while True:
+                while queue:
+                    event = queue.popleft()
+                    if event.get("type") == "content":
+                        content = event.get("content") or ""
+                        if not content:
+                            continue
+                        self.deltas_received += 1
+                        if not pending:
+                            deadline = loop.time() + self.max_delay
+                        pending.append(content)
+                        pending_chars += len(content)
+                        if pending_chars >= self.max_chars:
+                            yield self._flush(pending)
+                            pending_chars = 0
+                    else:
+                        if pending:
+                            yield self._flush(pending)
+                            pending_chars = 0
+                        self.frames_sent += 1
+                        yield encode_event(event)
+                wake("space")
+
+                if state["done"]:
+                    break
+
+                if is_disconnected is not None and loop.time() >= next_poll:
+                    if await is_disconnected():
+                        raise ClientDisconnected()
+                    next_poll = loop.time() + poll_interval
+                    continue
+
+                # Sleep until more events arrive, until pending content is due,
+                # or until the next disconnect check
+                state["ready"] = ready = loop.create_future()
+                wake_at = None
+                if pending:
+                    if loop.time() >= deadline:
+                        yield self._flush(pending)
+                        pending_chars = 0
+                        continue
+                    wake_at = deadline
+                if is_disconnected is not None:
+                    wake_at = next_poll if wake_at is None else min(wake_at, next_poll)
+                timer = loop.call_at(wake_at, wake, "ready") if wake_at is not None else None
+                await ready
+                if timer is not None:
+                    timer.cancel()
+                if pending and not queue and loop.time() >= deadline:
+                    yield self._flush(pending)
+                    pending_chars = 0
+
+            if pending:
+                yield self._flush(pending)
+            if state["error"] is not None:
+                raise state["error"]
+        finally:
+            if not producer.done():
+                producer.cancel()
+                try:
+                    await producer
+                except asyncio.CancelledError:
+                    pass
+
+    def _flush(self, pending: List[str]) -> bytes:
+        frame = encode_content("".join(pending))
+        pending.clear()
+        self.frames_sent += 1
+        return frame
@@ -0,0 +1,224 @@
+"""Streaming reception of uploaded files with a size limit"""
+
+import asyncio
+import hashlib
+import os
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Optional, Union
+
+from fastapi import Request, UploadFile
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from backend.app.core.performance import thread_pool
+
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+
+# Request body of endpoints that read their upload with open_upload, which
+# FastAPI cannot infer from the signature
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+# Allowance for the multipart boundaries, part headers and other form
+# fields around the file, when judging a request by its Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised as soon as an upload grows past its size limit"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class StreamedFilePart:
+    """
+    The file part of a multipart/form-data request, read as the body arrives.
+
+    Starlette's form parsing spools the whole body before a handler runs;
+    this parses it incrementally instead, so a handler can stop reading,
+    and reject the upload, partway through. It offers the filename and
+    read() of an UploadFile. Other form fields are ignored.
+    """
+
+    def __init__(self, request: Request, field_name: str = "file"):
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise ValueError("Expected a multipart/form-data upload")
+        self.filename: Optional[str] = None
+        self._field_name = field_name.encode()
+        self._body = request.stream()
+        self._chunks: Deque[bytes] = deque()
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_file = False
+        self._file_ended = False
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    async def start(self) -> "StreamedFilePart":
+        """Read up to the start of the file's contents"""
+        while self.filename is None:
+            await self._feed()
+        return self
+
+    async def read(self, size: int = -1) -> bytes:
+        """Up to size bytes of the file, or b"" once it has ended"""
+        while not self._chunks and not self._file_ended:
+            await self._feed()
+        if not self._chunks:
+            return b""
+        chunk = self._chunks.popleft()
+        if 0 < size < len(chunk):
+            self._chunks.appendleft(chunk[size:])
+            chunk = chunk[:size]
+        return chunk
+
+    async def _feed(self):
+        try:
+            chunk = await self._body.__anext__()
+        except StopAsyncIteration:
+            raise ValueError("Upload ended before its file did")
+        self._parser.write(chunk)
+
+    def _on_part_begin(self):
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if self.filename is None and options.get(b"name") == self._field_name and b"filename" in options:
+            self.filename = options[b"filename"].decode("utf-8", errors="replace")
+            self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._chunks.append(bytes(data[start:end]))
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._file_ended = True
+
+
+async def open_upload(request: Request, max_bytes: int, field_name: str = "file") -> StreamedFilePart:
+    """
+    Start reading the file uploaded with a multipart request.
+
+    Raises UploadTooLargeError straight away, reading nothing, when the
+    declared Content-Length is past what a max_bytes file needs, and
+    ValueError when the body is not a multipart upload with that file.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise UploadTooLargeError(max_bytes)
+    return await StreamedFilePart(request, field_name).start()
+
+
+@dataclass
+class ReceivedUpload:
+    size_bytes: int
+    content_hash: str
+    # The upload's bytes, when it was not written to a file
+    contents: Optional[bytes] = None
+
+
+async def receive_upload(
+    file: Union[UploadFile, StreamedFilePart],
+    max_bytes: int,
+    destination: Optional[Path] = None,
+    chunk_size: int = UPLOAD_READ_CHUNK_BYTES,
+) -> ReceivedUpload:
+    """
+    Read an upload in chunks, hashing it as it arrives.
+
+    With a destination, chunks are hashed and written on the thread pool,
+    each write overlapping the read of the next chunk, so at most two chunks
+    are held at once and the event loop never blocks on the disk. Without
+    one, the contents are collected in memory and returned.
+
+    Raises UploadTooLargeError once more than max_bytes have been read,
+    without reading the rest of the file; a partly written destination is
+    removed. For that to spare the server the rest of the request, pass a
+    StreamedFilePart: an UploadFile has already been received in full.
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    if destination is None:
+        contents = bytearray()
+        while chunk := await file.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            digest.update(chunk)
+            contents += chunk
+        return ReceivedUpload(size, digest.hexdigest(), bytes(contents))
+
+    loop = asyncio.get_running_loop()
+    output = await loop.run_in_executor(thread_pool, open, destination, "wb")
+
+    def write(chunk: bytes):
+        # hashlib and file writes release the GIL for large buffers
+        digest.update(chunk)
+        output.write(chunk)
+
+    pending = None
+    try:
+        while chunk := await file.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            if pending is not None:
+                await pending
+            pending = loop.run_in_executor(thread_pool, write, chunk)
+        if pending is not None:
+            await pending
+    except BaseException:
+        if pending is not None:
+            # Let an in-flight write finish before closing the file under it
+            await asyncio.gather(pending, return_exceptions=True)
+        await loop.run_in_executor(thread_pool, output.close)
+        await loop.run_in_executor(thread_pool, _remove, destination)
+        raise
+    await loop.run_in_executor(thread_pool, output.close)
+    return ReceivedUpload(size, digest.hexdigest())
+
+
+def _remove(path: Path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -9,6 +9,8 @@ from slowapi.errors import RateLimitExceeded
 
 from backend.app.api import router
 from backend.app.core.config import settings
+from backend.app.core.performance import shutdown_process_pool
+from backend.app.services.ingestion_jobs import ingestion_jobs
 from backend.app.middleware.error_handler import (
     http_exception_handler,
     validation_exception_handler,
@@ -44,6 +46,9 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down RAG Chat Application...")
     # Stop performance monitoring
     await performance_monitor.stop_monitoring()
+    # Stop background ingestion and PDF extraction workers
+    await ingestion_jobs.shutdown()
+    shutdown_process_pool()
 
 app = FastAPI(
     title="RAG Chat Application",
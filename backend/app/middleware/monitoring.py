@@ -1,10 +1,11 @@
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Callable
+from typing import Any, Callable, Dict, Optional
 import time
 import logging
 from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+import hashlib
 import asyncio
 
 logger = logging.getLogger(__name__)
@@ -59,6 +60,172 @@ class MetricsCollector:
 # Global metrics collector
 metrics_collector = MetricsCollector()
 
+def _empty_usage_counters() -> Dict[str, int]:
+    return {
+        "requests": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "total_tokens": 0,
+    }
+
+def _summarize_usage(counters: Dict[str, int]) -> Dict[str, Any]:
+    summary = dict(counters)
+    summary["tokens_per_request"] = (
+        counters["total_tokens"] / counters["requests"] if counters["requests"] else 0.0
+    )
+    return summary
+
+def api_key_id(api_key: str) -> str:
+    """Stable, non-reversible identifier for an API key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+class TokenUsageCollector:
+    """
+    Collects LLM and embedding token usage per API key and per endpoint.
+    Memory is fixed: at most max_keys keys are tracked individually, and the
+    least recently active ones are folded into a shared "other" bucket.
+    """
+    
+    WINDOW_SECONDS = 60
+    
+    def __init__(self, max_keys: int = 1000):
+        self.max_keys = max_keys
+        self.totals = _empty_usage_counters()
+        self.by_key: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.other_keys = _empty_usage_counters()
+        self.by_endpoint: Dict[str, Dict[str, int]] = defaultdict(_empty_usage_counters)
+        # Ring of per-second token counts for the recent throughput window
+        self.window = [0] * self.WINDOW_SECONDS
+        self.window_seconds = [0] * self.WINDOW_SECONDS
+        self.start_time = time.time()
+        
+    def record_usage(
+        self,
+        usage: Dict[str, int],
+        api_key: Optional[str] = None,
+        endpoint: str = "unknown"
+    ):
+        """Record the usage of one completion or embedding call"""
+        if not usage:
+            return
+        
+        buckets = [self.totals, self.by_endpoint[endpoint]]
+        if api_key:
+            key_id = api_key_id(api_key)
+            if key_id not in self.by_key:
+                self.by_key[key_id] = _empty_usage_counters()
+                if len(self.by_key) > self.max_keys:
+                    _, evicted = self.by_key.popitem(last=False)
+                    for name, value in evicted.items():
+                        self.other_keys[name] += value
+            self.by_key.move_to_end(key_id)
+            buckets.append(self.by_key[key_id])
+        
+        total_tokens = usage.get("total_tokens") or (
+            usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        )
+        for bucket in buckets:
+            bucket["requests"] += 1
+            bucket["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            bucket["completion_tokens"] += usage.get("completion_tokens", 0)
+            bucket["cached_tokens"] += usage.get("cached_tokens", 0)
+            bucket["total_tokens"] += total_tokens
+        
+        second = int(time.time())
+        slot = second % self.WINDOW_SECONDS
+        if self.window_seconds[slot] != second:
+            self.window_seconds[slot] = second
+            self.window[slot] = 0
+        self.window[slot] += total_tokens
+    
+    def tokens_per_second(self) -> float:
+        """Token throughput over the recent window"""
+        now = int(time.time())
+        recent = sum(
+            tokens for tokens, second in zip(self.window, self.window_seconds)
+            if now - second < self.WINDOW_SECONDS
+        )
+        elapsed = min(self.WINDOW_SECONDS, max(1.0, time.time() - self.start_time))
+        return recent / elapsed
+    
+    def get_metrics(self):
+        """Get current token usage metrics"""
+        uptime = max(1.0, time.time() - self.start_time)
+        totals = _summarize_usage(self.totals)
+        totals["prompt_cache_hit_ratio"] = (
+            self.totals["cached_tokens"] / self.totals["prompt_tokens"]
+            if self.totals["prompt_tokens"] else 0.0
+        )
+        return {
+            "totals": totals,
+            "tokens_per_second": self.tokens_per_second(),
+            "tokens_per_second_since_start": self.totals["total_tokens"] / uptime,
+            "by_endpoint": {
+                endpoint: _summarize_usage(counters)
+                for endpoint, counters in self.by_endpoint.items()
+            },
+            "by_api_key": {
+                key_id: _summarize_usage(counters)
+                for key_id, counters in self.by_key.items()
+            },
+            "other_api_keys": _summarize_usage(self.other_keys),
+        }
+
+# Global token usage collector
+token_usage_collector = TokenUsageCollector()
+
+class StreamMetricsCollector:
+    """Counts streamed responses by outcome, including streams the client abandoned"""
+
+    OUTCOMES = ("completed", "aborted", "failed")
+
+    def __init__(self):
+        self.active_streams = 0
+        self.by_endpoint: Dict[str, Dict[str, float]] = defaultdict(self._empty_counters)
+
+    def _empty_counters(self) -> Dict[str, float]:
+        counters = {outcome: 0 for outcome in self.OUTCOMES}
+        counters["seconds_before_abort"] = 0.0
+        counters["deltas_before_abort"] = 0
+        return counters
+
+    def stream_started(self, endpoint: str):
+        """Record that a streamed response has started"""
+        self.active_streams += 1
+        self.by_endpoint[endpoint]
+
+    def record_stream(self, endpoint: str, outcome: str, duration: float, deltas: int = 0):
+        """Record how a streamed response ended"""
+        self.active_streams = max(0, self.active_streams - 1)
+        counters = self.by_endpoint[endpoint]
+        counters[outcome] += 1
+        if outcome == "aborted":
+            counters["seconds_before_abort"] += duration
+            counters["deltas_before_abort"] += deltas
+
+    def get_metrics(self):
+        """Get current streaming metrics"""
+        by_endpoint = {}
+        for endpoint, counters in self.by_endpoint.items():
+            finished = sum(counters[outcome] for outcome in self.OUTCOMES)
+            aborted = counters["aborted"]
+            by_endpoint[endpoint] = {
+                **{outcome: counters[outcome] for outcome in self.OUTCOMES},
+                "abort_rate": aborted / finished if finished else 0.0,
+                "average_seconds_before_abort": (
+                    counters["seconds_before_abort"] / aborted if aborted else None
+                ),
+                "deltas_before_abort": counters["deltas_before_abort"],
+            }
+        return {
+            "active_streams": self.active_streams,
+            "by_endpoint": by_endpoint,
+        }
+
+# Global stream metrics collector
+stream_metrics = StreamMetricsCollector()
+
 class MonitoringMiddleware(BaseHTTPMiddleware):
     """Middleware for request monitoring and metrics collection"""
         
@@ -50,16 +50,15 @@ class RequestValidator(BaseHTTPMiddleware):
                 content={"detail": "Invalid path"}
             )
         
-        # For POST/PUT requests, validate body
-        if request.method in ["POST", "PUT", "PATCH"]:
+        # For POST/PUT requests, validate JSON bodies; others, such as file
+        # uploads, reach the endpoint unread so it can stream them
+        content_type = request.headers.get("content-type", "")
+        if request.method in ["POST", "PUT", "PATCH"] and "application/json" in content_type:
             try:
                 # Store original body
-                body = await request.body()
+                body = await self._read_body(request)
                 
-                # Validate content type
-                content_type = request.headers.get("content-type", "")
-                
-                if "application/json" in content_type and body:
+                if body:
                     # Validate JSON body
                     import json
                     try:
@@ -67,13 +66,7 @@ class RequestValidator(BaseHTTPMiddleware):
                         validated_data = self.validate_json_data(data)
                         
                         # Create new request with validated data
-                        async def receive():
-                            return {
-                                "type": "http.request",
-                                "body": json.dumps(validated_data).encode()
-                            }
-                        
-                        request._receive = receive
+                        body = json.dumps(validated_data).encode()
                     except json.JSONDecodeError:
                         return JSONResponse(
                             status_code=400,
@@ -85,6 +78,8 @@ class RequestValidator(BaseHTTPMiddleware):
                             content={"detail": str(e)}
                         )
                 
+                self._replay_body(request, body)
+                
             except Exception as e:
                 logger.error(f"Request validation error: {str(e)}")
                 return JSONResponse(
@@ -95,6 +90,35 @@ class RequestValidator(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
     
+    @staticmethod
+    async def _read_body(request: Request) -> bytes:
+        # Read straight from the ASGI receive, so the request is not left
+        # holding a cached body that would be passed on instead of ours
+        chunks = []
+        while True:
+            message = await request.receive()
+            if message["type"] == "http.disconnect":
+                raise ValueError("Client disconnected")
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+    
+    @staticmethod
+    def _replay_body(request: Request, body: bytes):
+        """Hand the body on once, then pass through the client's later messages"""
+        original_receive = request.receive
+        body_sent = False
+        
+        async def receive():
+            nonlocal body_sent
+            if body_sent:
+                # Streamed responses wait here for the client to disconnect
+                return await original_receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        
+        request._receive = receive
+    
     def validate_json_data(self, data, depth=0):
         """Recursively validate and sanitize JSON data"""
         if depth > 10:  # Prevent deep recursion
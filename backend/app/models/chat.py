@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional, Dict, Any
 
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
@@ -20,4 +20,23 @@ class ChatSource(BaseModel):
 class ChatResponse(BaseModel):
     message: str
     sources: List[ChatSource]
-    tokens_used: Optional[int] = None
\ No newline at end of file
+    tokens_used: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+
+class ChatBatchRequest(BaseModel):
+    file_id: str
+    # Same per-string limit the request validator applies
+    questions: List[Annotated[str, Field(min_length=1, max_length=10000)]]
+
+class ChatBatchResult(BaseModel):
+    index: int  # Position of the question in the request
+    question: str
+    message: Optional[str] = None
+    sources: List[ChatSource] = []
+    tokens_used: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    error: Optional[str] = None
+
+class CacheFeedbackRequest(BaseModel):
+    file_id: str
+    message: str
\ No newline at end of file
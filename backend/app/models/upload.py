@@ -6,4 +6,13 @@ class UploadResponse(BaseModel):
     size_bytes: int
     page_count: int
     chunk_count: int
-    message: str
\ No newline at end of file
+    message: str
+
+class UploadAcceptedResponse(BaseModel):
+    file_id: str
+    job_id: str
+    filename: str
+    size_bytes: int
+    status: str
+    status_url: str
+    message: str
@@ -0,0 +1,149 @@
+"""
+Exact-match answer cache for chat responses
+Repeated questions about the same document are answered without retrieval or LLM calls
+"""
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from backend.app.core.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s\?\!\.]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivial variations share a cache entry"""
+    normalized = _WHITESPACE.sub(" ", question.strip().lower())
+    return _TRAILING_PUNCTUATION.sub("", normalized)
+
+
+def history_digest(history: Optional[List[Any]]) -> str:
+    """Digest of the conversation history that shaped the answer"""
+    digest = hashlib.sha256()
+    for message in history or []:
+        digest.update(message.role.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(message.content.encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """LRU answer cache bounded by total entry size in bytes, with TTL expiry"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.file_keys: Dict[str, Set[str]] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_key(
+        self,
+        file_id: str,
+        model: str,
+        question: str,
+        history: Optional[List[Any]],
+        top_k: int,
+    ) -> str:
+        """Build the cache key for a chat request"""
+        key_parts = [
+            file_id,
+            model,
+            normalize_question(question),
+            history_digest(history),
+            f"k={top_k}",
+        ]
+        return hashlib.sha256("\x1f".join(key_parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached answer, or None on miss or expiry"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry["expires_at"] < time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return {"message": entry["message"], "sources": entry["sources"]}
+
+    def set(self, key: str, file_id: str, message: str, sources: List[Dict[str, Any]]):
+        """Store an answer and its sources"""
+        size = len(message.encode("utf-8")) + len(json.dumps(sources).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        if key in self.entries:
+            self._remove(key)
+
+        self.entries[key] = {
+            "file_id": file_id,
+            "message": message,
+            "sources": sources,
+            "size": size,
+            "expires_at": time.time() + self.ttl_seconds,
+        }
+        self.file_keys.setdefault(file_id, set()).add(key)
+        self.current_bytes += size
+
+        # Evict least recently used entries until we fit the byte budget
+        while self.current_bytes > self.max_bytes and self.entries:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate_file(self, file_id: str) -> int:
+        """Drop every cached answer for a document"""
+        keys = self.file_keys.pop(file_id, set())
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        """Clear cache"""
+        self.entries.clear()
+        self.file_keys.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.current_bytes -= entry["size"]
+        keys = self.file_keys.get(entry["file_id"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.file_keys[entry["file_id"]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# Create singleton instance
+answer_cache = AnswerCache(
+    max_bytes=settings.answer_cache_max_bytes,
+    ttl_seconds=settings.answer_cache_ttl_seconds,
+)
@@ -1,14 +1,27 @@
+import asyncio
 import os
 import logging
-from typing import List, Dict, Any, AsyncGenerator
+import numpy as np
+from typing import List, Dict, Any, AsyncGenerator, Optional, Tuple
 
 from backend.aimakerspace.openai_utils.chatmodel import ChatOpenAI
-from backend.aimakerspace.openai_utils.prompts import SystemRolePrompt, UserRolePrompt
-from backend.app.models.chat import ChatMessage, ChatResponse, ChatSource
+from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
+from backend.aimakerspace.openai_utils.tokens import estimate_usage
+from backend.app.models.chat import ChatBatchResult, ChatMessage, ChatResponse, ChatSource
 from backend.app.core.config import settings
+from backend.app.core.single_flight import SingleFlight
+from backend.app.middleware.monitoring import api_key_id, token_usage_collector
+from backend.app.services.answer_cache import answer_cache
+from backend.app.services.history_store import history_store
+from backend.app.services.history_summarizer import history_summarizer
+from backend.app.services.semantic_cache import semantic_cache
+from backend.app.services.prompt_assembler import PromptAssembler
 
 logger = logging.getLogger(__name__)
 
+# Chat answers being generated, shared by identical concurrent requests
+chat_flights = SingleFlight()
+
 RAG_SYSTEM_PROMPT = """You are an expert research assistant specialized in analyzing academic papers and scientific literature.
 
 When answering questions about the research paper:
@@ -33,7 +46,8 @@ class ChatService:
         # Import here to avoid circular imports
         from backend.app.services import pdf_service_instance
         self.pdf_service = pdf_service_instance
-        self.chat_histories: Dict[str, List[ChatMessage]] = {}
+        # Bounded per-file histories, evicted by size
+        self.history_store = history_store
     
     async def generate_response(
         self,
@@ -41,73 +55,246 @@ class ChatService:
         message: str,
         history: List[ChatMessage],
         api_key: str
+    ) -> ChatResponse:
+        # Identical questions in flight at once share one answer
+        key = self._flight_key(file_id, "message", message, history, api_key)
+        response, _ = await chat_flights.do(
+            key, lambda: self._answer(file_id, message, history, api_key)
+        )
+        
+        # History is per requester, shared answer or not
+        sources = [source.model_dump() for source in response.sources]
+        await self._store_history(file_id, message, response.message, sources)
+        self._summarize_later(file_id, history, message, response.message, api_key)
+        return response
+    
+    async def generate_stream(
+        self,
+        file_id: str,
+        message: str,
+        history: List[ChatMessage],
+        api_key: str
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        # Identical questions in flight at once share one upstream stream,
+        # fanned out to each requester
+        key = self._flight_key(file_id, "stream", message, history, api_key)
+        sources: List[Dict[str, Any]] = []
+        response_parts: List[str] = []
+        failed = False
+        async for event in chat_flights.stream(
+            key, lambda: self._answer_stream(file_id, message, history, api_key)
+        ):
+            if event["type"] == "sources":
+                sources = event["sources"]
+            elif event["type"] == "content":
+                response_parts.append(event["content"])
+            elif event["type"] == "error":
+                failed = True
+            yield event
+        
+        # Store in history
+        response = "".join(response_parts)
+        await self._store_history(file_id, message, response, sources)
+        if not failed:
+            self._summarize_later(file_id, history, message, response, api_key)
+    
+    def _flight_key(
+        self, file_id: str, kind: str, message: str, history: List[ChatMessage], api_key: str
+    ) -> str:
+        # Keyed like the answer cache, by index: file_ids sharing a document
+        # ask the same question of it. Only callers with the same API key
+        # share a flight, so each answer is generated with, and billed to,
+        # the requester's own key
+        index_id = self.pdf_service.resolve_index_id(file_id)
+        return kind + ":" + api_key_id(api_key) + ":" + answer_cache.make_key(
+            index_id, settings.chat_model, message, history, settings.retrieval_top_k
+        )
+    
+    async def _answer(
+        self,
+        file_id: str,
+        message: str,
+        history: List[ChatMessage],
+        api_key: str
     ) -> ChatResponse:
         # Get vector store
-        vector_store = self.pdf_service.get_vector_store(file_id)
+        vector_store = await self.pdf_service.aget_vector_store(file_id)
         if not vector_store:
             raise ValueError(f"No indexed document found for file_id: {file_id}")
         
-        # Search for relevant chunks
-        search_results = vector_store.search_by_text(message, k=5)
+        # Caches are keyed by index, so file_ids sharing a document share answers
+        index_id = self.pdf_service.resolve_index_id(file_id)
         
-        # Prepare context
-        context_chunks = []
-        sources = []
+        # Serve repeated questions from the answer cache
+        cache_key = self._answer_cache_key(index_id, message, history)
+        if cache_key:
+            cached = answer_cache.get(cache_key)
+            if cached:
+                return ChatResponse(
+                    message=cached["message"],
+                    sources=[ChatSource(**source) for source in cached["sources"]]
+                )
         
-        # Get metadata stored in vector_store
-        metadata_list = getattr(vector_store, 'metadata', [])
+        # Embed the question once for the semantic cache and retrieval
+        query_vector = self._embed_query(message, api_key, "chat.message")
         
-        for idx, (chunk_text, score) in enumerate(search_results):
-            context_chunks.append(f"[Source {idx + 1}] {chunk_text}")
-            # Find matching metadata by chunk text
-            chunk_metadata = {}
-            for i, chunk in enumerate(vector_store.vectors.keys()):
-                if chunk == chunk_text and i < len(metadata_list):
-                    chunk_metadata = metadata_list[i]
-                    break
-            
-            sources.append(ChatSource(
-                page=chunk_metadata.get("page", 1),
-                chunk_id=chunk_metadata.get("chunk_id", f"chunk_{idx}"),
-                content=chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text,
-                relevance_score=float(score)
-            ))
-        
-        context = "\n\n".join(context_chunks)
-        
-        # Prepare messages
-        messages = [
-            SystemRolePrompt(RAG_SYSTEM_PROMPT).create_message(),
-            UserRolePrompt(f"Context from PDF:\n{context}\n\nUser Question: {message}").create_message()
-        ]
+        # Serve paraphrased first questions from the semantic cache
+        if self._use_semantic_cache(history):
+            cached = semantic_cache.lookup(index_id, message, query_vector)
+            if cached:
+                return ChatResponse(
+                    message=cached["message"],
+                    sources=[ChatSource(**source) for source in cached["sources"]]
+                )
         
-        # Add history if provided
-        for hist_msg in history[-5:]:  # Limit history to last 5 messages
-            if hist_msg.role == "user":
-                messages.append(UserRolePrompt(hist_msg.content).create_message())
-            else:
-                messages.append({"role": "assistant", "content": hist_msg.content})
+        # Search for relevant chunks
+        chunk_texts, candidate_sources = self._retrieve(vector_store, query_vector)
+        
+        # Pack context and history into the model's token budget
+        prompt = self._assemble_prompt(file_id, message, chunk_texts, history)
+        sources = [candidate_sources[idx] for idx in prompt["chunk_indices"]]
+        messages = prompt["messages"]
         
         # Set API key and create chat model
         os.environ["OPENAI_API_KEY"] = api_key
         chat_model = ChatOpenAI(model_name=settings.chat_model)
         
         # Generate response
-        response = chat_model.run(messages)
-        
-        # Store in history
-        if file_id not in self.chat_histories:
-            self.chat_histories[file_id] = []
+        completion = await chat_model.arun(messages, text_only=False)
+        response = completion.choices[0].message.content
+        usage = chat_model.last_usage
+        token_usage_collector.record_usage(usage, api_key, "chat.message")
+        prompt_tokens = usage.get("prompt_tokens", prompt["prompt_tokens"])
         
-        self.chat_histories[file_id].append(ChatMessage(role="user", content=message))
-        self.chat_histories[file_id].append(ChatMessage(role="assistant", content=response, sources=[s.dict() for s in sources]))
+        if response:
+            self._cache_answer(cache_key, index_id, message, history, query_vector, response, sources)
         
         return ChatResponse(
             message=response,
-            sources=sources
+            sources=[ChatSource(**source) for source in sources],
+            tokens_used=usage.get("total_tokens"),
+            prompt_tokens=prompt_tokens
         )
     
-    async def generate_stream(
+    async def generate_batch(
+        self,
+        file_id: str,
+        questions: List[str],
+        api_key: str
+    ) -> AsyncGenerator[ChatBatchResult, None]:
+        """
+        Answer independent questions about one document, yielding each
+        result as soon as it is ready.
+        
+        Uncached questions are embedded in one call and retrieved with one
+        matrix product; their completions then run concurrently, at most
+        chat_batch_concurrency at a time.
+        """
+        vector_store = await self.pdf_service.aget_vector_store(file_id)
+        if not vector_store:
+            raise ValueError(f"No indexed document found for file_id: {file_id}")
+        return self._answer_batch(vector_store, file_id, questions, api_key)
+    
+    async def _answer_batch(
+        self,
+        vector_store,
+        file_id: str,
+        questions: List[str],
+        api_key: str
+    ) -> AsyncGenerator[ChatBatchResult, None]:
+        index_id = self.pdf_service.resolve_index_id(file_id)
+        
+        # Repeated questions are answered from the answer cache straight away
+        pending = []
+        for index, question in enumerate(questions):
+            cache_key = self._answer_cache_key(index_id, question, [])
+            cached = answer_cache.get(cache_key) if cache_key else None
+            if cached:
+                yield self._cached_batch_result(index, question, cached)
+            else:
+                pending.append(index)
+        if not pending:
+            return
+        
+        # One embedding call for the rest
+        try:
+            query_vectors = await self._embed_queries([questions[i] for i in pending], api_key, "chat.batch")
+        except Exception as e:
+            logger.error(f"Batch embedding failed: {e}")
+            for index in pending:
+                yield ChatBatchResult(index=index, question=questions[index], error="Failed to embed question")
+            return
+        
+        # Paraphrased questions from the semantic cache, one search for the rest
+        to_answer = []
+        for index, query_vector in zip(pending, query_vectors):
+            cached = None
+            if self._use_semantic_cache([]):
+                cached = semantic_cache.lookup(index_id, questions[index], query_vector)
+            if cached:
+                yield self._cached_batch_result(index, questions[index], cached)
+            else:
+                to_answer.append((index, query_vector))
+        if not to_answer:
+            return
+        search_results = vector_store.search_batch(
+            np.stack([query_vector for _, query_vector in to_answer]), k=settings.retrieval_top_k
+        )
+        
+        os.environ["OPENAI_API_KEY"] = api_key
+        limit = asyncio.Semaphore(settings.chat_batch_concurrency)
+        
+        async def answer(index: int, query_vector: np.ndarray, results) -> ChatBatchResult:
+            question = questions[index]
+            async with limit:
+                try:
+                    chunk_texts, candidate_sources = self._chunks_and_sources(vector_store, results)
+                    prompt = self._assemble_prompt(file_id, question, chunk_texts, [])
+                    sources = [candidate_sources[idx] for idx in prompt["chunk_indices"]]
+                    chat_model = ChatOpenAI(model_name=settings.chat_model)
+                    response = await chat_model.arun(prompt["messages"])
+                except Exception as e:
+                    logger.error(f"Batch question {index} failed: {e}")
+                    return ChatBatchResult(index=index, question=question, error="Failed to generate response")
+            
+            usage = chat_model.last_usage
+            token_usage_collector.record_usage(usage, api_key, "chat.batch")
+            if response:
+                self._cache_answer(
+                    self._answer_cache_key(index_id, question, []), index_id, question, [],
+                    query_vector, response, sources
+                )
+            return ChatBatchResult(
+                index=index,
+                question=question,
+                message=response,
+                sources=[ChatSource(**source) for source in sources],
+                tokens_used=usage.get("total_tokens"),
+                prompt_tokens=usage.get("prompt_tokens", prompt["prompt_tokens"])
+            )
+        
+        tasks = [
+            asyncio.ensure_future(answer(index, query_vector, results))
+            for (index, query_vector), results in zip(to_answer, search_results)
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # The client went away: stop the completions it no longer awaits
+            for task in tasks:
+                task.cancel()
+    
+    @staticmethod
+    def _cached_batch_result(index: int, question: str, cached: Dict[str, Any]) -> ChatBatchResult:
+        return ChatBatchResult(
+            index=index,
+            question=question,
+            message=cached["message"],
+            sources=[ChatSource(**source) for source in cached["sources"]]
+        )
+    
+    async def _answer_stream(
         self,
         file_id: str,
         message: str,
@@ -115,93 +302,87 @@ class ChatService:
         api_key: str
     ) -> AsyncGenerator[Dict[str, Any], None]:
         # Get vector store
-        vector_store = self.pdf_service.get_vector_store(file_id)
+        vector_store = await self.pdf_service.aget_vector_store(file_id)
         if not vector_store:
             raise ValueError(f"No indexed document found for file_id: {file_id}")
         
-        # Search for relevant chunks
-        search_results = vector_store.search_by_text(message, k=5)
-        
-        # Prepare context and sources
-        context_chunks = []
-        sources = []
+        # Caches are keyed by index, so file_ids sharing a document share answers
+        index_id = self.pdf_service.resolve_index_id(file_id)
         
-        # Get metadata stored in vector_store
-        metadata_list = getattr(vector_store, 'metadata', [])
+        # Replay repeated questions from the answer cache
+        cache_key = self._answer_cache_key(index_id, message, history)
+        if cache_key:
+            cached = answer_cache.get(cache_key)
+            if cached:
+                yield {"type": "sources", "sources": cached["sources"]}
+                yield {"type": "content", "content": cached["message"]}
+                return
         
-        for idx, (chunk_text, score) in enumerate(search_results):
-            context_chunks.append(f"[Source {idx + 1}] {chunk_text}")
-            # Find matching metadata by chunk text
-            chunk_metadata = {}
-            for i, chunk in enumerate(vector_store.vectors.keys()):
-                if chunk == chunk_text and i < len(metadata_list):
-                    chunk_metadata = metadata_list[i]
-                    break
-            
-            sources.append({
-                "page": chunk_metadata.get("page", 1),
-                "chunk_id": chunk_metadata.get("chunk_id", f"chunk_{idx}"),
-                "content": chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text,
-                "relevance_score": float(score)
-            })
+        # Embed the question once for the semantic cache and retrieval
+        query_vector = self._embed_query(message, api_key, "chat.stream")
         
-        # Yield sources first
-        yield {"type": "sources", "sources": sources}
-        logger.info("Sources yielded, preparing to call OpenAI")
+        if self._use_semantic_cache(history):
+            cached = semantic_cache.lookup(index_id, message, query_vector)
+            if cached:
+                yield {"type": "sources", "sources": cached["sources"]}
+                yield {"type": "content", "content": cached["message"]}
+                return
         
+        # Search for relevant chunks
+        chunk_texts, candidate_sources = self._retrieve(vector_store, query_vector)
         
-        context = "\n\n".join(context_chunks)
+        # Pack context and history into the model's token budget
+        prompt = self._assemble_prompt(file_id, message, chunk_texts, history)
+        sources = [candidate_sources[idx] for idx in prompt["chunk_indices"]]
+        messages = prompt["messages"]
         
-        # Prepare messages
-        messages = [
-            SystemRolePrompt(RAG_SYSTEM_PROMPT).create_message(),
-            UserRolePrompt(f"Context from PDF:\n{context}\n\nUser Question: {message}").create_message()
-        ]
+        # Yield sources first
+        yield {"type": "sources", "sources": sources}
+        logger.info(f"Sources yielded, calling OpenAI with ~{prompt['prompt_tokens']} prompt tokens")
         
         # Set API key and create chat model
         os.environ["OPENAI_API_KEY"] = api_key
-        logger.info(f"API key set: {api_key[:20]}...")
-        
         chat_model = ChatOpenAI(model_name=settings.chat_model)
         
         # Stream response
-        full_response = ""
-        logger.info(f"Starting stream with model: {settings.chat_model}")
-        logger.info(f"Messages count: {len(messages)}")
-        logger.info(f"First message preview: {str(messages[0])[:200]}...")
+        response_parts: List[str] = []
+        stream_failed = False
+        # Per-token logging is sampled and only evaluated at DEBUG level
+        log_every = settings.stream_log_sample_every if logger.isEnabledFor(logging.DEBUG) else 0
         
         try:
-            stream = chat_model.astream(messages)
-            logger.info(f"Stream created: {type(stream)}")
-            
             chunk_count = 0
-            async for chunk in stream:
+            async for chunk in chat_model.astream(messages):
                 chunk_count += 1
-                logger.info(f"Received chunk {chunk_count}: {repr(chunk)[:100]}")
                 if chunk:
-                    full_response += chunk
+                    response_parts.append(chunk)
                     yield {"type": "content", "content": chunk}
-                    logger.info(f"Yielded content chunk: {repr(chunk)[:50]}")
+                if log_every and chunk_count % log_every == 0:
+                    logger.debug(f"Streamed {chunk_count} chunks for file {file_id}")
             
+            full_response = "".join(response_parts)
             logger.info(f"Stream completed. Total chunks: {chunk_count}, Full response length: {len(full_response)}")
             
             if chunk_count == 0:
                 logger.warning("No chunks received from OpenAI")
                 # Try non-streaming as fallback
                 logger.info("Attempting non-streaming fallback")
-                response = chat_model.run(messages)
+                response = await chat_model.arun(messages)
                 if response:
                     yield {"type": "content", "content": response}
                     full_response = response
                 else:
+                    stream_failed = True
                     yield {"type": "error", "content": "No response received from AI model"}
                 
         except Exception as e:
+            stream_failed = True
+            full_response = "".join(response_parts)
             logger.error(f"Error during streaming: {type(e).__name__}: {str(e)}", exc_info=True)
             # Try non-streaming as fallback
             try:
                 logger.info("Attempting non-streaming fallback after error")
-                response = chat_model.run(messages)
+                response = await chat_model.arun(messages)
                 if response:
                     yield {"type": "content", "content": response}
                     full_response = response
@@ -210,21 +391,134 @@ class ChatService:
             except Exception as fallback_error:
                 logger.error(f"Fallback also failed: {str(fallback_error)}")
                 yield {"type": "error", "content": f"Both streaming and fallback failed: {str(e)}"}
+        finally:
+            # Account for the tokens the stream (or its fallback) consumed,
+            # also when it was cut short by a disconnect or an error
+            usage = chat_model.last_usage
+            if not usage and response_parts:
+                usage = estimate_usage(prompt["prompt_tokens"], "".join(response_parts))
+            token_usage_collector.record_usage(usage, api_key, "chat.stream")
         
-        # Store in history
-        if file_id not in self.chat_histories:
-            self.chat_histories[file_id] = []
-        
-        self.chat_histories[file_id].append(ChatMessage(role="user", content=message))
-        self.chat_histories[file_id].append(ChatMessage(role="assistant", content=full_response, sources=sources))
+        if full_response and not stream_failed:
+            self._cache_answer(cache_key, index_id, message, history, query_vector, full_response, sources)
         
         logger.info("generate_stream method completed")
     
+    def _answer_cache_key(self, file_id: str, message: str, history: List[ChatMessage]) -> Optional[str]:
+        if not settings.answer_cache_enabled:
+            return None
+        return answer_cache.make_key(
+            file_id, settings.chat_model, message, history, settings.retrieval_top_k
+        )
+    
+    def _use_semantic_cache(self, history: List[ChatMessage]) -> bool:
+        # Follow-up questions depend on the conversation, so only first turns match
+        return settings.semantic_cache_enabled and not history
+    
+    def _cache_answer(
+        self,
+        cache_key: Optional[str],
+        file_id: str,
+        message: str,
+        history: List[ChatMessage],
+        query_vector: np.ndarray,
+        response: str,
+        sources: List[Dict[str, Any]]
+    ):
+        if cache_key:
+            answer_cache.set(cache_key, file_id, response, sources)
+        if self._use_semantic_cache(history):
+            semantic_cache.add(file_id, message, query_vector, response, sources)
+    
+    def _embed_query(self, message: str, api_key: str, endpoint: str) -> np.ndarray:
+        # Embed with the caller's key: indices outlive uploads and are shared
+        # between file_ids, so the model stored with one may hold another key
+        os.environ["OPENAI_API_KEY"] = api_key
+        embedding_model = EmbeddingModel(embeddings_model_name=settings.embedding_model)
+        query_vector = np.array(embedding_model.get_embedding(message))
+        token_usage_collector.record_usage(embedding_model.last_usage, api_key, endpoint)
+        return query_vector
+    
+    async def _embed_queries(self, messages: List[str], api_key: str, endpoint: str) -> np.ndarray:
+        os.environ["OPENAI_API_KEY"] = api_key
+        embedding_model = EmbeddingModel(embeddings_model_name=settings.embedding_model)
+        query_vectors = np.array(await embedding_model.async_get_embeddings(messages))
+        token_usage_collector.record_usage(embedding_model.last_usage, api_key, endpoint)
+        return query_vectors
+    
+    def _assemble_prompt(
+        self,
+        file_id: str,
+        message: str,
+        chunk_texts: List[str],
+        history: List[ChatMessage]
+    ) -> Dict[str, Any]:
+        assembler = PromptAssembler.for_model(RAG_SYSTEM_PROMPT, settings.chat_model)
+        document = self.pdf_service.get_file_status(file_id)
+        summary = None
+        if settings.history_summary_enabled:
+            # Older turns travel as their summary, once one is ready
+            summary, history = history_summarizer.compress(file_id, history)
+        return assembler.assemble(message, chunk_texts, history, document=document, summary=summary)
+    
+    def _summarize_later(
+        self,
+        file_id: str,
+        history: List[ChatMessage],
+        message: str,
+        response: str,
+        api_key: str
+    ):
+        if not settings.history_summary_enabled or not response:
+            return
+        conversation = list(history or []) + [
+            ChatMessage(role="user", content=message),
+            ChatMessage(role="assistant", content=response)
+        ]
+        history_summarizer.schedule(file_id, conversation, api_key)
+    
+    def _retrieve(self, vector_store, query_vector: np.ndarray) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Search the document and return chunk texts with their sources, best first"""
+        search_results = vector_store.search(query_vector, k=settings.retrieval_top_k)
+        return self._chunks_and_sources(vector_store, search_results)
+    
+    def _chunks_and_sources(
+        self,
+        vector_store,
+        search_results: List[Tuple[Any, float]]
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        chunk_texts = []
+        sources = []
+        
+        # Get metadata stored in vector_store
+        metadata_list = getattr(vector_store, 'metadata', [])
+        
+        for idx, (key, score) in enumerate(search_results):
+            # Chunks are stored as spans; only the top-k are materialized
+            chunk_text = vector_store.text_of(key)
+            chunk_texts.append(chunk_text)
+            # Find matching metadata by key
+            chunk_metadata = {}
+            for i, chunk in enumerate(vector_store.vectors.keys()):
+                if chunk == key and i < len(metadata_list):
+                    chunk_metadata = metadata_list[i]
+                    break
+            
+            sources.append({
+                "page": chunk_metadata.get("page", 1),
+                "chunk_id": chunk_metadata.get("chunk_id", f"chunk_{idx}"),
+                "content": chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text,
+                "relevance_score": float(score)
+            })
+        
+        return chunk_texts, sources
+    
+    async def _store_history(self, file_id: str, message: str, response: str, sources: List[Dict[str, Any]]):
+        await self.history_store.aappend(file_id, "user", message)
+        await self.history_store.aappend(file_id, "assistant", response, sources)
+    
     def clear_history(self, file_id: str) -> bool:
-        if file_id in self.chat_histories:
-            self.chat_histories[file_id] = []
-            return True
-        return False
+        return self.history_store.clear(file_id)
     
-    def get_history(self, file_id: str) -> List[ChatMessage]:
-        return self.chat_histories.get(file_id, [])
\ No newline at end of file
+    async def get_history(self, file_id: str) -> List[ChatMessage]:
+        return await self.history_store.aget(file_id)
\ No newline at end of file
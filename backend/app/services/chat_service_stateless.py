@@ -8,9 +8,11 @@ from typing import List, Dict, Any, AsyncGenerator
 import numpy as np
 
 from backend.aimakerspace.openai_utils.chatmodel import ChatOpenAI
-from backend.aimakerspace.openai_utils.prompts import SystemRolePrompt, UserRolePrompt
+from backend.aimakerspace.openai_utils.tokens import estimate_usage
 from backend.app.models.chat import ChatMessage, ChatResponse, ChatSource
 from backend.app.core.config import settings
+from backend.app.middleware.monitoring import token_usage_collector
+from backend.app.services.prompt_assembler import PromptAssembler
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +63,7 @@ class StatelessChatService:
         from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
         embedding_model = EmbeddingModel(embeddings_model_name=settings.embedding_model)
         query_embedding = await embedding_model.async_get_embedding(message)
+        token_usage_collector.record_usage(embedding_model.last_usage, api_key, "stateless.chat")
         
         # Find most similar chunks
         similarities = []
@@ -70,7 +73,7 @@ class StatelessChatService:
         
         # Sort by similarity and get top k
         similarities.sort(key=lambda x: x[1], reverse=True)
-        top_k = 5
+        top_k = settings.retrieval_top_k
         
         # Prepare context and sources
         context_chunks = []
@@ -80,7 +83,7 @@ class StatelessChatService:
             chunk_text = chunks[chunk_idx]
             chunk_meta = chunk_metadata[chunk_idx] if chunk_idx < len(chunk_metadata) else {}
             
-            context_chunks.append(f"[Source {idx + 1}] {chunk_text}")
+            context_chunks.append(chunk_text)
             sources.append(ChatSource(
                 page=chunk_meta.get("page", idx + 1),
                 chunk_id=f"chunk_{chunk_idx}",
@@ -88,29 +91,23 @@ class StatelessChatService:
                 relevance_score=float(score)
             ))
         
-        context = "\n\n".join(context_chunks)
-        
-        # Prepare messages
-        messages = [
-            SystemRolePrompt(RAG_SYSTEM_PROMPT).create_message(),
-            UserRolePrompt(f"Context from PDF:\n{context}\n\nUser Question: {message}").create_message()
-        ]
-        
-        # Add history if provided
-        if history:
-            for hist_msg in history[-5:]:  # Limit history
-                if hist_msg.role == "user":
-                    messages.append(UserRolePrompt(hist_msg.content).create_message())
-                else:
-                    messages.append({"role": "assistant", "content": hist_msg.content})
+        # Pack context and history into the model's token budget
+        assembler = PromptAssembler.for_model(RAG_SYSTEM_PROMPT, settings.chat_model)
+        prompt = assembler.assemble(message, context_chunks, history or [])
+        sources = [sources[idx] for idx in prompt["chunk_indices"]]
+        messages = prompt["messages"]
         
         # Generate response
         chat_model = ChatOpenAI(model_name=settings.chat_model)
         response = chat_model.run(messages)
+        usage = chat_model.last_usage
+        token_usage_collector.record_usage(usage, api_key, "stateless.chat")
         
         return ChatResponse(
             message=response,
-            sources=sources
+            sources=sources,
+            tokens_used=usage.get("total_tokens"),
+            prompt_tokens=usage.get("prompt_tokens", prompt["prompt_tokens"])
         )
     
     async def generate_stream_with_context(
@@ -129,6 +126,7 @@ class StatelessChatService:
         from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
         embedding_model = EmbeddingModel(embeddings_model_name=settings.embedding_model)
         query_embedding = await embedding_model.async_get_embedding(message)
+        token_usage_collector.record_usage(embedding_model.last_usage, api_key, "stateless.stream")
         
         # Find most similar chunks
         similarities = []
@@ -138,7 +136,7 @@ class StatelessChatService:
         
         # Sort by similarity and get top k
         similarities.sort(key=lambda x: x[1], reverse=True)
-        top_k = 5
+        top_k = settings.retrieval_top_k
         
         # Prepare context and sources
         context_chunks = []
@@ -148,7 +146,7 @@ class StatelessChatService:
             chunk_text = chunks[chunk_idx]
             chunk_meta = chunk_metadata[chunk_idx] if chunk_idx < len(chunk_metadata) else {}
             
-            context_chunks.append(f"[Source {idx + 1}] {chunk_text}")
+            context_chunks.append(chunk_text)
             sources.append({
                 "page": chunk_meta.get("page", idx + 1),
                 "chunk_id": f"chunk_{chunk_idx}",
@@ -156,22 +154,29 @@ class StatelessChatService:
                 "relevance_score": float(score)
             })
         
+        # Pack context and history into the model's token budget
+        assembler = PromptAssembler.for_model(RAG_SYSTEM_PROMPT, settings.chat_model)
+        prompt = assembler.assemble(message, context_chunks, history or [])
+        sources = [sources[idx] for idx in prompt["chunk_indices"]]
+        messages = prompt["messages"]
+        
         # Yield sources first
         yield {"type": "sources", "sources": sources}
         
-        context = "\n\n".join(context_chunks)
-        
-        # Prepare messages
-        messages = [
-            SystemRolePrompt(RAG_SYSTEM_PROMPT).create_message(),
-            UserRolePrompt(f"Context from PDF:\n{context}\n\nUser Question: {message}").create_message()
-        ]
-        
         # Stream response
         chat_model = ChatOpenAI(model_name=settings.chat_model)
-        async for chunk in chat_model.astream(messages):
-            if chunk:
-                yield {"type": "content", "content": chunk}
+        response_parts: List[str] = []
+        try:
+            async for chunk in chat_model.astream(messages):
+                if chunk:
+                    response_parts.append(chunk)
+                    yield {"type": "content", "content": chunk}
+        finally:
+            # Streams cut short never receive the final usage chunk
+            usage = chat_model.last_usage
+            if not usage and response_parts:
+                usage = estimate_usage(prompt["prompt_tokens"], "".join(response_parts))
+            token_usage_collector.record_usage(usage, api_key, "stateless.stream")
 
 # Create singleton instance
 stateless_chat_service = StatelessChatService()
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Content-addressed registry of document indices
+Uploads are identified by a hash of their content, so identical files share one
+index; each file_id is a reference-counted alias of an index
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+from backend.app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ContentRegistry:
+    """Maps file_ids to shared index ids, persisted as a small JSON file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.aliases: Dict[str, str] = {}
+        self.refcounts: Counter = Counter()
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            self.aliases = json.load(f)
+        self.refcounts = Counter(self.aliases.values())
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.aliases, f)
+        os.replace(tmp_path, self.path)
+
+    def resolve(self, file_id: str) -> str:
+        """Index id behind a file_id; unaliased file_ids name their own index"""
+        return self.aliases.get(file_id, file_id)
+
+    def add_alias(self, file_id: str, index_id: str) -> Optional[str]:
+        """
+        Point a file_id at an index and take a reference to it.
+
+        :return: The file_id's previous index id if this dropped its last reference
+        """
+        with self._lock:
+            previous = self.aliases.get(file_id)
+            if previous == index_id:
+                return None
+            self.aliases[file_id] = index_id
+            self.refcounts[index_id] += 1
+            self._save()
+            if previous is not None:
+                self.refcounts[previous] -= 1
+                if self.refcounts[previous] <= 0:
+                    del self.refcounts[previous]
+                    return previous
+            return None
+
+    def remove_alias(self, file_id: str) -> Optional[str]:
+        """
+        Drop a file_id's reference to its index.
+
+        :return: The index id if this was its last reference and it can be freed
+        """
+        with self._lock:
+            index_id = self.aliases.pop(file_id, None)
+            if index_id is None:
+                return None
+            self.refcounts[index_id] -= 1
+            self._save()
+            if self.refcounts[index_id] <= 0:
+                del self.refcounts[index_id]
+                return index_id
+            return None
+
+    def get_stats(self):
+        """Get deduplication statistics"""
+        return {
+            "file_ids": len(self.aliases),
+            "indices": len(self.refcounts),
+            "shared_indices": sum(1 for count in self.refcounts.values() if count > 1),
+        }
+
+
+# Create singleton instance
+content_registry = ContentRegistry(Path(settings.upload_dir) / "registry.json")
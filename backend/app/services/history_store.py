@@ -0,0 +1,254 @@
+"""
+Bounded store for per-document chat histories
+Each history is a ring buffer of the latest turns, and histories are evicted
+least recently used first once their total size passes a byte budget,
+optionally spilling to SQLite to be restored on next use
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from backend.app.core.config import settings
+from backend.app.models.chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# A source as (page, chunk_id, relevance_score)
+CompactSource = Tuple[int, str, float]
+
+# Approximate overhead of a record and of each of its sources, in bytes
+_RECORD_OVERHEAD = 64
+_SOURCE_OVERHEAD = 120
+
+
+class HistoryRecord:
+    """One chat message at rest, without a Pydantic model per message"""
+
+    __slots__ = ("role", "content", "sources")
+
+    def __init__(self, role: str, content: str, sources: Optional[Tuple[CompactSource, ...]] = None):
+        self.role = role
+        self.content = content
+        self.sources = sources
+
+    @classmethod
+    def from_message(cls, role: str, content: str, sources: Optional[List[Dict[str, Any]]] = None):
+        # Only what identifies a source is kept; its text is in the index
+        compact = tuple(
+            (source.get("page", 1), source.get("chunk_id", ""), float(source.get("relevance_score", 0.0)))
+            for source in sources
+        ) if sources else None
+        return cls(role, content, compact)
+
+    def to_message(self) -> ChatMessage:
+        sources = [
+            {"page": page, "chunk_id": chunk_id, "relevance_score": score}
+            for page, chunk_id, score in self.sources
+        ] if self.sources else None
+        return ChatMessage(role=self.role, content=self.content, sources=sources)
+
+    def nbytes(self) -> int:
+        return _RECORD_OVERHEAD + sys.getsizeof(self.content) + _SOURCE_OVERHEAD * len(self.sources or ())
+
+
+class HistoryStore:
+    """Per-file chat histories with capped turns and LRU eviction by bytes"""
+
+    def __init__(
+        self,
+        max_turns: int = 50,
+        max_bytes: int = 32 * 1024 * 1024,
+        spill_path: Optional[Path] = None,
+    ):
+        # A turn is a question and its answer
+        self.max_messages = max_turns * 2
+        self.max_bytes = max_bytes
+        self.histories: "OrderedDict[str, Deque[HistoryRecord]]" = OrderedDict()
+        self.history_bytes: Dict[str, int] = {}
+        self.current_bytes = 0
+        self.evictions = 0
+        self.spills = 0
+        self.restores = 0
+        self._lock = threading.RLock()
+        # file_ids with a history in SQLite, so others never query it
+        self.spilled: Set[str] = set()
+        # Restores under way, shared by everyone waiting on the same file_id
+        self._restoring: Dict[str, Future] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._io: Optional[ThreadPoolExecutor] = None
+        if spill_path is not None:
+            Path(spill_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(spill_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "file_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, sources TEXT, PRIMARY KEY (file_id, seq))"
+            )
+            self._db.commit()
+            self.spilled = {
+                file_id for (file_id,) in self._db.execute("SELECT DISTINCT file_id FROM messages")
+            }
+            # SQLite is used from this one thread, so spills and restores
+            # run in the order they were issued and off the event loop
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history_spill")
+
+    def append(self, file_id: str, role: str, content: str, sources: Optional[List[Dict[str, Any]]] = None):
+        """Add a message to a file's history, dropping its oldest beyond the turn cap"""
+        record = HistoryRecord.from_message(role, content, sources)
+        with self._lock:
+            history = self._history(file_id, create=True)
+            if len(history) == self.max_messages:
+                self._account(file_id, -history.popleft().nbytes())
+            history.append(record)
+            self._account(file_id, record.nbytes())
+            self._evict()
+
+    def get(self, file_id: str) -> List[ChatMessage]:
+        with self._lock:
+            history = self._history(file_id)
+            return [record.to_message() for record in history] if history else []
+
+    async def aappend(self, file_id: str, role: str, content: str, sources: Optional[List[Dict[str, Any]]] = None):
+        """append, restoring a spilled history without blocking the event loop"""
+        await self._arestore(file_id)
+        self.append(file_id, role, content, sources)
+
+    async def aget(self, file_id: str) -> List[ChatMessage]:
+        """get, restoring a spilled history without blocking the event loop"""
+        await self._arestore(file_id)
+        return self.get(file_id)
+
+    def clear(self, file_id: str) -> bool:
+        """Empty a file's history; False if it had none"""
+        with self._lock:
+            history = self.histories.get(file_id)
+            if history is None:
+                # Spilled histories are dropped without being read back
+                future = self._restoring.pop(file_id, None)
+                if future is None and file_id not in self.spilled:
+                    return False
+                self.spilled.discard(file_id)
+                self._io.submit(self._delete, file_id)
+                return True
+            history.clear()
+            self._account(file_id, -self.history_bytes[file_id])
+            return True
+
+    async def _arestore(self, file_id: str):
+        with self._lock:
+            if file_id in self.histories:
+                return
+            future = self._start_restore(file_id)
+            if future is None:
+                return
+        records = await asyncio.wrap_future(future)
+        with self._lock:
+            # Unless a synchronous caller or clear() got to it first
+            if self._restoring.get(file_id) is future:
+                del self._restoring[file_id]
+                self._install(file_id, records)
+
+    def _start_restore(self, file_id: str) -> Optional[Future]:
+        future = self._restoring.get(file_id)
+        if future is None and file_id in self.spilled:
+            self.spilled.discard(file_id)
+            future = self._restoring[file_id] = self._io.submit(self._restore, file_id)
+        return future
+
+    def _history(self, file_id: str, create: bool = False) -> Optional[Deque[HistoryRecord]]:
+        history = self.histories.get(file_id)
+        if history is not None:
+            self.histories.move_to_end(file_id)
+            return history
+
+        records = None
+        if self._start_restore(file_id) is not None:
+            records = self._restoring.pop(file_id).result()
+        if records is None and not create:
+            return None
+        return self._install(file_id, records)
+
+    def _install(self, file_id: str, records: Optional[List[HistoryRecord]]) -> Deque[HistoryRecord]:
+        history = deque(records or (), maxlen=self.max_messages)
+        self.histories[file_id] = history
+        self.history_bytes[file_id] = 0
+        self._account(file_id, sum(record.nbytes() for record in history))
+        return history
+
+    def _account(self, file_id: str, size: int):
+        self.history_bytes[file_id] += size
+        self.current_bytes += size
+
+    def _evict(self):
+        # Evict least recently used histories, but always keep the newest one
+        while self.current_bytes > self.max_bytes and len(self.histories) > 1:
+            file_id, history = self.histories.popitem(last=False)
+            self.current_bytes -= self.history_bytes.pop(file_id)
+            self.evictions += 1
+            if self._io is not None and history:
+                self.spilled.add(file_id)
+                self._io.submit(self._spill, file_id, history)
+
+    def _spill(self, file_id: str, history: Deque[HistoryRecord]):
+        with self._db:
+            self._db.execute("DELETE FROM messages WHERE file_id = ?", (file_id,))
+            self._db.executemany(
+                "INSERT INTO messages (file_id, seq, role, content, sources) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (file_id, seq, record.role, record.content,
+                     json.dumps(record.sources) if record.sources else None)
+                    for seq, record in enumerate(history)
+                ]
+            )
+        self.spills += 1
+
+    def _restore(self, file_id: str) -> Optional[List[HistoryRecord]]:
+        with self._db:
+            rows = self._db.execute(
+                "SELECT role, content, sources FROM messages WHERE file_id = ? ORDER BY seq",
+                (file_id,)
+            ).fetchall()
+            if not rows:
+                return None
+            self._db.execute("DELETE FROM messages WHERE file_id = ?", (file_id,))
+        self.restores += 1
+        return [
+            HistoryRecord(
+                role,
+                content,
+                tuple(tuple(source) for source in json.loads(sources)) if sources else None
+            )
+            for role, content, sources in rows
+        ]
+
+    def _delete(self, file_id: str):
+        with self._db:
+            self._db.execute("DELETE FROM messages WHERE file_id = ?", (file_id,))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get residency statistics"""
+        with self._lock:
+            return {
+                "resident_histories": len(self.histories),
+                "resident_messages": sum(len(history) for history in self.histories.values()),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "spills": self.spills,
+                "restores": self.restores,
+            }
+
+
+# Create singleton instance
+history_store = HistoryStore(
+    max_turns=settings.chat_history_max_turns,
+    max_bytes=settings.chat_history_max_bytes,
+    spill_path=Path(settings.chat_history_spill_path) if settings.chat_history_spill_path else None,
+)
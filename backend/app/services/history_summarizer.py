@@ -0,0 +1,160 @@
+"""
+Rolling summaries of chat history
+Older turns of a conversation are folded into a running summary in the
+background, so prompts carry the summary and only the latest turns verbatim
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from backend.aimakerspace.openai_utils.tokens import truncate_to_tokens
+from backend.app.core.config import settings
+from backend.app.middleware.monitoring import token_usage_collector
+from backend.app.services.answer_cache import history_digest
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation about a document.
+Update the summary with the new turns. Keep the questions asked, the answers given with any page
+references, and facts the user stated about themselves or their goals. Drop pleasantries.
+Reply with the updated summary only, in at most {max_tokens} tokens."""
+
+# Summaries kept per file_id, for separate conversations about one document
+MAX_SUMMARIES_PER_FILE = 4
+
+# Folds turns into a summary: (previous summary, turns, api_key) -> summary
+Summarize = Callable[[str, List[Any], str], Awaitable[str]]
+
+
+class ConversationSummary:
+    """The summary of a conversation's first `covered` messages"""
+
+    __slots__ = ("covered", "digest", "text")
+
+    def __init__(self, covered: int, digest: str, text: str):
+        self.covered = covered
+        self.digest = digest
+        self.text = text
+
+
+class HistorySummarizer:
+    """
+    Keeps a running summary of each conversation's older turns.
+
+    A conversation is recognised by the digest of the messages its summary
+    covers, so clients that resend their full history pick up the summary
+    of its prefix. Once more than twice keep_turns turns are past the
+    summary, a background task folds all but the last keep_turns into it;
+    summarizing in blocks keeps the summary, and the prompt prefix, stable
+    for several turns at a time.
+    """
+
+    def __init__(
+        self,
+        keep_turns: int = 3,
+        max_summary_tokens: int = 300,
+        max_files: int = 1024,
+        summarize: Optional[Summarize] = None,
+    ):
+        self.keep_messages = keep_turns * 2
+        self.max_summary_tokens = max_summary_tokens
+        self.max_files = max_files
+        self.summarize = summarize or self._summarize_with_model
+        self.summaries: "OrderedDict[str, List[ConversationSummary]]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.updates = 0
+        self.failures = 0
+
+    def _find(self, file_id: str, history: List[Any]) -> Optional[ConversationSummary]:
+        for summary in self.summaries.get(file_id, ()):
+            if summary.covered <= len(history) and summary.digest == history_digest(history[:summary.covered]):
+                self.summaries.move_to_end(file_id)
+                return summary
+        return None
+
+    def compress(self, file_id: str, history: List[Any]) -> Tuple[Optional[str], List[Any]]:
+        """
+        Split a history into the summary of its older turns, if one is
+        ready, and the messages after them.
+        """
+        summary = self._find(file_id, history or [])
+        if summary is None:
+            return None, history
+        return summary.text, history[summary.covered:]
+
+    def schedule(self, file_id: str, history: List[Any], api_key: str) -> Optional[asyncio.Task]:
+        """Start a background update if enough turns are past the summary"""
+        if file_id in self._tasks:
+            # The next turn catches up with anything this one adds
+            return None
+        previous = self._find(file_id, history)
+        covered = previous.covered if previous else 0
+        if len(history) - covered <= 2 * self.keep_messages:
+            return None
+
+        task = asyncio.ensure_future(self._update(file_id, list(history), previous, api_key))
+        self._tasks[file_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(file_id, None))
+        return task
+
+    async def _update(
+        self,
+        file_id: str,
+        history: List[Any],
+        previous: Optional[ConversationSummary],
+        api_key: str
+    ):
+        covered = len(history) - self.keep_messages
+        turns = history[previous.covered if previous else 0:covered]
+        try:
+            text = await self.summarize(previous.text if previous else "", turns, api_key)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"History summary failed for {file_id}: {e}")
+            return
+
+        summary = ConversationSummary(
+            covered, history_digest(history[:covered]), truncate_to_tokens(text, self.max_summary_tokens)
+        )
+        summaries = self.summaries.setdefault(file_id, [])
+        if previous in summaries:
+            summaries.remove(previous)
+        summaries.insert(0, summary)
+        del summaries[MAX_SUMMARIES_PER_FILE:]
+        self.summaries.move_to_end(file_id)
+        while len(self.summaries) > self.max_files:
+            self.summaries.popitem(last=False)
+        self.updates += 1
+
+    async def _summarize_with_model(self, previous: str, turns: List[Any], api_key: str) -> str:
+        transcript = "\n\n".join(f"{message.role.capitalize()}: {message.content}" for message in turns)
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.format(max_tokens=self.max_summary_tokens)},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"
+            },
+        ]
+        os.environ["OPENAI_API_KEY"] = api_key
+        chat_model = ChatOpenAI(model_name=settings.history_summary_model)
+        text = await chat_model.arun(messages, max_tokens=self.max_summary_tokens)
+        token_usage_collector.record_usage(chat_model.last_usage, api_key, "chat.summary")
+        return text or previous
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "conversations": sum(len(summaries) for summaries in self.summaries.values()),
+            "updates": self.updates,
+            "failures": self.failures,
+            "in_progress": len(self._tasks),
+        }
+
+
+# Create singleton instance
+history_summarizer = HistorySummarizer(
+    keep_turns=settings.history_keep_turns,
+    max_summary_tokens=settings.history_summary_max_tokens,
+)
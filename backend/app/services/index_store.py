@@ -0,0 +1,16 @@
+"""
+The server's index store
+Indices live under the upload directory; loads from the event loop run on the shared thread pool
+"""
+from pathlib import Path
+
+from backend.aimakerspace.index_store import IndexStore
+from backend.app.core.config import settings
+from backend.app.core.performance import thread_pool
+
+# Create singleton instance
+index_store = IndexStore(
+    Path(settings.upload_dir) / "indices",
+    max_resident_bytes=settings.index_memory_budget_bytes,
+    executor=thread_pool,
+)
@@ -0,0 +1,282 @@
+"""
+Background ingestion jobs for uploaded PDFs
+Uploads are queued per API key and indexed by a bounded pool of workers
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from backend.app.core.config import settings
+from backend.app.middleware.monitoring import api_key_id
+from backend.app.services import pdf_service_instance
+
+logger = logging.getLogger(__name__)
+
+# Job stages, in order
+JOB_STAGES = ("queued", "parsing", "embedding", "indexed", "failed")
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be queued"""
+
+
+class IngestionJob:
+    """A queued or running PDF ingestion"""
+
+    def __init__(
+        self,
+        file_id: str,
+        file_path: Path,
+        filename: str,
+        size_bytes: int,
+        api_key: str,
+        content_hash: Optional[str] = None,
+        revision: bool = False,
+        destination: Optional[Path] = None,
+    ):
+        self.file_id = file_id
+        self.file_path = file_path
+        # Where the PDF is moved once indexed, if not indexed in place
+        self.destination = destination
+        self.filename = filename
+        self.size_bytes = size_bytes
+        self.api_key = api_key
+        self.key_id = api_key_id(api_key)
+        self.content_hash = content_hash
+        self.revision = revision
+        self.stage = "queued"
+        self.progress: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def update(self, progress: Dict[str, Any]):
+        """Record pipeline progress reported by the PDF service"""
+        self.progress = progress
+        self.stage = "embedding" if progress.get("parsing_done") else "parsing"
+
+    @property
+    def fraction_done(self) -> float:
+        if self.stage == "indexed":
+            return 1.0
+        if self.stage in ("queued", "failed"):
+            return 0.0
+
+        created = self.progress.get("chunks_created", 0)
+        embedded = self.progress.get("chunks_embedded", 0)
+        parsed = self.progress.get("pages_parsed", 0)
+        page_count = self.progress.get("page_count")
+        if not created:
+            return 0.0
+        if self.progress.get("parsing_done") or not page_count or not parsed:
+            expected_chunks = created
+        else:
+            # Extrapolate the chunk count from the pages parsed so far
+            expected_chunks = max(created, created / parsed * page_count)
+        return min(1.0, embedded / expected_chunks)
+
+    def eta_seconds(self) -> Optional[float]:
+        fraction = self.fraction_done
+        if self.started_at is None or self.finished_at is not None or fraction <= 0:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed * (1 - fraction) / fraction
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_id": self.file_id,
+            "job_id": self.file_id,
+            "filename": self.filename,
+            "size_bytes": self.size_bytes,
+            "status": self.stage,
+            "stage": self.stage,
+            "percent": round(self.fraction_done * 100, 1),
+            "eta_seconds": self.eta_seconds(),
+            "page_count": self.progress.get("page_count") or 0,
+            "pages_parsed": self.progress.get("pages_parsed", 0),
+            "chunk_count": self.progress.get("chunks_embedded", 0),
+            "has_vector_store": False,
+            "error": self.error,
+        }
+
+
+class IngestionJobQueue:
+    """
+    Bounded worker pool for ingestion jobs, fair across API keys.
+
+    Pending jobs are kept in one FIFO per API key and workers take from the
+    keys in round-robin order, so one client uploading many files does not
+    hold back everyone else.
+    """
+
+    def __init__(
+        self,
+        process: Callable[..., Any],
+        max_workers: int = 2,
+        max_queued: int = 100,
+        max_queued_per_key: int = 10,
+        max_finished: int = 1000,
+    ):
+        self.process = process
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_queued_per_key = max_queued_per_key
+        self.max_finished = max_finished
+        self.pending: "OrderedDict[str, Deque[IngestionJob]]" = OrderedDict()
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self.workers: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(jobs) for jobs in self.pending.values())
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.stage in ("parsing", "embedding"))
+
+    def submit(self, job: IngestionJob):
+        """Queue a job and make sure a worker will pick it up"""
+        if self.queued >= self.max_queued:
+            raise QueueFullError("Ingestion queue is full")
+        key_jobs = self.pending.setdefault(job.key_id, deque())
+        if len(key_jobs) >= self.max_queued_per_key:
+            raise QueueFullError("Too many uploads queued for this API key")
+
+        key_jobs.append(job)
+        self.jobs[job.file_id] = job
+        self._trim_finished()
+
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        if len(self.workers) < self.max_workers:
+            self.workers.append(asyncio.ensure_future(self._work()))
+
+    def get_job(self, file_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(file_id)
+
+    def get_status(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Job status with stage, percent done and ETA"""
+        job = self.jobs.get(file_id)
+        if job is None:
+            return None
+
+        status = job.to_dict()
+        if job.stage == "queued":
+            status["queue_position"] = self._queue_position(job)
+        return status
+
+    def _queue_position(self, job: IngestionJob) -> int:
+        # Round-robin order: a job waits for the jobs ahead of it in its own
+        # queue, plus up to as many from each other key
+        own_queue = self.pending.get(job.key_id, deque())
+        ahead = own_queue.index(job) if job in own_queue else 0
+        others = sum(
+            min(len(jobs), ahead + 1)
+            for key_id, jobs in self.pending.items() if key_id != job.key_id
+        )
+        return ahead + others + 1
+
+    def _next_job(self) -> Optional[IngestionJob]:
+        if not self.pending:
+            return None
+        key_id, key_jobs = next(iter(self.pending.items()))
+        job = key_jobs.popleft()
+        if key_jobs:
+            self.pending.move_to_end(key_id)
+        else:
+            del self.pending[key_id]
+        return job
+
+    async def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            await self._run(job)
+
+    async def _run(self, job: IngestionJob):
+        job.started_at = time.time()
+        job.stage = "parsing"
+        wait_seconds = job.started_at - job.created_at
+        self.wait_seconds_total += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+        try:
+            await self.process(
+                job.file_path,
+                job.file_id,
+                job.api_key,
+                on_progress=job.update,
+                content_hash=job.content_hash,
+                filename=job.filename,
+                revision=job.revision,
+            )
+            if job.destination is not None:
+                job.file_path.replace(job.destination)
+            job.stage = "indexed"
+            self.completed += 1
+            logger.info(f"Ingestion job completed: {job.file_id}")
+        except asyncio.CancelledError:
+            job.stage = "failed"
+            job.error = "Cancelled"
+            self.failed += 1
+            raise
+        except Exception as e:
+            job.stage = "failed"
+            job.error = "Failed to process PDF"
+            self.failed += 1
+            logger.error(f"Ingestion job failed: {job.file_id}: {str(e)}")
+            if job.file_path.exists():
+                job.file_path.unlink()
+        finally:
+            job.finished_at = time.time()
+            self.run_seconds_total += job.finished_at - job.started_at
+            # The key is only needed while the job runs
+            job.api_key = None
+
+    def _trim_finished(self):
+        finished = [
+            file_id for file_id, job in self.jobs.items() if job.finished_at is not None
+        ]
+        for file_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self.jobs[file_id]
+
+    async def shutdown(self):
+        """Cancel running workers"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and job latency metrics"""
+        started = self.completed + self.failed + self.running
+        finished = self.completed + self.failed
+        return {
+            "queued": self.queued,
+            "queued_api_keys": len(self.pending),
+            "running": self.running,
+            "workers": self.max_workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "average_wait_seconds": self.wait_seconds_total / started if started else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+            "average_run_seconds": self.run_seconds_total / finished if finished else 0.0,
+        }
+
+
+# Create singleton instance
+ingestion_jobs = IngestionJobQueue(
+    pdf_service_instance.process_pdf,
+    max_workers=settings.ingestion_workers,
+    max_queued=settings.ingestion_max_queued_jobs,
+    max_queued_per_key=settings.ingestion_max_queued_per_key,
+)
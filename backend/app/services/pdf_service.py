@@ -1,59 +1,164 @@
+import asyncio
 import os
 import uuid
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import logging
 
-from backend.aimakerspace.text_utils import PDFLoader, CharacterTextSplitter
+from backend.aimakerspace.dedup import MinHashDeduplicator
+from backend.aimakerspace.ingestion import IngestionPipeline
+from backend.aimakerspace.text_utils import DocumentText, PDFLoader
 from backend.aimakerspace.vectordatabase import VectorDatabase
 from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
 from backend.app.core.config import settings
-from backend.app.core.performance import measure_performance
+from backend.app.core.indexing import content_index_id, create_text_splitter, page_hash
+from backend.app.core.performance import (
+    extraction_pool,
+    get_process_pool,
+    measure_performance,
+    process_pool_workers,
+    thread_pool
+)
+from backend.app.middleware.monitoring import token_usage_collector
+from backend.app.services.answer_cache import answer_cache
+from backend.app.services.content_registry import content_registry
+from backend.app.services.index_store import index_store
+from backend.app.services.semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
 class PDFService:
     def __init__(self):
-        self.vector_stores: Dict[str, VectorDatabase] = {}
-        self.file_metadata: Dict[str, Dict[str, Any]] = {}
+        # Indices are persisted to disk and kept in memory within a byte budget
+        self.index_store = index_store
+        self.vector_stores: Dict[str, VectorDatabase] = index_store.resident
+        self.file_metadata: Dict[str, Dict[str, Any]] = index_store.file_metadata
+        # file_id -> shared index id, for deduplicated uploads
+        self.registry = content_registry
+        # Index ids currently being ingested, so identical uploads wait for one run
+        self._in_flight: Dict[str, asyncio.Future] = {}
         
     def generate_file_id(self) -> str:
         return str(uuid.uuid4())
     
+    def resolve_index_id(self, file_id: str) -> str:
+        return self.registry.resolve(file_id)
+    
+    def find_index(self, content_hash: str) -> Optional[str]:
+        """Index id of an already indexed file with this content, if any"""
+        index_id = content_index_id(content_hash)
+        return index_id if self.index_store.contains(index_id) else None
+    
+    def register_duplicate(self, file_id: str, index_id: str) -> Dict[str, Any]:
+        """Serve a file_id from an existing index, without any parsing or embedding"""
+        self._set_alias(file_id, index_id)
+        metadata = self.index_store.get_metadata(index_id) or {}
+        logger.info(f"Deduplicated upload {file_id} onto index {index_id}")
+        return {
+            "page_count": metadata.get("page_count", 0),
+            "chunk_count": metadata.get("chunk_count", 0)
+        }
+    
     @measure_performance("pdf_processing")
-    async def process_pdf(self, file_path: Path, file_id: str, api_key: str) -> Dict[str, Any]:
+    async def process_pdf(
+        self,
+        file_path: Path,
+        file_id: str,
+        api_key: str,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        content_hash: Optional[str] = None,
+        filename: Optional[str] = None,
+        revision: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Index a PDF for a file_id.
+        
+        With a content_hash the index is content-addressed: files already
+        indexed, or being indexed, are aliased instead of processed again.
+        With revision the PDF is a new version of an indexed file_id: only
+        pages whose content changed are embedded, and the file_id moves to
+        the new index once it is built.
+        """
+        base_index_id = self.resolve_index_id(file_id) if revision else None
+        if not content_hash:
+            result = await self._ingest(
+                file_path, file_id, file_id, api_key, on_progress, filename, base_index_id
+            )
+            if base_index_id is not None and base_index_id != file_id:
+                self._set_alias(file_id, file_id)
+            return result
+        
+        index_id = content_index_id(content_hash)
+        while (in_flight := self._in_flight.get(index_id)) is not None:
+            await asyncio.shield(in_flight)
+        if self.index_store.contains(index_id):
+            return self.register_duplicate(file_id, index_id)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[index_id] = future
+        try:
+            result = await self._ingest(
+                file_path, file_id, index_id, api_key, on_progress, filename, base_index_id
+            )
+            self._set_alias(file_id, index_id)
+            return result
+        finally:
+            # Waiters re-check the store, and ingest themselves if this run failed
+            del self._in_flight[index_id]
+            future.set_result(None)
+    
+    def _set_alias(self, file_id: str, index_id: str):
+        """Point a file_id at an index, freeing the index it leaves if nothing else uses it"""
+        previous = self.resolve_index_id(file_id)
+        if index_id == file_id:
+            # Unaliased: the file_id names its own index again
+            freed = self.registry.remove_alias(file_id)
+        else:
+            freed = self.registry.add_alias(file_id, index_id)
+            if previous == file_id and self.index_store.contains(previous):
+                # A file_id indexed before deduplication owned its index alone
+                freed = previous
+        if freed is not None and freed != index_id:
+            self._free_index(freed)
+    
+    def _free_index(self, index_id: str):
+        self.index_store.delete(index_id)
+        answer_cache.invalidate_file(index_id)
+        semantic_cache.invalidate_file(index_id)
+        logger.info(f"Freed index {index_id}")
+    
+    def _base_pages(self, base_index_id: Optional[str]) -> Dict[str, int]:
+        """Page hash -> page number of a revision's base index"""
+        if base_index_id is None:
+            return {}
+        metadata = self.index_store.get_metadata(base_index_id) or {}
+        base_pages: Dict[str, int] = {}
+        for page, hash_ in enumerate(metadata.get("page_hashes") or [], start=1):
+            base_pages.setdefault(hash_, page)
+        return base_pages
+    
+    async def _ingest(
+        self,
+        file_path: Path,
+        file_id: str,
+        index_id: str,
+        api_key: str,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]],
+        filename: Optional[str],
+        base_index_id: Optional[str] = None
+    ) -> Dict[str, Any]:
         try:
             # Load PDF
             logger.info(f"Loading PDF: {file_path}")
-            loader = PDFLoader(str(file_path))
-            loader.load()
-            documents = loader.documents
-            
-            if not documents:
-                raise ValueError("No content extracted from PDF")
-            
-            # Split into chunks
-            text_splitter = CharacterTextSplitter(
-                chunk_size=settings.chunk_size,
-                chunk_overlap=settings.chunk_overlap
+            loader = PDFLoader(
+                str(file_path),
+                max_workers=process_pool_workers(),
+                executor=get_process_pool(),
+                page_timeout=settings.pdf_page_timeout_seconds or None,
+                document_timeout=settings.pdf_document_timeout_seconds or None
             )
-            
-            chunks = []
-            chunk_metadata = []
-            
-            for doc_idx, document in enumerate(documents):
-                doc_chunks = text_splitter.split(document)
-                for chunk_idx, chunk in enumerate(doc_chunks):
-                    chunks.append(chunk)
-                    chunk_metadata.append({
-                        "file_id": file_id,
-                        "page": doc_idx + 1,
-                        "chunk_id": f"{file_id}_p{doc_idx + 1}_c{chunk_idx}",
-                        "chunk_index": chunk_idx,
-                        "total_chunks": len(doc_chunks)
-                    })
-            
-            logger.info(f"Created {len(chunks)} chunks from PDF")
+            text_splitter = create_text_splitter()
             
             # Create embeddings
             os.environ["OPENAI_API_KEY"] = api_key
@@ -62,40 +167,212 @@ class PDFService:
             # Create vector database with embedding model
             vector_db = VectorDatabase(embedding_model=embedding_model)
             
-            # Build the vector database from chunks
-            await vector_db.abuild_from_list(chunks)
+            # A revision reuses the chunks of pages found unchanged in the base
+            # index; only the other pages go through the pipeline
+            base_pages = self._base_pages(base_index_id)
+            base_db = await self.index_store.aget(base_index_id) if base_pages else None
+            page_hashes: List[str] = []
+            page_texts: List[str] = []
+            reused: Dict[int, int] = {}
+            embedded_pages: List[int] = []
+            
+            def pages() -> Iterator[str]:
+                with closing(loader.iter_pages()) as source:
+                    for page, text in enumerate(source, start=1):
+                        hash_ = page_hash(text)
+                        page_hashes.append(hash_)
+                        page_texts.append(text)
+                        base_page = base_pages.get(hash_)
+                        if base_db is not None and base_page is not None and base_page not in reused:
+                            reused[base_page] = page
+                            continue
+                        embedded_pages.append(page)
+                        yield text
             
-            # Store metadata separately (since VectorDatabase doesn't handle metadata)
-            # We'll need to map chunk indices to metadata
-            vector_db.metadata = chunk_metadata
+            def make_metadata(pipeline_page: int, chunk_idx: int, total_chunks: int) -> Dict[str, Any]:
+                page = embedded_pages[pipeline_page - 1]
+                # Keyed by index, not file_id: a shared index must not reveal
+                # the file_id of whoever uploaded it first
+                return {
+                    "index_id": index_id,
+                    "page": page,
+                    "chunk_id": f"{index_id}_p{page}_c{chunk_idx}",
+                    "chunk_index": chunk_idx,
+                    "total_chunks": total_chunks
+                }
             
-            # Store in memory
-            self.vector_stores[file_id] = vector_db
-            self.file_metadata[file_id] = {
-                "filename": file_path.name,
-                "page_count": len(documents),
-                "chunk_count": len(chunks),
+            # Pages stream from the extraction workers through the splitter
+            # into embedding batches, so parsing and embedding overlap
+            pipeline = IngestionPipeline(
+                text_splitter,
+                embedding_model,
+                batch_size=settings.embedding_batch_size,
+                max_concurrent_batches=settings.embedding_concurrency,
+                executor=extraction_pool,
+                deduplicator=(
+                    MinHashDeduplicator(threshold=settings.dedup_threshold)
+                    if settings.dedup_chunks else None
+                )
+            )
+            
+            def report(stats: Dict[str, Any]):
+                if on_progress is not None:
+                    on_progress({**stats, "pages_parsed": len(page_hashes), "page_count": loader.page_count})
+            
+            stats = await pipeline.run(pages(), vector_db, make_metadata, report)
+            token_usage_collector.record_usage(
+                {"prompt_tokens": embedding_model.tokens_used, "total_tokens": embedding_model.tokens_used},
+                api_key,
+                "upload.pdf"
+            )
+            
+            if base_db is not None:
+                vector_db = self._revise(
+                    base_db, index_id, reused, vector_db, DocumentText.from_pages(page_texts)
+                )
+            
+            if not vector_db.count():
+                raise ValueError("No content extracted from PDF")
+            
+            logger.info(
+                f"Indexed {stats['chunks_embedded']} chunks from {stats['pages_parsed']} pages "
+                f"in {stats['batches_embedded']} embedding batches"
+                + (f", reusing {len(reused)} unchanged pages" if base_db is not None else "")
+            )
+            for page, reason in loader.skipped_pages.items():
+                logger.warning(f"Skipped page {page} of {file_id}: {reason}")
+            if stats["chunks_deduplicated"]:
+                logger.info(
+                    f"Skipped {stats['chunks_deduplicated']} near-duplicate chunks, saving "
+                    f"~{stats['embedding_tokens_saved']} embedding tokens and "
+                    f"{stats['index_bytes_saved']} bytes of vectors"
+                )
+            
+            # Persist the index and keep it resident
+            metadata = {
+                "filename": filename or file_path.name,
+                "page_count": len(page_hashes),
+                "chunk_count": vector_db.count(),
+                "page_hashes": page_hashes,
+                "deduplicated_chunks": stats["chunks_deduplicated"],
+                "skipped_pages": [
+                    {"page": page, "reason": reason} for page, reason in loader.skipped_pages.items()
+                ],
                 "status": "indexed"
             }
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(thread_pool, self.index_store.save, index_id, vector_db, metadata)
+            if index_id == base_index_id:
+                # Rebuilt in place: answers from the old version are stale
+                answer_cache.invalidate_file(index_id)
+                semantic_cache.invalidate_file(index_id)
             
             return {
-                "page_count": len(documents),
-                "chunk_count": len(chunks)
+                "page_count": len(page_hashes),
+                "chunk_count": vector_db.count()
             }
             
         except Exception as e:
             logger.error(f"Failed to process PDF: {str(e)}")
             raise
     
+    def _revise(
+        self,
+        base_db: VectorDatabase,
+        index_id: str,
+        reused: Dict[int, int],
+        changed_db: VectorDatabase,
+        document: DocumentText
+    ) -> VectorDatabase:
+        """
+        Build a revision's index from a copy of its base.
+        
+        The base may be shared with other file_ids, so it is never modified:
+        chunks of pages that changed or were removed are tombstoned in the
+        copy and reused pages are renumbered. Chunk spans are page-relative,
+        so a reused page that moved only needs its keys renumbered. A removed
+        row whose near-duplicates survive on reused pages is kept, keyed by
+        the first of them. The new pages' chunks, numbered by their position
+        among the changed pages, are appended under their real page numbers.
+        """
+        def renumber(metadata: Dict[str, Any], page: int) -> Dict[str, Any]:
+            metadata.update(
+                index_id=index_id,
+                page=page,
+                chunk_id=f"{index_id}_p{page}_c{metadata.get('chunk_index', 0)}"
+            )
+            return metadata
+        
+        vector_db = base_db.copy()
+        vector_db.embedding_model = changed_db.embedding_model
+        moved = []
+        for key, metadata in zip(list(vector_db.vectors), vector_db.metadata):
+            base_page = metadata.get("page")
+            page = reused.get(base_page)
+            # The duplicates list is shared with the base, so rebuild it
+            duplicates = [
+                renumber(dict(duplicate), reused[duplicate["page"]])
+                for duplicate in metadata.pop("duplicates", [])
+                if duplicate.get("page") in reused
+            ]
+            if page is None:
+                vector_db.delete(key)
+                if duplicates and isinstance(key, tuple):
+                    promoted = duplicates.pop(0)
+                    if duplicates:
+                        promoted["duplicates"] = duplicates
+                    span = (promoted["page"], promoted.pop("start"), promoted.pop("end"))
+                    moved.append((span, vector_db.vectors[key], promoted))
+                continue
+            renumber(metadata, page)
+            if duplicates:
+                metadata["duplicates"] = duplicates
+            if page != base_page and isinstance(key, tuple):
+                moved.append(((page,) + key[1:], vector_db.vectors[key], metadata))
+                vector_db.delete(key)
+        vector_db.compact()
+        
+        for key, vector, metadata in moved:
+            vector_db.insert(key, vector, metadata)
+        for key, metadata in zip(changed_db.vectors, changed_db.metadata):
+            vector_db.insert((metadata["page"],) + key[1:], changed_db.vectors[key], metadata)
+        vector_db.document = document
+        return vector_db
+    
     def get_file_status(self, file_id: str) -> Dict[str, Any]:
-        if file_id not in self.file_metadata:
+        index_id = self.resolve_index_id(file_id)
+        file_metadata = self.index_store.get_metadata(index_id)
+        if file_metadata is None:
             return None
         
-        metadata = self.file_metadata[file_id].copy()
+        metadata = file_metadata.copy()
         metadata["file_id"] = file_id
-        metadata["has_vector_store"] = file_id in self.vector_stores
+        metadata["has_vector_store"] = self.index_store.contains(index_id)
         
         return metadata
     
     def get_vector_store(self, file_id: str) -> VectorDatabase:
-        return self.vector_stores.get(file_id)
\ No newline at end of file
+        # Loads the index from disk on first use after a restart or eviction
+        return self.index_store.get(self.resolve_index_id(file_id))
+
+    async def aget_vector_store(self, file_id: str) -> VectorDatabase:
+        # As get_vector_store, with any load from disk kept off the event loop
+        return await self.index_store.aget(self.resolve_index_id(file_id))
+    
+    def delete_file(self, file_id: str) -> bool:
+        """
+        Delete a file_id. Its index is freed once no other file_id shares it.
+        
+        :return: False if the file_id is unknown
+        """
+        index_id = self.resolve_index_id(file_id)
+        if index_id == file_id and not self.index_store.contains(index_id):
+            return False
+        
+        if index_id == file_id or self.registry.remove_alias(file_id) is not None:
+            self._free_index(index_id)
+        
+        upload_path = Path(settings.upload_dir) / f"{Path(file_id).name}.pdf"
+        if upload_path.exists():
+            upload_path.unlink()
+        return True
\ No newline at end of file
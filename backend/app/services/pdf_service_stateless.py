@@ -2,6 +2,7 @@
 Stateless PDF Service for Vercel Deployment
 Returns all data to client, no server-side storage needed
 """
+import asyncio
 import os
 import uuid
 from typing import Dict, Any
@@ -10,6 +11,8 @@ import logging
 from backend.aimakerspace.text_utils import PDFLoader, CharacterTextSplitter
 from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
 from backend.app.core.config import settings
+from backend.app.core.performance import extraction_pool, get_process_pool, process_pool_workers
+from backend.app.middleware.monitoring import token_usage_collector
 
 logger = logging.getLogger(__name__)
 
@@ -30,18 +33,24 @@ class StatelessPDFService:
         try:
             file_id = self.generate_file_id()
             
-            # Save to /tmp for processing (Vercel allows this)
-            temp_path = f"/tmp/{file_id}.pdf"
-            with open(temp_path, 'wb') as f:
-                f.write(file_content)
-            
-            # Load and process PDF
-            logger.info(f"Loading PDF: {temp_path}")
-            loader = PDFLoader(temp_path)
-            loader.load()
+            # Parse the upload in memory; no temp file needed
+            logger.info(f"Loading PDF: {filename} ({len(file_content)} bytes)")
+            loader = PDFLoader(
+                file_content,
+                max_workers=process_pool_workers(),
+                executor=get_process_pool(),
+                page_timeout=settings.pdf_page_timeout_seconds or None,
+                document_timeout=settings.pdf_document_timeout_seconds or None
+            )
+            # Pages are extracted in worker processes; wait in a thread so
+            # the event loop stays free
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(extraction_pool, loader.load)
             documents = loader.documents
+            for page, reason in loader.skipped_pages.items():
+                logger.warning(f"Skipped page {page} of {filename}: {reason}")
             
-            if not documents:
+            if not any(page.strip() for page in documents):
                 raise ValueError("No content extracted from PDF")
             
             logger.info(f"Loaded {len(documents)} pages from PDF")
@@ -71,13 +80,10 @@ class StatelessPDFService:
             os.environ["OPENAI_API_KEY"] = api_key
             embedding_model = EmbeddingModel(embeddings_model_name=settings.embedding_model)
             embeddings = await embedding_model.async_get_embeddings(chunks)
+            token_usage_collector.record_usage(embedding_model.last_usage, api_key, "stateless.upload")
             
             logger.info(f"Generated embeddings for {len(chunks)} chunks")
             
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
             # Return all data to client
             return {
                 "file_id": file_id,
@@ -92,9 +98,6 @@ class StatelessPDFService:
             
         except Exception as e:
             logger.error(f"Failed to process PDF: {str(e)}")
-            # Clean up temp file on error
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                os.remove(temp_path)
             raise
 
 # Create singleton instance
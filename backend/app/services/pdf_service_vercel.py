@@ -2,6 +2,7 @@
 PDF Service for Vercel Deployment
 Uses Vercel Blob for file storage and KV for metadata/vectors
 """
+import asyncio
 import os
 import uuid
 import json
@@ -12,6 +13,7 @@ from pathlib import Path
 from backend.aimakerspace.text_utils import PDFLoader, CharacterTextSplitter
 from backend.aimakerspace.openai_utils.embedding import EmbeddingModel
 from backend.app.core.config import settings
+from backend.app.core.performance import extraction_pool
 
 logger = logging.getLogger(__name__)
 
@@ -58,16 +60,20 @@ class PDFServiceVercel:
             # Upload to blob storage
             blob_url = await self.upload_to_blob(file_content, f"{file_id}.pdf")
             
-            # For processing, we need a local temp file
-            temp_path = f"/tmp/{file_id}.pdf"
-            with open(temp_path, 'wb') as f:
-                f.write(file_content)
-            
-            # Load and process PDF
-            loader = PDFLoader(temp_path)
-            documents = loader.load()
+            # Parse the upload in memory; no temp file needed
+            loader = PDFLoader(
+                file_content,
+                page_timeout=settings.pdf_page_timeout_seconds or None,
+                document_timeout=settings.pdf_document_timeout_seconds or None
+            )
+            # Extraction can take up to the document time budget; wait in a
+            # thread so the event loop stays free
+            loop = asyncio.get_running_loop()
+            documents = await loop.run_in_executor(extraction_pool, loader.load_documents)
+            for page, reason in loader.skipped_pages.items():
+                logger.warning(f"Skipped page {page} of {file_id}: {reason}")
             
-            if not documents:
+            if not any(page.strip() for page in documents):
                 raise ValueError("No content extracted from PDF")
             
             # Split into chunks
@@ -105,14 +111,13 @@ class PDFServiceVercel:
                 "blob_url": blob_url,
                 "page_count": len(documents),
                 "chunk_count": len(chunks),
+                "skipped_pages": [
+                    {"page": page, "reason": reason} for page, reason in loader.skipped_pages.items()
+                ],
                 "status": "indexed"
             }
             await self.store_metadata(file_id, metadata)
             
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
             return {
                 "page_count": len(documents),
                 "chunk_count": len(chunks)
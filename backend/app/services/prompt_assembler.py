@@ -0,0 +1,191 @@
+"""
+Token-budgeted prompt assembly for RAG chat
+Packs retrieved chunks and conversation history into per-model token budgets
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.aimakerspace.openai_utils.prompts import SystemRolePrompt, UserRolePrompt
+from backend.aimakerspace.openai_utils.tokens import (
+    MESSAGE_OVERHEAD_TOKENS,
+    estimate_message_tokens,
+    estimate_tokens,
+    truncate_to_tokens,
+)
+from backend.app.core.config import settings
+
+# Shorter shared runs are treated as coincidence rather than splitter overlap
+MIN_OVERLAP_CHARS = 20
+
+# Prompt layouts: "legacy" puts context and question before history, while
+# "prefix_cache" keeps the stable parts first so provider prompt caching can hit
+PROMPT_LAYOUTS = ("legacy", "prefix_cache")
+
+DOCUMENT_PREAMBLE = """You are answering questions about the document "{filename}" ({page_count} pages).
+Each question arrives with excerpts retrieved from this document, labelled [Source N]."""
+
+HISTORY_SUMMARY_PREAMBLE = "Summary of the earlier conversation:\n{summary}"
+
+
+def budgets_for_model(model: str) -> Tuple[int, int]:
+    """Get the (context, history) token budgets configured for a chat model"""
+    context_budget = settings.context_token_budgets.get(
+        model, settings.default_context_token_budget
+    )
+    history_budget = settings.history_token_budgets.get(
+        model, settings.default_history_token_budget
+    )
+    return context_budget, history_budget
+
+
+def overlap_length(left: str, right: str, max_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right"""
+    limit = min(len(left), len(right), max_overlap)
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class PromptAssembler:
+    """Builds chat messages from retrieved chunks and history within token budgets"""
+
+    def __init__(
+        self,
+        system_prompt: str,
+        context_budget: int,
+        history_budget: int,
+        max_overlap: int = None,
+        layout: str = "legacy",
+    ):
+        if layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Unknown prompt layout: {layout}")
+
+        self.system_prompt = system_prompt
+        self.context_budget = context_budget
+        self.history_budget = history_budget
+        self.max_overlap = max_overlap if max_overlap is not None else settings.chunk_overlap
+        self.layout = layout
+
+    @classmethod
+    def for_model(cls, system_prompt: str, model: str) -> "PromptAssembler":
+        context_budget, history_budget = budgets_for_model(model)
+        return cls(system_prompt, context_budget, history_budget, layout=settings.prompt_layout)
+
+    def pack_chunks(self, chunks: List[str]) -> Tuple[List[str], List[int]]:
+        """
+        Pack chunks in score order until the context budget is reached.
+
+        Text shared with an already packed neighbouring chunk is trimmed so the
+        splitter's overlap is only paid for once.
+
+        :return: The packed chunk texts and their indices in the input list
+        """
+        packed: List[str] = []
+        indices: List[int] = []
+        used_tokens = 0
+
+        for idx, chunk in enumerate(chunks):
+            text = chunk
+            for previous in packed:
+                # Previous chunk runs into this one
+                size = overlap_length(previous, text, self.max_overlap)
+                if size:
+                    text = text[size:]
+                # This chunk runs into the previous one
+                size = overlap_length(text, previous, self.max_overlap)
+                if size:
+                    text = text[:-size]
+
+            text = text.strip()
+            if not text:
+                continue
+
+            label = f"[Source {len(packed) + 1}] "
+            tokens = estimate_tokens(label + text)
+            if used_tokens + tokens > self.context_budget:
+                if packed:
+                    # Keep looking: a shorter, lower-ranked chunk may still fit
+                    continue
+                # Always include the best chunk, truncated to the budget
+                text = truncate_to_tokens(text, self.context_budget - estimate_tokens(label))
+                tokens = estimate_tokens(label + text)
+
+            packed.append(text)
+            indices.append(idx)
+            used_tokens += tokens
+
+        return packed, indices
+
+    def pack_history(self, history: List[Any]) -> List[Dict[str, str]]:
+        """Keep the most recent history messages that fit the history budget"""
+        kept: List[Dict[str, str]] = []
+        used_tokens = 0
+
+        for hist_msg in reversed(history or []):
+            tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(hist_msg.content)
+            if used_tokens + tokens > self.history_budget:
+                break
+            if hist_msg.role == "user":
+                kept.append(UserRolePrompt(hist_msg.content).create_message(format=False))
+            else:
+                kept.append({"role": "assistant", "content": hist_msg.content})
+            used_tokens += tokens
+
+        kept.reverse()
+        return kept
+
+    def assemble(
+        self,
+        question: str,
+        chunks: List[str],
+        history: List[Any],
+        document: Dict[str, Any] = None,
+        summary: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Assemble the chat messages for a question.
+
+        :param question: The user's question
+        :param chunks: Retrieved chunk texts, best match first
+        :param history: Previous ChatMessage objects, oldest first
+        :param document: File metadata used for the per-document preamble
+        :param summary: Summary of the conversation before history, placed
+            ahead of it
+        :return: Dictionary with the messages, their estimated prompt tokens and
+            the indices of the chunks that made it into the context
+        """
+        packed, indices = self.pack_chunks(chunks)
+        context = "\n\n".join(
+            f"[Source {idx + 1}] {text}" for idx, text in enumerate(packed)
+        )
+        question_message = UserRolePrompt(
+            f"Context from PDF:\n{context}\n\nUser Question: {question}"
+        ).create_message(format=False)
+        history_messages = self.pack_history(history)
+        summary_messages = [
+            {"role": "system", "content": HISTORY_SUMMARY_PREAMBLE.format(summary=summary)}
+        ] if summary else []
+
+        messages = [SystemRolePrompt(self.system_prompt).create_message(format=False)]
+        if self.layout == "prefix_cache":
+            # System prompt, document preamble and history only ever grow at
+            # the end, so each turn's prompt extends the previous one's prefix
+            if document:
+                messages.append(
+                    SystemRolePrompt(DOCUMENT_PREAMBLE).create_message(
+                        filename=document.get("filename", "unknown"),
+                        page_count=document.get("page_count", "unknown"),
+                    )
+                )
+            messages.extend(summary_messages + history_messages)
+            messages.append(question_message)
+        else:
+            messages.append(question_message)
+            messages.extend(summary_messages + history_messages)
+
+        return {
+            "messages": messages,
+            "prompt_tokens": estimate_message_tokens(messages),
+            "chunk_indices": indices,
+            "history_messages": len(history_messages),
+        }
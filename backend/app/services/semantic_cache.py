@@ -0,0 +1,216 @@
+"""
+Semantic answer cache for chat responses
+Serves paraphrased questions from a per-document index of previous question embeddings
+"""
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.aimakerspace.vectordatabase import VectorDatabase
+from backend.app.core.config import settings
+from backend.app.services.answer_cache import normalize_question
+
+# Hits this close to the threshold are counted as borderline for auditing
+BORDERLINE_MARGIN = 0.02
+
+
+class SemanticAnswerCache:
+    """
+    Per-document cache of answers looked up by question-embedding similarity,
+    with documents evicted least recently used first past a byte budget
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries_per_file: int = 256,
+        ttl_seconds: float = 3600,
+        audit_size: int = 100,
+        max_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.threshold = threshold
+        self.max_entries_per_file = max_entries_per_file
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.indices: Dict[str, VectorDatabase] = {}
+        # Documents in least recently used order, each with its answers in
+        # insertion order, which is also expiry order
+        self.answers: "OrderedDict[str, OrderedDict[str, Dict[str, Any]]]" = OrderedDict()
+        self.current_bytes = 0
+        self.evictions = 0
+        self.recent_hits: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self.audit_samples = deque(maxlen=audit_size)
+        self.audit_size = audit_size
+        self.lookups = 0
+        self.hits = 0
+        self.borderline_hits = 0
+        self.false_hits = 0
+        self.hit_similarity_total = 0.0
+
+    def lookup(
+        self, file_id: str, question: str, query_vector: np.ndarray
+    ) -> Optional[Dict[str, Any]]:
+        """Find a cached answer for a question similar enough to this one"""
+        self.lookups += 1
+        # Expired answers are dropped first, so one never hides a valid
+        # match ranked just below it
+        self._expire(file_id)
+        index = self.indices.get(file_id)
+        if index is None:
+            return None
+        self.answers.move_to_end(file_id)
+
+        results = index.search(query_vector, k=1)
+        if not results:
+            return None
+
+        matched_question, similarity = results[0]
+        similarity = float(similarity)
+        if similarity < self.threshold:
+            return None
+
+        entry = self.answers[file_id][matched_question]
+        self.hits += 1
+        self.hit_similarity_total += similarity
+        if similarity < self.threshold + BORDERLINE_MARGIN:
+            self.borderline_hits += 1
+
+        normalized = normalize_question(question)
+        self.recent_hits[(file_id, normalized)] = matched_question
+        self.recent_hits.move_to_end((file_id, normalized))
+        if len(self.recent_hits) > self.audit_size:
+            self.recent_hits.popitem(last=False)
+
+        self.audit_samples.append({
+            "file_id": file_id,
+            "question": normalized,
+            "matched_question": matched_question,
+            "similarity": similarity,
+        })
+
+        return {"message": entry["message"], "sources": entry["sources"]}
+
+    def add(
+        self,
+        file_id: str,
+        question: str,
+        query_vector: np.ndarray,
+        message: str,
+        sources: List[Dict[str, Any]],
+    ):
+        """Remember an answer under its question embedding"""
+        normalized = normalize_question(question)
+        query_vector = np.asarray(query_vector)
+        size = (
+            query_vector.nbytes
+            + len(message.encode("utf-8"))
+            + len(json.dumps(sources).encode("utf-8"))
+        )
+        if size > self.max_bytes:
+            return
+
+        self._remove(file_id, normalized)
+        index = self.indices.get(file_id)
+        if index is None:
+            index = VectorDatabase()
+            self.indices[file_id] = index
+            self.answers[file_id] = OrderedDict()
+        self.answers.move_to_end(file_id)
+
+        answers = self.answers[file_id]
+        index.insert(normalized, query_vector)
+        answers[normalized] = {
+            "message": message,
+            "sources": sources,
+            "size": size,
+            "expires_at": time.time() + self.ttl_seconds,
+        }
+        self.current_bytes += size
+
+        # Drop the oldest questions once the document's index is full
+        while len(answers) > self.max_entries_per_file:
+            oldest = next(iter(answers))
+            self._remove(file_id, oldest)
+
+        # Then the least recently used documents, until we fit the byte budget
+        while self.current_bytes > self.max_bytes and len(self.answers) > 1:
+            self.invalidate_file(next(iter(self.answers)))
+            self.evictions += 1
+
+    def report_false_hit(self, file_id: str, question: str) -> bool:
+        """Record that a semantic hit served the wrong answer and drop that entry"""
+        matched_question = self.recent_hits.pop(
+            (file_id, normalize_question(question)), None
+        )
+        if matched_question is None:
+            return False
+
+        self.false_hits += 1
+        self._remove(file_id, matched_question)
+        return True
+
+    def invalidate_file(self, file_id: str):
+        """Drop every cached answer for a document"""
+        self.indices.pop(file_id, None)
+        answers = self.answers.pop(file_id, None)
+        if answers is not None:
+            self.current_bytes -= sum(entry["size"] for entry in answers.values())
+
+    def clear(self):
+        """Clear cache"""
+        self.indices.clear()
+        self.answers.clear()
+        self.current_bytes = 0
+        self.recent_hits.clear()
+        self.audit_samples.clear()
+
+    def _expire(self, file_id: str):
+        answers = self.answers.get(file_id)
+        now = time.time()
+        while answers and next(iter(answers.values()))["expires_at"] < now:
+            self._remove(file_id, next(iter(answers)))
+
+    def _remove(self, file_id: str, question: str):
+        answers = self.answers.get(file_id)
+        if answers is None or question not in answers:
+            return
+        self.current_bytes -= answers.pop(question)["size"]
+        if not answers:
+            self.invalidate_file(file_id)
+            return
+        index = self.indices[file_id]
+        index.delete(question)
+        index.compact()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics, including false-hit audit data"""
+        return {
+            "threshold": self.threshold,
+            "documents": len(self.answers),
+            "entries": sum(len(answers) for answers in self.answers.values()),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "average_hit_similarity": (
+                self.hit_similarity_total / self.hits if self.hits else None
+            ),
+            "borderline_hits": self.borderline_hits,
+            "false_hits_reported": self.false_hits,
+            "false_hit_rate": self.false_hits / self.hits if self.hits else 0.0,
+            "recent_hits": list(self.audit_samples)[-10:],
+        }
+
+
+# Create singleton instance
+semantic_cache = SemanticAnswerCache(
+    threshold=settings.semantic_cache_threshold,
+    max_entries_per_file=settings.semantic_cache_max_entries_per_file,
+    ttl_seconds=settings.answer_cache_ttl_seconds,
+    max_bytes=settings.semantic_cache_max_bytes,
+)
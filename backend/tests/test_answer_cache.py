@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import patch
+
+from backend.app.models.chat import ChatMessage
+from backend.app.services.answer_cache import AnswerCache, normalize_question
+
+
+class TestAnswerCache:
+    """Tests for the exact-match answer cache"""
+
+    @pytest.fixture
+    def cache(self):
+        return AnswerCache(max_bytes=1024, ttl_seconds=60)
+
+    @pytest.fixture
+    def sources(self):
+        return [{"page": 1, "chunk_id": "doc_p1_c0", "content": "Intro", "relevance_score": 0.9}]
+
+    def test_normalize_question(self):
+        """Test that trivial variations normalize to the same question"""
+        assert normalize_question("  Summarize   this paper? ") == "summarize this paper"
+        assert normalize_question("Summarize this paper.") == "summarize this paper"
+
+    def test_key_depends_on_history_and_params(self, cache):
+        """Test that history and retrieval params change the key"""
+        history = [ChatMessage(role="user", content="Hi"), ChatMessage(role="assistant", content="Hello")]
+
+        base = cache.make_key("file-1", "gpt-4.1-mini", "What is this?", [], 5)
+        assert base == cache.make_key("file-1", "gpt-4.1-mini", "what is this", [], 5)
+        assert base != cache.make_key("file-1", "gpt-4.1-mini", "What is this?", history, 5)
+        assert base != cache.make_key("file-1", "gpt-4.1-mini", "What is this?", [], 3)
+        assert base != cache.make_key("file-2", "gpt-4.1-mini", "What is this?", [], 5)
+
+    def test_hit_and_miss(self, cache, sources):
+        """Test that stored answers are returned with their sources"""
+        key = cache.make_key("file-1", "gpt-4.1-mini", "What is this?", [], 5)
+        assert cache.get(key) is None
+
+        cache.set(key, "file-1", "An answer", sources)
+        cached = cache.get(key)
+
+        assert cached["message"] == "An answer"
+        assert cached["sources"] == sources
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 1
+
+    def test_ttl_expiry(self, cache, sources):
+        """Test that expired entries are not served"""
+        cache.set("key", "file-1", "An answer", sources)
+
+        with patch("backend.app.services.answer_cache.time.time", return_value=10**12):
+            assert cache.get("key") is None
+        assert cache.get_stats()["entries"] == 0
+
+    def test_byte_bounded_eviction(self, cache, sources):
+        """Test that least recently used entries are evicted to fit the byte budget"""
+        cache.set("first", "file-1", "a" * 300, sources)
+        cache.set("second", "file-1", "b" * 300, sources)
+        cache.get("first")
+        cache.set("third", "file-2", "c" * 300, sources)
+
+        assert cache.current_bytes <= cache.max_bytes
+        assert cache.get("second") is None
+        assert cache.get("first") is not None
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_invalidate_file(self, cache, sources):
+        """Test that invalidating a document drops only its answers"""
+        cache.set("first", "file-1", "answer", sources)
+        cache.set("second", "file-2", "answer", sources)
+
+        assert cache.invalidate_file("file-1") == 1
+        assert cache.get("first") is None
+        assert cache.get("second") is not None
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import uuid
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.aimakerspace.vectordatabase import VectorDatabase
+from backend.app.api.endpoints import chat as chat_endpoint
+from backend.app.main import app
+from backend.app.core.config import settings
+from backend.app.services import chat_service as chat_module
+from backend.app.services.answer_cache import answer_cache
+from backend.app.models.chat import ChatBatchResult
+from backend.app.services.chat_service import ChatService
+
+
+class FakePDFService:
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+        self.index_id = f"test-{uuid.uuid4().hex}"
+
+    def get_vector_store(self, file_id):
+        return self.vector_store if file_id == "doc" else None
+
+    async def aget_vector_store(self, file_id):
+        return self.get_vector_store(file_id)
+
+    def resolve_index_id(self, file_id):
+        return self.index_id
+
+    def get_file_status(self, file_id):
+        return {"filename": "paper.pdf", "page_count": 3}
+
+
+class FakeChatModel:
+    """Answers with the question, tracking how many completions overlap"""
+
+    active = 0
+    peak = 0
+    calls = 0
+
+    def __init__(self, model_name=None):
+        self.last_usage = {}
+
+    async def arun(self, messages, text_only=True, **kwargs):
+        cls = FakeChatModel
+        cls.calls += 1
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        question = messages[-1]["content"].split("User Question: ")[-1]
+        try:
+            # Later questions finish first
+            await asyncio.sleep(0.05 if "q0" in question else 0.01)
+        finally:
+            cls.active -= 1
+        self.last_usage = {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12}
+        return f"answer to {question}"
+
+
+def make_vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim))
+
+
+class TestBatchSearch:
+    """Tests for scoring several queries with one matrix product"""
+
+    def test_matches_single_query_search(self):
+        """Test that batched results equal per-query cosine search, tombstones included"""
+        vector_db = VectorDatabase()
+        for i, vector in enumerate(make_vectors(40)):
+            vector_db.insert(f"chunk {i}", vector)
+        vector_db.delete("chunk 3")
+        queries = make_vectors(6, seed=1)
+
+        batched = vector_db.search_batch(queries, k=5)
+
+        for query, results in zip(queries, batched):
+            expected = vector_db.search(query, k=5)
+            assert [key for key, _ in results] == [key for key, _ in expected]
+            assert np.allclose([score for _, score in results], [score for _, score in expected])
+        assert all("chunk 3" not in [key for key, _ in results] for results in batched)
+
+    def test_empty_database(self):
+        """Test that an empty database gives one empty result per query"""
+        assert VectorDatabase().search_batch(make_vectors(3), k=5) == [[], [], []]
+
+
+class TestChatBatch:
+    """Tests for answering a batch of questions about one document"""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        vector_db = VectorDatabase()
+        for i, vector in enumerate(make_vectors(20)):
+            vector_db.insert(f"Excerpt {i} of the paper.", vector, {"page": i % 3 + 1, "chunk_id": f"chunk_{i}"})
+
+        service = ChatService()
+        service.pdf_service = FakePDFService(vector_db)
+        service.embed_calls = []
+
+        async def embed_queries(messages, api_key, endpoint):
+            service.embed_calls.append(list(messages))
+            return make_vectors(len(messages), seed=len(service.embed_calls) + 10)
+
+        monkeypatch.setattr(service, "_embed_queries", embed_queries)
+        monkeypatch.setattr(chat_module, "ChatOpenAI", FakeChatModel)
+        monkeypatch.setattr(settings, "chat_batch_concurrency", 2)
+        monkeypatch.setattr(settings, "semantic_cache_enabled", False)
+        FakeChatModel.active = FakeChatModel.peak = FakeChatModel.calls = 0
+        yield service
+        answer_cache.invalidate_file(service.pdf_service.index_id)
+
+    @pytest.mark.asyncio
+    async def test_answers_every_question_concurrently(self, service):
+        """Test one embedding call, bounded concurrent completions and results as they finish"""
+        questions = [f"q{i}: what about part {i}?" for i in range(5)]
+
+        results = [result async for result in await service.generate_batch("doc", questions, "sk-test")]
+
+        assert service.embed_calls == [questions]
+        assert sorted(result.index for result in results) == list(range(5))
+        assert all(result.message == f"answer to {result.question}" for result in results)
+        assert all(result.sources and result.error is None for result in results)
+        assert FakeChatModel.peak == 2
+        # The slow first question does not hold back the others
+        assert results[0].index != 0
+
+    @pytest.mark.asyncio
+    async def test_cached_questions_skip_the_model(self, service):
+        """Test that questions answered before come from the answer cache"""
+        await consume(await service.generate_batch("doc", ["q0: first?", "q1: second?"], "sk-test"))
+        FakeChatModel.calls = 0
+        service.embed_calls.clear()
+
+        results = [
+            result async for result in
+            await service.generate_batch("doc", ["q1: second?", "q2: third?"], "sk-test")
+        ]
+
+        assert results[0].index == 0 and results[0].message == "answer to q1: second?"
+        assert service.embed_calls == [["q2: third?"]]
+        assert FakeChatModel.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_file(self, service):
+        """Test that a missing document is rejected before any result is produced"""
+        with pytest.raises(ValueError):
+            await service.generate_batch("missing", ["q0: anything?"], "sk-test")
+
+
+class TestChatFlights:
+    """Tests for which chat requests may share one upstream call"""
+
+    def test_flights_are_shared_per_api_key(self):
+        """Test that identical questions only coalesce when asked with the same API key"""
+        service = ChatService()
+        service.pdf_service = FakePDFService(VectorDatabase())
+
+        key = service._flight_key("doc", "message", "What is new?", [], "sk-key-a")
+
+        assert key == service._flight_key("doc", "message", "What is new?", [], "sk-key-a")
+        assert key != service._flight_key("doc", "message", "What is new?", [], "sk-key-b")
+        assert "sk-key-a" not in key
+
+
+class TestChatBatchEndpoint:
+    """Tests for the NDJSON batch endpoint behind the request middleware"""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        received = []
+
+        async def generate_batch(file_id, questions, api_key):
+            received.extend(questions)
+
+            async def results():
+                for index, question in enumerate(questions):
+                    await asyncio.sleep(0)
+                    yield ChatBatchResult(index=index, question=question, message="answer")
+            return results()
+
+        monkeypatch.setattr(chat_endpoint.chat_service, "generate_batch", generate_batch)
+        client = TestClient(app)
+        client.received = received
+        return client
+
+    def test_streams_a_line_per_question(self, client):
+        """Test that every result line arrives, with questions validated like /message"""
+        response = client.post(
+            "/api/v1/chat/batch",
+            json={"file_id": "doc", "questions": ["What's new?", "Why?", "How?"]},
+            headers={"X-API-Key": "sk-test-key-123"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["index"] for line in lines] == [0, 1, 2]
+        # Escaped by the request validator, as /message input is
+        assert client.received[0] == "What&#x27;s new?"
+
+    def test_rejects_what_message_rejects(self, client):
+        """Test that overlong and malicious questions are refused before answering"""
+        headers = {"X-API-Key": "sk-test-key-123"}
+        for question in ["x" * 10001, "<script>alert(1)</script>"]:
+            response = client.post(
+                "/api/v1/chat/batch", json={"file_id": "doc", "questions": [question]}, headers=headers
+            )
+            assert response.status_code == 400
+        assert client.received == []
+
+
+async def consume(results):
+    return [result async for result in results]
@@ -0,0 +1,188 @@
+import hashlib
+from unittest.mock import patch
+
+import pytest
+
+from backend.app.services.content_registry import ContentRegistry
+from backend.aimakerspace.index_store import IndexStore
+from backend.app.services.pdf_service import PDFService
+from backend.tests.test_ingestion import FakeEmbeddingModel
+from backend.tests.test_pdf_loader import make_pdf
+
+
+def page_texts(version: str, count: int, changed: int = None):
+    return [
+        f"Page {n} {version if n == changed else 'v1'} " + " ".join(f"w{n}_{i}" for i in range(50))
+        for n in range(1, count + 1)
+    ]
+
+
+class TestContentRegistry:
+    """Tests for file_id aliases of shared indices"""
+
+    def test_refcounted_aliases(self, tmp_path):
+        """Test that an index is only freed when its last alias goes"""
+        registry = ContentRegistry(tmp_path / "registry.json")
+        registry.add_alias("file-1", "index-a")
+        registry.add_alias("file-2", "index-a")
+
+        assert registry.resolve("file-2") == "index-a"
+        assert registry.resolve("legacy-file") == "legacy-file"
+        assert registry.remove_alias("file-1") is None
+        assert registry.remove_alias("file-2") == "index-a"
+        assert registry.remove_alias("file-2") is None
+
+    def test_aliases_persist(self, tmp_path):
+        """Test that aliases survive a restart"""
+        ContentRegistry(tmp_path / "registry.json").add_alias("file-1", "index-a")
+
+        restarted = ContentRegistry(tmp_path / "registry.json")
+        assert restarted.resolve("file-1") == "index-a"
+        assert restarted.get_stats()["indices"] == 1
+
+
+class TestUploadDeduplication:
+    """Tests for content-addressed PDF indexing"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = PDFService()
+        service.index_store = IndexStore(tmp_path / "indices")
+        service.registry = ContentRegistry(tmp_path / "registry.json")
+        return service
+
+    @pytest.fixture
+    def pdf(self, tmp_path):
+        path = tmp_path / "paper.pdf"
+        path.write_bytes(make_pdf(page_texts("v1", 3)))
+        return path
+
+    @pytest.mark.asyncio
+    async def test_repeat_upload_reuses_index(self, service, pdf):
+        """Test that identical content is embedded once and shared"""
+        content_hash = hashlib.sha256(pdf.read_bytes()).hexdigest()
+        models = []
+
+        def make_model(**kwargs):
+            model = FakeEmbeddingModel()
+            model.tokens_used = 0
+            models.append(model)
+            return model
+
+        with patch("backend.app.services.pdf_service.EmbeddingModel", make_model), \
+                patch("backend.app.services.pdf_service.process_pool_workers", return_value=1):
+            first = await service.process_pdf(pdf, "file-1", "sk-test", content_hash=content_hash)
+            second = await service.process_pdf(pdf, "file-2", "sk-test", content_hash=content_hash)
+
+        assert first == second
+        assert len(models) == 1
+        assert service.get_vector_store("file-2") is service.get_vector_store("file-1")
+        assert service.get_file_status("file-2")["file_id"] == "file-2"
+
+        assert service.delete_file("file-1") is True
+        assert service.get_vector_store("file-2") is not None
+        assert service.delete_file("file-2") is True
+        assert service.index_store.get(service.resolve_index_id("file-2")) is None
+        assert service.delete_file("file-2") is False
+
+
+class TestRevisionUploads:
+    """Tests for re-indexing a new version of a file by page hash diff"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = PDFService()
+        service.index_store = IndexStore(tmp_path / "indices")
+        service.registry = ContentRegistry(tmp_path / "registry.json")
+        return service
+
+    @pytest.fixture
+    def models(self):
+        models = []
+
+        def make_model(**kwargs):
+            model = FakeEmbeddingModel()
+            model.tokens_used = 0
+            models.append(model)
+            return model
+
+        with patch("backend.app.services.pdf_service.EmbeddingModel", make_model), \
+                patch("backend.app.services.pdf_service.process_pool_workers", return_value=1):
+            yield models
+
+    async def upload(self, service, tmp_path, file_id, pages, revision=False):
+        path = tmp_path / f"{file_id}-{len(list(tmp_path.iterdir()))}.pdf"
+        path.write_bytes(make_pdf(pages))
+        content_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+        return await service.process_pdf(
+            path, file_id, "sk-test", content_hash=content_hash, revision=revision
+        )
+
+    @pytest.mark.asyncio
+    async def test_only_changed_pages_are_embedded(self, service, models, tmp_path):
+        """Test that a revision embeds the edited page and reuses the rest"""
+        await self.upload(service, tmp_path, "file-1", page_texts("v1", 10))
+        await self.upload(service, tmp_path, "file-1", page_texts("v2", 10, changed=4), revision=True)
+
+        full, revision = models
+        assert sum(full.batch_sizes) == 10
+        assert sum(revision.batch_sizes) == 1
+
+        vector_db = service.get_vector_store("file-1")
+        texts = [vector_db.text_of(key) for key in vector_db.vectors]
+        assert not any(text.startswith("Page 4 v1") for text in texts)
+        assert any(text.startswith("Page 4 v2") for text in texts)
+        for key, metadata in zip(vector_db.vectors, vector_db.metadata):
+            assert key[0] == metadata["page"]
+            assert vector_db.text_of(key).startswith(f"Page {key[0]} ")
+        metadata = service.get_file_status("file-1")
+        assert metadata["chunk_count"] == vector_db.count() == 10
+        assert len(metadata["page_hashes"]) == 10
+
+    @pytest.mark.asyncio
+    async def test_inserted_page_renumbers_reused_pages(self, service, models, tmp_path):
+        """Test that pages shifted by an insertion keep their vectors under new numbers"""
+        await self.upload(service, tmp_path, "file-1", page_texts("v1", 3))
+        revised = ["Cover page " + " ".join(f"c{i}" for i in range(50))] + page_texts("v1", 3)
+        await self.upload(service, tmp_path, "file-1", revised, revision=True)
+
+        assert sum(models[1].batch_sizes) == 1
+        vector_db = service.get_vector_store("file-1")
+        assert sorted(key[0] for key in vector_db.vectors) == [1, 2, 3, 4]
+        for key in vector_db.vectors:
+            assert vector_db.text_of(key) == revised[key[0] - 1][key[1]:key[2]]
+
+    @pytest.mark.asyncio
+    async def test_near_duplicates_survive_removal_of_their_original(self, service, models, tmp_path):
+        """Test that a chunk stored only as a near-duplicate keeps a vector when its original page changes"""
+        boilerplate = "Licence " + " ".join(f"term{i}" for i in range(60))
+        pages = [boilerplate + " first", page_texts("v1", 2)[1], boilerplate + " third"]
+        await self.upload(service, tmp_path, "file-1", pages)
+        assert sum(models[0].batch_sizes) == 2
+
+        revised = ["Rewritten first page " + " ".join(f"r{i}" for i in range(50))] + pages[1:]
+        await self.upload(service, tmp_path, "file-1", revised, revision=True)
+
+        vector_db = service.get_vector_store("file-1")
+        assert sorted(key[0] for key in vector_db.vectors) == [1, 2, 3]
+        third = next(key for key in vector_db.vectors if key[0] == 3)
+        assert vector_db.text_of(third).endswith("third")
+
+    @pytest.mark.asyncio
+    async def test_revision_does_not_modify_shared_index(self, service, models, tmp_path):
+        """Test that revising one alias of a shared index leaves the other intact"""
+        await self.upload(service, tmp_path, "file-1", page_texts("v1", 3))
+        await self.upload(service, tmp_path, "file-2", page_texts("v1", 3))
+        shared = service.resolve_index_id("file-2")
+
+        await self.upload(service, tmp_path, "file-1", page_texts("v2", 3, changed=2), revision=True)
+
+        assert service.resolve_index_id("file-1") != shared
+        original = service.get_vector_store("file-2")
+        assert original.count() == 3
+        assert any(original.text_of(key).startswith("Page 2 v1") for key in original.vectors)
+
+        # The old version is freed once nothing points at it
+        await self.upload(service, tmp_path, "file-2", page_texts("v2", 3, changed=2), revision=True)
+        assert not service.index_store.contains(shared)
+        assert len(models) == 2
@@ -0,0 +1,63 @@
+import pytest
+
+from backend.aimakerspace.dedup import MinHashDeduplicator
+from backend.aimakerspace.ingestion import IngestionPipeline
+from backend.aimakerspace.text_utils import CharacterTextSplitter
+from backend.aimakerspace.vectordatabase import VectorDatabase
+from backend.tests.test_ingestion import FakeEmbeddingModel
+
+BOILERPLATE = "This article is licensed under a Creative Commons licence " + " ".join(
+    f"clause{i}" for i in range(60)
+)
+
+
+class TestMinHashDeduplicator:
+    """Tests for near-duplicate detection"""
+
+    def test_near_duplicate_is_found(self):
+        """Test that a text differing in one word matches its original"""
+        deduplicator = MinHashDeduplicator()
+        deduplicator.check(BOILERPLATE + " page 1", "first")
+
+        assert deduplicator.check(BOILERPLATE + " page 2", "second") == "first"
+        assert deduplicator.get_stats() == {"texts_seen": 2, "duplicates_found": 1, "unique_texts": 1}
+
+    def test_different_texts_are_kept(self):
+        """Test that unrelated texts are not collapsed"""
+        deduplicator = MinHashDeduplicator()
+        deduplicator.check(BOILERPLATE, "licence")
+
+        assert deduplicator.check(" ".join(f"result{i}" for i in range(60)), "results") is None
+        # Half the shingles in common is well below the threshold
+        half = " ".join(BOILERPLATE.split()[:35] + [f"other{i}" for i in range(35)])
+        assert deduplicator.check(half, "half") is None
+
+
+class TestPipelineDeduplication:
+    """Tests for skipping near-duplicate chunks before embedding"""
+
+    @pytest.mark.asyncio
+    async def test_duplicates_share_one_vector_row(self):
+        """Test that repeated boilerplate is embedded once and referenced from each page"""
+        pages = [
+            BOILERPLATE + f" {n}\n" + " ".join(f"p{n}w{i}" for i in range(60))
+            for n in range(1, 5)
+        ]
+        model = FakeEmbeddingModel()
+        pipeline = IngestionPipeline(
+            CharacterTextSplitter(chunk_size=len(BOILERPLATE) + 3, chunk_overlap=0),
+            model,
+            deduplicator=MinHashDeduplicator(),
+        )
+        vector_db = VectorDatabase()
+
+        stats = await pipeline.run(iter(pages), vector_db)
+
+        assert stats["chunks_deduplicated"] == 3
+        assert stats["embedding_tokens_saved"] > 0
+        assert stats["index_bytes_saved"] == 3 * vector_db.vectors[next(iter(vector_db.vectors))].nbytes
+        assert sum(model.batch_sizes) == stats["chunks_created"] == len(vector_db.vectors)
+
+        original = vector_db.metadata[0]
+        assert original["page"] == 1
+        assert [duplicate["page"] for duplicate in original["duplicates"]] == [2, 3, 4]
@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+from backend.app.services.history_store import HistoryRecord, HistoryStore
+
+
+def sources(count: int = 3):
+    return [
+        {"page": n, "chunk_id": f"index_p{n}_c0", "content": "x" * 200, "relevance_score": 0.5}
+        for n in range(1, count + 1)
+    ]
+
+
+class TestHistoryStore:
+    """Tests for bounded chat histories"""
+
+    def test_ring_buffer_keeps_latest_turns(self):
+        """Test that a history keeps only its last max_turns turns"""
+        store = HistoryStore(max_turns=2)
+        for turn in range(5):
+            store.append("file-1", "user", f"question {turn}")
+            store.append("file-1", "assistant", f"answer {turn}", sources())
+
+        history = store.get("file-1")
+        assert [message.content for message in history] == [
+            "question 3", "answer 3", "question 4", "answer 4"
+        ]
+        assert history[1].sources[0] == {"page": 1, "chunk_id": "index_p1_c0", "relevance_score": 0.5}
+        assert store.current_bytes == sum(
+            HistoryRecord.from_message(m.role, m.content, m.sources).nbytes() for m in history
+        )
+
+    def test_records_are_compact(self):
+        """Test that messages at rest are slotted records with source tuples"""
+        record = HistoryRecord.from_message("assistant", "answer", sources())
+
+        assert not hasattr(record, "__dict__")
+        assert record.sources[0] == (1, "index_p1_c0", 0.5)
+
+    def test_least_recently_used_history_is_evicted(self):
+        """Test that the byte budget evicts the least recently used history"""
+        store = HistoryStore(max_bytes=1500)
+        store.append("file-1", "user", "a" * 500)
+        store.append("file-2", "user", "b" * 500)
+        store.get("file-1")
+        store.append("file-3", "user", "c" * 500)
+
+        assert store.get("file-2") == []
+        assert store.get("file-1")[0].content == "a" * 500
+        assert store.current_bytes <= 1500
+        assert store.evictions == 1
+
+    def test_evicted_history_spills_to_sqlite(self, tmp_path):
+        """Test that an evicted history is restored from SQLite on next use"""
+        store = HistoryStore(max_bytes=1500, spill_path=tmp_path / "history.db")
+        store.append("file-1", "user", "a" * 500)
+        store.append("file-1", "assistant", "answer", sources())
+        store.append("file-2", "user", "b" * 500)
+        store.append("file-3", "user", "c" * 500)
+        assert "file-1" not in store.histories
+
+        history = store.get("file-1")
+        assert [message.content for message in history] == ["a" * 500, "answer"]
+        assert history[1].sources[2]["page"] == 3
+        assert store.get_stats()["restores"] == 1
+
+    def test_clear(self, tmp_path):
+        """Test that clearing reports whether the file had a history"""
+        store = HistoryStore(spill_path=tmp_path / "history.db")
+        assert store.clear("file-1") is False
+
+        store.append("file-1", "user", "question")
+        assert store.clear("file-1") is True
+        assert store.get("file-1") == []
+        assert store.current_bytes == 0
+
+    def test_restore_is_skipped_for_histories_never_spilled(self, tmp_path, monkeypatch):
+        """Test that SQLite is only queried for file_ids that actually spilled"""
+        store = HistoryStore(max_bytes=1500, spill_path=tmp_path / "history.db")
+        restored = []
+        restore = store._restore
+        monkeypatch.setattr(store, "_restore", lambda file_id: restored.append(file_id) or restore(file_id))
+        store.append("file-1", "user", "a" * 500)
+        store.append("file-2", "user", "b" * 500)
+        store.append("file-3", "user", "c" * 500)
+        store.append("file-4", "user", "d" * 500)
+        assert restored == []
+
+        assert store.get("file-1")[0].content == "a" * 500
+        assert restored == ["file-1"]
+
+    def test_spilled_files_survive_a_restart(self, tmp_path):
+        """Test that a new store knows which file_ids the spill file holds"""
+        store = HistoryStore(max_bytes=1500, spill_path=tmp_path / "history.db")
+        store.append("file-1", "user", "a" * 500)
+        store.append("file-2", "user", "b" * 500)
+        store.append("file-3", "user", "c" * 500)
+        store._io.shutdown(wait=True)
+
+        reopened = HistoryStore(spill_path=tmp_path / "history.db")
+        assert reopened.spilled == {"file-1"}
+        assert reopened.get("file-1")[0].content == "a" * 500
+
+    @pytest.mark.asyncio
+    async def test_async_access_restores_off_the_event_loop(self, tmp_path, monkeypatch):
+        """Test that aappend and aget restore a spilled history on the spill thread"""
+        store = HistoryStore(max_bytes=1500, spill_path=tmp_path / "history.db")
+        threads = []
+        restore = store._restore
+        monkeypatch.setattr(
+            store, "_restore",
+            lambda file_id: threads.append(threading.current_thread().name) or restore(file_id)
+        )
+        await store.aappend("file-1", "user", "a" * 500)
+        await store.aappend("file-2", "user", "b" * 500)
+        await store.aappend("file-3", "user", "c" * 500)
+        assert "file-1" in store.spilled
+
+        await store.aappend("file-1", "assistant", "answer")
+        assert [message.content for message in await store.aget("file-1")] == ["a" * 500, "answer"]
+        assert len(threads) == 1
+        assert threads[0].startswith("history_spill")
+        assert threading.current_thread().name not in threads
+
+    def test_clearing_a_spilled_history_skips_the_restore(self, tmp_path):
+        """Test that clearing a spilled history drops its rows without reading them back"""
+        store = HistoryStore(max_bytes=1500, spill_path=tmp_path / "history.db")
+        store.append("file-1", "user", "a" * 500)
+        store.append("file-2", "user", "b" * 500)
+        store.append("file-3", "user", "c" * 500)
+
+        assert store.clear("file-1") is True
+        assert store.get("file-1") == []
+        assert store.get_stats()["restores"] == 0
+        assert store.clear("file-1") is False
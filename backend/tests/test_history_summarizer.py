@@ -0,0 +1,108 @@
+import pytest
+
+from backend.app.models.chat import ChatMessage
+from backend.app.services import history_summarizer as summarizer_module
+from backend.app.services.history_summarizer import HistorySummarizer
+from backend.app.services.prompt_assembler import PromptAssembler
+
+
+def turn(n: int):
+    return [
+        ChatMessage(role="user", content=f"Question {n} " + "about the method " * 10),
+        ChatMessage(role="assistant", content=f"Answer {n} " + "with a long explanation " * 40),
+    ]
+
+
+class TestHistorySummarizer:
+    """Tests for rolling conversation summaries"""
+
+    @pytest.fixture
+    def summarizer(self):
+        calls = []
+
+        async def summarize(previous, turns, api_key):
+            calls.append(len(turns))
+            return (previous + " " + " ".join(m.content.split()[1] for m in turns if m.role == "user")).strip()
+
+        summarizer = HistorySummarizer(keep_turns=2, summarize=summarize)
+        summarizer.calls = calls
+        return summarizer
+
+    @pytest.mark.asyncio
+    async def test_older_turns_are_folded_in_blocks(self, summarizer):
+        """Test that the summary covers all but the last turns once enough have built up"""
+        history = turn(1) + turn(2) + turn(3) + turn(4)
+        assert summarizer.schedule("file-1", history, "sk-test") is None
+
+        history += turn(5)
+        await summarizer.schedule("file-1", history, "sk-test")
+
+        summary, recent = summarizer.compress("file-1", history)
+        assert summary == "1 2 3"
+        assert recent == turn(4) + turn(5)
+        assert summarizer.calls == [6]
+
+    @pytest.mark.asyncio
+    async def test_other_conversations_do_not_match(self, summarizer):
+        """Test that a summary only applies to histories with the prefix it covers"""
+        history = turn(1) + turn(2) + turn(3) + turn(4) + turn(5)
+        await summarizer.schedule("file-1", history, "sk-test")
+
+        other = turn(9) + turn(2) + turn(3)
+        assert summarizer.compress("file-1", other) == (None, other)
+        assert summarizer.compress("file-2", history) == (None, history)
+
+    @pytest.mark.asyncio
+    async def test_prompt_size_stays_bounded(self, summarizer):
+        """Test that prompt tokens stop growing with the length of the session"""
+        assembler = PromptAssembler("You are helpful.", context_budget=200, history_budget=100_000)
+        history = []
+        sizes = []
+        for n in range(1, 25):
+            summary, recent = summarizer.compress("file-1", history)
+            prompt = assembler.assemble(f"Question {n}", ["Some context"], recent, summary=summary)
+            sizes.append(prompt["prompt_tokens"])
+            history = history + turn(n)
+            task = summarizer.schedule("file-1", history, "sk-test")
+            if task is not None:
+                await task
+
+        # Raw turns vary between keep_turns and twice that; the summary
+        # only grows by a few tokens per block
+        assert max(sizes[16:]) <= max(sizes[8:16]) + 20
+        assert max(sizes) < 3 * sizes[4]
+
+    @pytest.mark.asyncio
+    async def test_failed_update_keeps_previous_summary(self):
+        """Test that a failing model call leaves prompts on the raw history"""
+        async def fail(previous, turns, api_key):
+            raise RuntimeError("model unavailable")
+
+        summarizer = HistorySummarizer(keep_turns=1, summarize=fail)
+        history = turn(1) + turn(2) + turn(3)
+        await summarizer.schedule("file-1", history, "sk-test")
+
+        assert summarizer.compress("file-1", history) == (None, history)
+        assert summarizer.get_stats()["failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_model_is_called_without_blocking(self, monkeypatch):
+        """Test that the default summarizer awaits the async completion"""
+        class FakeChatModel:
+            def __init__(self, model_name=None):
+                self.last_usage = {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6}
+
+            def run(self, messages, **kwargs):
+                raise AssertionError("blocking call")
+
+            async def arun(self, messages, **kwargs):
+                return "summary of " + messages[-1]["content"].split()[-1]
+
+        monkeypatch.setattr(summarizer_module, "ChatOpenAI", FakeChatModel)
+        summarizer = HistorySummarizer(keep_turns=1)
+        history = turn(1) + turn(2) + turn(3)
+        await summarizer.schedule("file-1", history, "sk-test")
+
+        summary, recent = summarizer.compress("file-1", history)
+        assert summary.startswith("summary of")
+        assert recent == turn(3)
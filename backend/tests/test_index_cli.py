@@ -0,0 +1,96 @@
+import hashlib
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.aimakerspace.index import DirectoryIndexer, load_manifest
+from backend.aimakerspace.index_store import IndexStore
+from backend.app.core.indexing import content_index_id
+from backend.tests.test_content_registry import page_texts
+from backend.tests.test_ingestion import FakeEmbeddingModel
+from backend.tests.test_pdf_loader import make_pdf
+
+
+class TestDirectoryIndexer:
+    """Tests for offline indexing of a document directory"""
+
+    @pytest.fixture
+    def library(self, tmp_path):
+        root = tmp_path / "library"
+        (root / "papers").mkdir(parents=True)
+        (root / "papers" / "a.pdf").write_bytes(make_pdf(page_texts("v1", 3)))
+        (root / "b.pdf").write_bytes(make_pdf(page_texts("v1", 2)))
+        (root / "notes.txt").write_text("Some notes " + " ".join(f"n{i}" for i in range(80)))
+        (root / "ignored.md").write_text("not a document")
+        return root
+
+    async def build(self, library, out, models):
+        def make_model():
+            models.append(FakeEmbeddingModel())
+            return models[-1]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            indexer = DirectoryIndexer(library, out, executor, workers=2, embedding_model_factory=make_model)
+            return await indexer.build()
+
+    @pytest.mark.asyncio
+    async def test_builds_server_loadable_indices(self, library, tmp_path):
+        """Test that each document gets an index under the id the server would give it"""
+        out = tmp_path / "indices"
+        models = []
+
+        stats = await self.build(library, out, models)
+
+        assert stats["indexed"] == 3 and stats["failed"] == 0
+        manifest = load_manifest(out)
+        assert sorted(manifest) == ["b.pdf", "notes.txt", "papers/a.pdf"]
+        content_hash = hashlib.sha256((library / "papers" / "a.pdf").read_bytes()).hexdigest()
+        index_id = manifest["papers/a.pdf"]["index_id"]
+        assert index_id == content_index_id(content_hash)
+
+        store = IndexStore(out)
+        vector_db = store.get(index_id)
+        assert store.get_metadata(index_id)["page_count"] == 3
+        assert any(vector_db.text_of(key).startswith("Page 2 v1") for key in vector_db.vectors)
+
+    @pytest.mark.asyncio
+    async def test_rerun_only_processes_changed_files(self, library, tmp_path):
+        """Test that the manifest skips unchanged files and catches edits and removals"""
+        out = tmp_path / "indices"
+        models = []
+        await self.build(library, out, models)
+
+        models.clear()
+        stats = await self.build(library, out, models)
+        assert stats["unchanged"] == 3
+        assert models == []
+
+        (library / "b.pdf").write_bytes(make_pdf(page_texts("v2", 2, changed=1)))
+        os.utime(library / "notes.txt")
+        (library / "papers" / "a.pdf").unlink()
+        stats = await self.build(library, out, models)
+
+        assert stats["indexed"] == 1
+        # Touched but unchanged content is hashed, not re-embedded
+        assert stats["reused"] == 1
+        assert stats["removed"] == 1
+        assert len(models) == 1
+        assert sorted(load_manifest(out)) == ["b.pdf", "notes.txt"]
+
+    def test_import_leaves_server_state_alone(self, tmp_path):
+        """Test that importing the CLI builds none of the server's services or files"""
+        code = (
+            "import sys, backend.aimakerspace.index; "
+            "print(sorted(m for m in sys.modules if m.startswith('backend.app.services')))"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=tmp_path, capture_output=True, text=True,
+            env={**os.environ, "PYTHONPATH": root}, check=True
+        )
+
+        assert result.stdout.strip() == "[]"
+        assert not (tmp_path / "uploads").exists()
@@ -0,0 +1,136 @@
+import threading
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from backend.aimakerspace.vectordatabase import VectorDatabase
+from backend.aimakerspace.index_store import IndexStore
+
+
+def make_index(tag: str, count: int = 4) -> VectorDatabase:
+    vector_db = VectorDatabase()
+    for idx in range(count):
+        vector_db.insert(f"{tag} chunk {idx}", np.full(8, float(idx)), {"page": idx + 1})
+    return vector_db
+
+
+class TestIndexStore:
+    """Tests for the disk-backed index store"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        # Room for two of the test indices
+        return IndexStore(tmp_path / "indices", max_resident_bytes=2 * make_index("file-1").nbytes() + 10)
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        """Test that a saved database loads with the same vectors and metadata"""
+        vector_db = make_index("doc")
+        vector_db.save(str(tmp_path / "doc"))
+
+        loaded = VectorDatabase.load(str(tmp_path / "doc"))
+
+        assert list(loaded.vectors) == list(vector_db.vectors)
+        assert loaded.metadata == vector_db.metadata
+        np.testing.assert_array_equal(loaded.vectors["doc chunk 3"], vector_db.vectors["doc chunk 3"])
+
+    def test_tombstoned_keys_are_skipped_and_dropped_on_save(self, tmp_path):
+        """Test that deletes hide keys until the next save compacts them away"""
+        vector_db = make_index("doc")
+        copy = vector_db.copy()
+        copy.delete("doc chunk 1")
+
+        assert copy.count() == 3
+        assert "doc chunk 1" not in [key for key, _ in copy.search(np.ones(8), k=4)]
+        assert vector_db.count() == 4
+
+        copy.save(str(tmp_path / "doc"))
+        loaded = VectorDatabase.load(str(tmp_path / "doc"))
+        assert list(loaded.vectors) == ["doc chunk 0", "doc chunk 2", "doc chunk 3"]
+        assert [entry["page"] for entry in loaded.metadata] == [1, 3, 4]
+
+    def test_lazy_load_after_restart(self, store, tmp_path):
+        """Test that a new store finds indices written by a previous one"""
+        store.save("file-1", make_index("one"), {"filename": "one.pdf", "status": "indexed"})
+
+        restarted = IndexStore(tmp_path / "indices")
+        assert not restarted.resident
+        assert restarted.get_metadata("file-1")["filename"] == "one.pdf"
+        assert "one chunk 0" in restarted.get("file-1").vectors
+        assert restarted.get_stats()["loads"] == 1
+
+    def test_lru_eviction_within_budget(self, store):
+        """Test that the least recently used index is dropped from memory only"""
+        for file_id in ["file-1", "file-2"]:
+            store.save(file_id, make_index(file_id), {"status": "indexed"})
+        store.get("file-1")
+        store.save("file-3", make_index("file-3"), {"status": "indexed"})
+
+        assert list(store.resident) == ["file-1", "file-3"]
+        assert store.resident_bytes <= store.max_resident_bytes
+        assert store.get_stats()["evictions"] == 1
+        # Evicted indices come back from disk
+        assert store.get("file-2") is not None
+        assert "file-2" in store.resident
+
+    def test_metadata_evicted_with_its_index(self, store):
+        """Test that metadata leaves memory with its index but stays readable from disk"""
+        for file_id in ["file-1", "file-2", "file-3"]:
+            store.save(file_id, make_index(file_id), {"filename": f"{file_id}.pdf"})
+
+        assert list(store.file_metadata) == ["file-2", "file-3"]
+        assert store.get_metadata("file-1")["filename"] == "file-1.pdf"
+        assert "file-1" not in store.file_metadata
+
+    @pytest.mark.asyncio
+    async def test_aget_loads_off_the_event_loop(self, store, tmp_path):
+        """Test that aget loads on a worker thread and then serves the resident index"""
+        store.save("file-1", make_index("one"), {"status": "indexed"})
+        restarted = IndexStore(tmp_path / "indices")
+        load = VectorDatabase.load
+        threads = []
+
+        def recording_load(directory):
+            threads.append(threading.current_thread())
+            return load(directory)
+
+        with patch.object(VectorDatabase, "load", side_effect=recording_load):
+            vector_db = await restarted.aget("file-1")
+            assert await restarted.aget("file-1") is vector_db
+
+        assert threads and threads[0] is not threading.current_thread()
+        assert len(threads) == 1
+        assert restarted.get_stats()["loads"] == 1
+
+    def test_resident_lookups_do_not_wait_on_a_load(self, store, tmp_path):
+        """Test that a slow load from disk does not block hits on other indices"""
+        store.save("file-1", make_index("one"), {"status": "indexed"})
+        store.save("file-2", make_index("two"), {"status": "indexed"})
+        restarted = IndexStore(tmp_path / "indices")
+        resident = restarted.get("file-1")
+        load = VectorDatabase.load
+        loading, release = threading.Event(), threading.Event()
+
+        def slow_load(directory):
+            loading.set()
+            release.wait(5)
+            return load(directory)
+
+        with patch.object(VectorDatabase, "load", side_effect=slow_load):
+            loader = threading.Thread(target=restarted.get, args=("file-2",))
+            loader.start()
+            assert loading.wait(5)
+            assert restarted.get("file-1") is resident
+            release.set()
+            loader.join()
+
+        assert "file-2" in restarted.resident
+
+    def test_delete(self, store):
+        """Test that deleted indices are gone from memory and disk"""
+        store.save("file-1", make_index("one"), {"status": "indexed"})
+        store.delete("file-1")
+
+        assert store.get("file-1") is None
+        assert store.get_metadata("file-1") is None
+        assert not store.contains("file-1")
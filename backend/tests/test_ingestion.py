@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from backend.aimakerspace.ingestion import IngestionPipeline
+from backend.aimakerspace.text_utils import CharacterTextSplitter
+from backend.aimakerspace.vectordatabase import VectorDatabase
+
+
+class FakeEmbeddingModel:
+    """Embeds texts by length and records how many batches overlap"""
+
+    def __init__(self, fail_on_batch: int = None):
+        self.fail_on_batch = fail_on_batch
+        self.batch_sizes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def async_get_embeddings(self, texts):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            self.batch_sizes.append(len(texts))
+            if self.fail_on_batch is not None and len(self.batch_sizes) == self.fail_on_batch:
+                raise RuntimeError("embedding failed")
+            return [[float(len(text)), 1.0] for text in texts]
+        finally:
+            self.in_flight -= 1
+
+
+class TestIngestionPipeline:
+    """Tests for the streaming parse, split and embed pipeline"""
+
+    @pytest.fixture
+    def pages(self):
+        return [" ".join(f"p{n}w{i}" for i in range(8 * n)) for n in range(1, 7)]
+
+    @pytest.mark.asyncio
+    async def test_chunks_inserted_with_page_metadata(self, pages):
+        """Test that every chunk lands in the database with its page number"""
+        model = FakeEmbeddingModel()
+        pipeline = IngestionPipeline(
+            CharacterTextSplitter(chunk_size=40, chunk_overlap=0), model, batch_size=4
+        )
+        vector_db = VectorDatabase()
+
+        stats = await pipeline.run(iter(pages), vector_db)
+
+        assert stats["pages_parsed"] == 6
+        assert stats["chunks_embedded"] == stats["chunks_created"] == len(vector_db.vectors)
+        assert all(size <= 4 for size in model.batch_sizes)
+        for key, metadata in zip(vector_db.vectors, vector_db.metadata):
+            assert key[0] == metadata["page"]
+            assert vector_db.text_of(key) in pages[metadata["page"] - 1]
+
+    @pytest.mark.asyncio
+    async def test_embedding_batches_overlap(self, pages):
+        """Test that up to max_concurrent_batches batches are embedded at once"""
+        model = FakeEmbeddingModel()
+        pipeline = IngestionPipeline(
+            CharacterTextSplitter(chunk_size=20, chunk_overlap=0),
+            model,
+            batch_size=2,
+            max_concurrent_batches=3,
+        )
+
+        await pipeline.run(iter(pages), VectorDatabase())
+
+        assert model.max_in_flight == 3
+
+    @pytest.mark.asyncio
+    async def test_embedding_failure_stops_pipeline(self, pages):
+        """Test that a failed batch propagates and stops the other stages"""
+        model = FakeEmbeddingModel(fail_on_batch=1)
+        pipeline = IngestionPipeline(
+            CharacterTextSplitter(chunk_size=20, chunk_overlap=0), model, batch_size=2
+        )
+
+        with pytest.raises(RuntimeError):
+            await pipeline.run(iter(pages), VectorDatabase())
+
+    @pytest.mark.asyncio
+    async def test_chunks_stored_as_spans_into_document(self, pages):
+        """Test that chunk text is sliced from one buffer rather than stored per chunk"""
+        splitter = CharacterTextSplitter(chunk_size=40, chunk_overlap=10)
+        vector_db = VectorDatabase()
+
+        await IngestionPipeline(splitter, FakeEmbeddingModel()).run(iter(pages), vector_db)
+
+        assert all(isinstance(key, tuple) for key in vector_db.vectors)
+        assert vector_db.document.text == "".join(pages)
+        page_chunks = [vector_db.text_of(key) for key in vector_db.vectors if key[0] == 3]
+        assert page_chunks == splitter.split(pages[2])
+
+    def test_duplicate_chunks_keep_metadata_aligned(self):
+        """Test that re-inserting a key does not shift later metadata"""
+        vector_db = VectorDatabase()
+        vector_db.insert("header", [1.0], {"page": 1})
+        vector_db.insert("header", [1.0], {"page": 2})
+        vector_db.insert("body", [2.0], {"page": 2})
+
+        assert vector_db.metadata == [{"page": 1}, {"page": 2}]
@@ -0,0 +1,131 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from backend.app.services.ingestion_jobs import IngestionJob, IngestionJobQueue, QueueFullError
+
+
+def make_job(file_id: str, api_key: str) -> IngestionJob:
+    return IngestionJob(file_id, Path(f"/tmp/{file_id}.pdf"), f"{file_id}.pdf", 100, api_key)
+
+
+class TestIngestionJobQueue:
+    """Tests for the background ingestion job queue"""
+
+    @pytest.mark.asyncio
+    async def test_round_robin_across_api_keys(self):
+        """Test that a second key's upload is not stuck behind the first key's backlog"""
+        order = []
+
+        async def process(file_path, file_id, api_key, on_progress=None, **kwargs):
+            order.append(file_id)
+            await asyncio.sleep(0)
+
+        queue = IngestionJobQueue(process, max_workers=1)
+        for file_id in ["a1", "a2", "a3"]:
+            queue.submit(make_job(file_id, "sk-key-a"))
+        queue.submit(make_job("b1", "sk-key-b"))
+
+        await asyncio.gather(*queue.workers)
+
+        assert order == ["a1", "b1", "a2", "a3"]
+        assert queue.get_stats()["completed"] == 4
+        assert queue.get_status("b1")["stage"] == "indexed"
+
+    @pytest.mark.asyncio
+    async def test_progress_percent_and_eta(self):
+        """Test that pipeline progress is reported as stage, percent and ETA"""
+        release = asyncio.Event()
+
+        async def process(file_path, file_id, api_key, on_progress=None, **kwargs):
+            on_progress({
+                "page_count": 10,
+                "pages_parsed": 5,
+                "parsing_done": False,
+                "chunks_created": 20,
+                "chunks_embedded": 10,
+            })
+            await release.wait()
+
+        queue = IngestionJobQueue(process, max_workers=1)
+        queue.submit(make_job("f1", "sk-key-a"))
+        queue.submit(make_job("f2", "sk-key-a"))
+        await asyncio.sleep(0.01)
+
+        status = queue.get_status("f1")
+        assert status["stage"] == "parsing"
+        # 10 of an expected 40 chunks embedded
+        assert status["percent"] == 25.0
+        assert status["eta_seconds"] is not None
+        assert queue.get_status("f2")["queue_position"] == 1
+        assert queue.get_stats()["queued"] == 1
+
+        release.set()
+        await asyncio.gather(*queue.workers)
+
+    @pytest.mark.asyncio
+    async def test_failed_job_reports_error(self):
+        """Test that a failing job is marked failed without stopping the worker"""
+        async def process(file_path, file_id, api_key, on_progress=None, **kwargs):
+            if file_id == "bad":
+                raise ValueError("No content extracted from PDF")
+
+        queue = IngestionJobQueue(process, max_workers=1)
+        queue.submit(make_job("bad", "sk-key-a"))
+        queue.submit(make_job("good", "sk-key-a"))
+        await asyncio.gather(*queue.workers)
+
+        assert queue.get_status("bad")["stage"] == "failed"
+        assert queue.get_status("good")["stage"] == "indexed"
+        assert queue.get_stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_per_key_limit(self):
+        """Test that one key cannot fill the whole queue"""
+        async def process(file_path, file_id, api_key, on_progress=None, **kwargs):
+            await asyncio.sleep(0)
+
+        queue = IngestionJobQueue(process, max_workers=1, max_queued_per_key=2)
+        queue.submit(make_job("a1", "sk-key-a"))
+        queue.submit(make_job("a2", "sk-key-a"))
+
+        with pytest.raises(QueueFullError):
+            queue.submit(make_job("a3", "sk-key-a"))
+        queue.submit(make_job("b1", "sk-key-b"))
+
+        await asyncio.gather(*queue.workers)
+
+    @pytest.mark.asyncio
+    async def test_revision_replaces_the_stored_pdf_only_once_indexed(self, tmp_path):
+        """Test that a failed revision leaves the previous PDF in place"""
+        async def process(file_path, file_id, api_key, on_progress=None, **kwargs):
+            if file_path.read_bytes() == b"bad":
+                raise ValueError("No content extracted from PDF")
+
+        stored = tmp_path / "f1.pdf"
+        stored.write_bytes(b"v1")
+        queue = IngestionJobQueue(process, max_workers=1)
+        for version in [b"bad", b"v2"]:
+            part = tmp_path / "f1.pdf.part"
+            part.write_bytes(version)
+            queue.submit(IngestionJob("f1", part, "f1.pdf", 100, "sk-key-a", revision=True, destination=stored))
+            await asyncio.gather(*queue.workers)
+
+            assert not part.exists()
+            assert stored.read_bytes() == (b"v1" if version == b"bad" else b"v2")
+
+    @pytest.mark.asyncio
+    async def test_cancelled_job_is_counted_as_failed(self):
+        """Test that a job cancelled at shutdown shows up in the failed count"""
+        async def process(file_path, file_id, api_key, on_progress=None, **kwargs):
+            await asyncio.Event().wait()
+
+        queue = IngestionJobQueue(process, max_workers=1)
+        queue.submit(make_job("f1", "sk-key-a"))
+        await asyncio.sleep(0.01)
+        await queue.shutdown()
+
+        assert queue.get_status("f1")["stage"] == "failed"
+        assert queue.get_stats()["failed"] == 1
+        assert queue.get_stats()["running"] == 0
@@ -0,0 +1,234 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import PyPDF2
+import pytest
+
+from backend.aimakerspace import text_utils
+from backend.aimakerspace.text_utils import PDFLoader, extract_page_range, page_ranges
+
+
+def make_pdf(page_texts):
+    """Build a minimal PDF with one line of text per page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    font_id = 3
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (font_id, content_id)
+        )
+        page_ids.append(len(objects))
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+class TestPDFLoader:
+    """Tests for per-page PDF extraction"""
+
+    @pytest.fixture
+    def pdf_path(self):
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+            tmp.write(make_pdf([f"Text of page {n}" for n in range(1, 13)]))
+            tmp.flush()
+            yield tmp.name
+
+    def test_one_document_per_page(self, pdf_path):
+        """Test that documents[i] holds the text of page i + 1"""
+        loader = PDFLoader(pdf_path)
+        loader.load()
+
+        assert len(loader.documents) == 12
+        assert "Text of page 1" in loader.documents[0]
+        assert "Text of page 12" in loader.documents[11]
+
+    def test_parallel_extraction_preserves_page_order(self, pdf_path):
+        """Test that extraction by page ranges matches serial extraction"""
+        serial = PDFLoader(pdf_path).load_documents()
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            parallel = PDFLoader(pdf_path, max_workers=3, executor=executor).load_documents()
+
+        assert parallel == serial
+
+    def test_page_ranges_cover_every_page(self):
+        """Test that page ranges are contiguous and split across workers"""
+        ranges = page_ranges(25, max_workers=4)
+
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == 25
+        assert all(left[1] == right[0] for left, right in zip(ranges, ranges[1:]))
+        assert len(ranges) == 7
+
+    def test_parses_bytes_without_temp_files(self, pdf_path):
+        """Test that bytes, memoryviews and streams parse like the file itself"""
+        with open(pdf_path, "rb") as f:
+            data = f.read()
+        expected = PDFLoader(pdf_path).load_documents()
+
+        with patch("tempfile.NamedTemporaryFile") as named_temporary_file:
+            assert PDFLoader(data).load_documents() == expected
+            assert PDFLoader(memoryview(data)).load_documents() == expected
+            assert PDFLoader(io.BytesIO(data)).load_documents() == expected
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                assert PDFLoader(data, max_workers=3, executor=executor).load_documents() == expected
+        named_temporary_file.assert_not_called()
+
+    def test_large_in_memory_pdf_is_spooled_for_workers(self, pdf_path):
+        """Test that workers get a spooled file path instead of a large PDF's bytes"""
+        with open(pdf_path, "rb") as f:
+            data = f.read()
+        sources = []
+
+        def record(source, start, stop):
+            sources.append(source)
+            return extract_page_range(source, start, stop)
+
+        with patch("backend.aimakerspace.text_utils.MAX_IN_MEMORY_POOL_BYTES", 0), \
+                patch("backend.aimakerspace.text_utils.extract_page_range", record), \
+                ThreadPoolExecutor(max_workers=3) as executor:
+            pages = PDFLoader(data, max_workers=3, executor=executor).load_documents()
+
+        assert pages == PDFLoader(pdf_path).load_documents()
+        assert sources and all(isinstance(source, str) for source in sources)
+        assert not os.path.exists(sources[0])
+
+    def test_guarded_extraction_skips_slow_pages(self, pdf_path):
+        """Test that a page over its time budget is skipped and the rest still load"""
+        extract_text = PyPDF2.PageObject.extract_text
+
+        def slow_on_page_3(page, *args, **kwargs):
+            text = extract_text(page, *args, **kwargs)
+            if "page 3" in text:
+                time.sleep(30)
+            return text
+
+        expected = PDFLoader(pdf_path).load_documents()
+        # Workers are forked with the patch in place
+        with patch.object(text_utils, "_MP_CONTEXT", multiprocessing.get_context("fork")), \
+                patch.object(PyPDF2.PageObject, "extract_text", slow_on_page_3):
+            started = time.monotonic()
+            loader = PDFLoader(pdf_path, max_workers=2, page_timeout=0.5)
+            pages = loader.load_documents()
+
+        assert time.monotonic() - started < 10
+        assert pages == expected[:2] + [""] + expected[3:]
+        assert list(loader.skipped_pages) == [3]
+        assert "page time budget" in loader.skipped_pages[3]
+
+    def test_document_deadline_keeps_extracted_pages(self, pdf_path):
+        """Test that pages left when the document budget runs out are skipped"""
+        extract_text = PyPDF2.PageObject.extract_text
+
+        def slow_after_page_4(page, *args, **kwargs):
+            text = extract_text(page, *args, **kwargs)
+            if int(text.split()[-1]) > 4:
+                time.sleep(30)
+            return text
+
+        expected = PDFLoader(pdf_path).load_documents()
+        with patch.object(text_utils, "_MP_CONTEXT", multiprocessing.get_context("fork")), \
+                patch.object(PyPDF2.PageObject, "extract_text", slow_after_page_4):
+            loader = PDFLoader(pdf_path, max_workers=1, document_timeout=1.0)
+            pages = loader.load_documents()
+
+        assert pages == expected[:4] + [""] * 8
+        assert sorted(loader.skipped_pages) == list(range(5, 13))
+
+    def test_guarded_workers_are_bounded_across_loaders(self, pdf_path):
+        """Test that concurrent guarded loads share the process-wide worker limit"""
+        created = []
+        live = []
+        peak = []
+        guarded_worker = text_utils._GuardedWorker
+
+        class CountingWorker(guarded_worker):
+            def __init__(self, source):
+                super().__init__(source)
+                created.append(self)
+                live.append(self)
+                peak.append(len(live))
+
+            def close(self, kill=False):
+                live.remove(self)
+                super().close(kill)
+
+        expected = PDFLoader(pdf_path).load_documents()
+        with patch.object(text_utils, "_guarded_slots", threading.BoundedSemaphore(2)), \
+                patch.object(text_utils, "_GuardedWorker", CountingWorker):
+            assert text_utils._MP_CONTEXT.get_start_method() == "spawn"
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                loads = [
+                    executor.submit(PDFLoader(pdf_path, max_workers=4, page_timeout=30).load_documents)
+                    for _ in range(2)
+                ]
+                assert [load.result() for load in loads] == [expected, expected]
+
+        assert created and max(peak) <= 2
+
+    def test_small_guarded_pdf_keeps_its_page_budget(self):
+        """Test that a PDF below the pool threshold still has its slow page cut off, by one worker"""
+        data = make_pdf(["First", "Second", "Third"])
+        extract_text = PyPDF2.PageObject.extract_text
+        created = []
+        guarded_worker = text_utils._GuardedWorker
+
+        class CountingWorker(guarded_worker):
+            def __init__(self, source):
+                super().__init__(source)
+                created.append(self)
+
+        def slow_second_page(page, *args, **kwargs):
+            text = extract_text(page, *args, **kwargs)
+            if "Second" in text:
+                time.sleep(30)
+            return text
+
+        with patch.object(text_utils, "_MP_CONTEXT", multiprocessing.get_context("fork")), \
+                patch.object(text_utils, "_GuardedWorker", CountingWorker), \
+                patch.object(PyPDF2.PageObject, "extract_text", slow_second_page):
+            started = time.monotonic()
+            loader = PDFLoader(data, max_workers=4, page_timeout=0.5)
+            pages = loader.load_documents()
+
+        assert time.monotonic() - started < 10
+        assert [page.strip() for page in pages] == ["First", "", "Third"]
+        assert list(loader.skipped_pages) == [2]
+        # The stuck worker is replaced, never joined by a second one
+        assert len(created) == 2
+
+    def test_small_pdf_without_budgets_is_extracted_inline(self):
+        """Test that PDFs below the pool threshold start no worker process without time budgets"""
+        data = make_pdf(["First", "Second", "Third"])
+
+        with patch.object(text_utils, "_GuardedWorker", side_effect=AssertionError("worker started")):
+            loader = PDFLoader(data, max_workers=4)
+            pages = loader.load_documents()
+
+        assert [page.strip() for page in pages] == ["First", "Second", "Third"]
+        assert loader.skipped_pages == {}
@@ -0,0 +1,98 @@
+import pytest
+
+from backend.aimakerspace.openai_utils.tokens import estimate_tokens, truncate_to_tokens
+from backend.app.models.chat import ChatMessage
+from backend.app.services.prompt_assembler import PromptAssembler, overlap_length
+
+
+class TestPromptAssembler:
+    """Tests for token-budgeted prompt assembly"""
+
+    @pytest.fixture
+    def assembler(self):
+        return PromptAssembler("You are helpful.", context_budget=200, history_budget=40, max_overlap=300)
+
+    def test_estimate_tokens(self):
+        """Test the local token estimator"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("Hello, world!") == 4
+        assert estimate_tokens("x" * 400) == 100
+
+    def test_truncate_to_tokens(self):
+        """Test that truncation fits the budget"""
+        text = "word " * 200
+        assert estimate_tokens(truncate_to_tokens(text, 50)) <= 50
+
+    def test_overlap_length(self):
+        """Test detection of splitter overlap between adjacent chunks"""
+        left = "a" * 50 + "shared overlapping text between chunks"
+        right = "shared overlapping text between chunks" + "b" * 50
+        assert overlap_length(left, right, 300) == len("shared overlapping text between chunks")
+        assert overlap_length("no overlap here at all", "completely different text", 300) == 0
+
+    def test_packs_chunks_within_budget(self, assembler):
+        """Test that chunks are packed in score order until the budget is reached"""
+        chunks = ["first " * 60, "second " * 60, "third " * 10]
+        packed, indices = assembler.pack_chunks(chunks)
+
+        assert indices == [0, 2]
+        assert sum(estimate_tokens(text) for text in packed) <= 200
+
+    def test_trims_adjacent_overlap(self, assembler):
+        """Test that overlapping text between neighbouring chunks is only included once"""
+        shared = "the overlapping region shared by both chunks"
+        chunks = ["Intro text. " + shared, shared + " Closing text."]
+        packed, _ = assembler.pack_chunks(chunks)
+
+        assert packed[1] == "Closing text."
+
+    def test_history_truncated_from_oldest(self, assembler):
+        """Test that the most recent history is kept"""
+        history = [
+            ChatMessage(role="user", content="old question " * 20),
+            ChatMessage(role="assistant", content="recent answer"),
+            ChatMessage(role="user", content="latest question"),
+        ]
+        prompt = assembler.assemble("New question", ["Some context"], history)
+
+        assert prompt["history_messages"] == 2
+        assert prompt["messages"][-1]["content"] == "latest question"
+        assert prompt["messages"][-2]["content"] == "recent answer"
+        assert prompt["prompt_tokens"] > 0
+
+    def test_prefix_cache_layout(self):
+        """Test that the prefix-cache layout keeps per-turn content at the tail"""
+        assembler = PromptAssembler(
+            "You are helpful.", context_budget=200, history_budget=200, layout="prefix_cache"
+        )
+        history = [
+            ChatMessage(role="user", content="First question"),
+            ChatMessage(role="assistant", content="First answer"),
+        ]
+        document = {"filename": "paper.pdf", "page_count": 12}
+
+        first = assembler.assemble("First question", ["Context one"], [], document=document)
+        second = assembler.assemble("Second question", ["Context two"], history, document=document)
+
+        assert "paper.pdf" in second["messages"][1]["content"]
+        assert [m["content"] for m in second["messages"][2:4]] == ["First question", "First answer"]
+        assert "Second question" in second["messages"][-1]["content"]
+        # The stable prefix is shared between turns
+        assert first["messages"][:2] == second["messages"][:2]
+
+    def test_summary_precedes_history(self):
+        """Test that a conversation summary sits just before the recent history"""
+        assembler = PromptAssembler(
+            "You are helpful.", context_budget=200, history_budget=200, layout="prefix_cache"
+        )
+        history = [
+            ChatMessage(role="user", content="Latest question"),
+            ChatMessage(role="assistant", content="Latest answer"),
+        ]
+
+        prompt = assembler.assemble("New question", ["Context"], history, summary="Asked about methods.")
+
+        assert prompt["messages"][1]["role"] == "system"
+        assert "Asked about methods." in prompt["messages"][1]["content"]
+        assert prompt["messages"][2]["content"] == "Latest question"
+        assert prompt["history_messages"] == 2
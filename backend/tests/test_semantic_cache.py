@@ -0,0 +1,85 @@
+import time
+
+import pytest
+import numpy as np
+
+from backend.app.services.semantic_cache import SemanticAnswerCache
+
+
+class TestSemanticAnswerCache:
+    """Tests for the question-embedding answer cache"""
+
+    @pytest.fixture
+    def cache(self):
+        return SemanticAnswerCache(threshold=0.9, max_entries_per_file=2)
+
+    @pytest.fixture
+    def sources(self):
+        return [{"page": 2, "chunk_id": "doc_p2_c0", "content": "Results", "relevance_score": 0.8}]
+
+    def test_similar_question_hits(self, cache, sources):
+        """Test that a paraphrase above the threshold is served"""
+        cache.add("file-1", "What is the main finding?", np.array([1.0, 0.0, 0.0]), "The finding", sources)
+
+        cached = cache.lookup("file-1", "Main result?", np.array([0.99, 0.05, 0.0]))
+
+        assert cached["message"] == "The finding"
+        assert cached["sources"] == sources
+        assert cache.get_stats()["hit_rate"] == 1.0
+
+    def test_dissimilar_question_misses(self, cache, sources):
+        """Test that unrelated questions and other documents miss"""
+        cache.add("file-1", "What is the main finding?", np.array([1.0, 0.0, 0.0]), "The finding", sources)
+
+        assert cache.lookup("file-1", "Who are the authors?", np.array([0.0, 1.0, 0.0])) is None
+        assert cache.lookup("file-2", "What is the main finding?", np.array([1.0, 0.0, 0.0])) is None
+
+    def test_entries_bounded_per_file(self, cache, sources):
+        """Test that the oldest questions are dropped when a document is full"""
+        cache.add("file-1", "first", np.array([1.0, 0.0, 0.0]), "one", sources)
+        cache.add("file-1", "second", np.array([0.0, 1.0, 0.0]), "two", sources)
+        cache.add("file-1", "third", np.array([0.0, 0.0, 1.0]), "three", sources)
+
+        assert list(cache.answers["file-1"]) == ["second", "third"]
+        assert "first" not in cache.indices["file-1"].vectors
+
+    def test_report_false_hit(self, cache, sources):
+        """Test that reported false hits are counted and evicted"""
+        cache.add("file-1", "What is the main finding?", np.array([1.0, 0.0, 0.0]), "The finding", sources)
+        cache.lookup("file-1", "Main result?", np.array([0.99, 0.05, 0.0]))
+
+        assert cache.report_false_hit("file-1", "main result") is True
+        assert cache.report_false_hit("file-1", "main result") is False
+        assert cache.get_stats()["false_hits_reported"] == 1
+        assert cache.lookup("file-1", "Main result?", np.array([0.99, 0.05, 0.0])) is None
+
+    def test_expired_best_match_falls_back_to_the_next(self, cache, sources):
+        """Test that an expired top match is dropped and a valid match below it is served"""
+        cache.add("file-1", "What is the main finding?", np.array([1.0, 0.1, 0.0]), "The finding", sources)
+        cache.add("file-1", "Main result?", np.array([1.0, 0.0, 0.0]), "The result", sources)
+        cache.answers["file-1"]["main result"]["expires_at"] = time.time() - 1
+        cache.answers["file-1"].move_to_end("main result", last=False)
+
+        cached = cache.lookup("file-1", "Main result?", np.array([1.0, 0.0, 0.0]))
+
+        assert cached["message"] == "The finding"
+        assert list(cache.answers["file-1"]) == ["what is the main finding"]
+        assert cache.indices["file-1"].count() == 1
+
+    def test_documents_bounded_by_bytes(self, sources):
+        """Test that the least recently used documents are evicted past the byte budget"""
+        vector = np.array([1.0, 0.0, 0.0])
+        cache = SemanticAnswerCache(threshold=0.9, max_bytes=800)
+        cache.add("file-1", "question", vector, "a" * 200, sources)
+        cache.add("file-2", "question", vector, "b" * 200, sources)
+        cache.lookup("file-1", "question", vector)
+        cache.add("file-3", "question", vector, "c" * 200, sources)
+
+        assert list(cache.answers) == ["file-1", "file-3"]
+        assert "file-2" not in cache.indices
+        assert cache.current_bytes <= 800
+        assert cache.get_stats()["evictions"] == 1
+
+        cache.invalidate_file("file-1")
+        cache.invalidate_file("file-3")
+        assert cache.current_bytes == 0
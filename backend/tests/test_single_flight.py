@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from backend.app.core.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Tests for coalescing identical in-flight requests"""
+
+    @pytest.fixture
+    def flights(self):
+        return SingleFlight()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_upstream_call(self, flights):
+        """Test that identical concurrent calls run once and all get the result"""
+        calls = []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flights.do("q", call) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert [result for result, _ in results] == ["answer"] * 5
+        assert sum(shared for _, shared in results) == 4
+        assert flights.get_stats() == {"in_flight": 0, "upstream_calls": 1, "coalesced": 4}
+
+        # Completed calls are not kept
+        await flights.do("q", call)
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_caller(self, flights):
+        """Test that an upstream failure is raised to all callers"""
+        async def call():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        results = await asyncio.gather(*(flights.do("q", call) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flights.get_stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_fans_out_to_each_subscriber(self, flights):
+        """Test that one upstream stream reaches early and late subscribers in full"""
+        release = asyncio.Event()
+        started = []
+
+        async def events():
+            started.append(1)
+            yield "Hel"
+            await release.wait()
+            yield "lo"
+
+        async def collect():
+            return [event async for event in flights.stream("q", events)]
+
+        first = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.01)
+        # Joins after the first token was produced
+        second = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.01)
+        release.set()
+
+        assert await first == ["Hel", "lo"]
+        assert await second == ["Hel", "lo"]
+        assert len(started) == 1
+        assert flights.get_stats()["coalesced"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_errors_reach_every_subscriber(self, flights):
+        """Test that a stream failure is raised after the events produced before it"""
+        async def events():
+            yield "partial"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("stream broke")
+
+        async def collect():
+            received = []
+            with pytest.raises(RuntimeError):
+                async for event in flights.stream("q", events):
+                    received.append(event)
+            return received
+
+        assert await asyncio.gather(collect(), collect()) == [["partial"], ["partial"]]
+
+    @pytest.mark.asyncio
+    async def test_upstream_cancelled_when_all_callers_leave(self, flights):
+        """Test that the upstream stops only once nobody is waiting for it"""
+        finished = []
+
+        async def call():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                finished.append(1)
+
+        callers = [asyncio.ensure_future(flights.do("q", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        callers[0].cancel()
+        await asyncio.sleep(0.01)
+        assert finished == []
+
+        callers[1].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert finished == [1]
+        assert flights.get_stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_closed_when_all_subscribers_leave(self, flights):
+        """Test that an abandoned stream closes its upstream"""
+        closed = []
+
+        async def events():
+            try:
+                while True:
+                    yield "token"
+                    await asyncio.sleep(0.001)
+            finally:
+                closed.append(1)
+
+        stream = flights.stream("q", events)
+        assert await stream.__anext__() == "token"
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+
+        assert closed == [1]
+        assert flights.get_stats()["in_flight"] == 0
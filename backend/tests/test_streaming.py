@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.app.core.streaming import ClientDisconnected, SSEFrameEncoder, encode_content
+from backend.app.middleware.monitoring import StreamMetricsCollector
+
+
+async def collect(encoder, events):
+    return [frame async for frame in encoder.encode(events)]
+
+
+def parse(frames):
+    return [json.loads(frame[len(b"data: "):].decode()) for frame in frames]
+
+
+class TestSSEFrameEncoder:
+    """Tests for SSE frame coalescing"""
+
+    def test_encode_content_matches_json(self):
+        """Test that pre-encoded frames are valid JSON events"""
+        frame = encode_content('He said "hi"\n')
+        assert frame.endswith(b"\n\n")
+        assert parse([frame.strip()]) == [{"type": "content", "content": 'He said "hi"\n'}]
+
+    @pytest.mark.asyncio
+    async def test_coalesces_by_size(self):
+        """Test that small deltas are merged until the size window is reached"""
+        async def events():
+            yield {"type": "sources", "sources": [{"page": 1}]}
+            for token in ["Hello", " there", ",", " how", " are", " you", " doing", " today?"]:
+                yield {"type": "content", "content": token}
+
+        encoder = SSEFrameEncoder(max_chars=12, max_delay=10)
+        frames = parse(await collect(encoder, events()))
+
+        assert frames[0] == {"type": "sources", "sources": [{"page": 1}]}
+        assert "".join(f["content"] for f in frames[1:]) == "Hello there, how are you doing today?"
+        assert len(frames) - 1 < 8
+        assert encoder.deltas_received == 8
+
+    @pytest.mark.asyncio
+    async def test_flushes_on_time_window(self):
+        """Test that pending content is sent when the upstream stalls"""
+        received = []
+
+        async def events():
+            yield {"type": "content", "content": "a"}
+            await asyncio.sleep(0.2)
+            yield {"type": "content", "content": "b"}
+
+        encoder = SSEFrameEncoder(max_chars=1000, max_delay=0.01)
+        async for frame in encoder.encode(events()):
+            received.append((asyncio.get_running_loop().time(), frame))
+
+        assert [f["content"] for f in parse([frame for _, frame in received])] == ["a", "b"]
+        # The first frame went out before the stalled delta arrived
+        assert received[1][0] - received[0][0] > 0.1
+
+    @pytest.mark.asyncio
+    async def test_other_events_flush_pending_content(self):
+        """Test that event order is preserved around non-content events"""
+        async def events():
+            yield {"type": "content", "content": "partial"}
+            yield {"type": "error", "content": "boom"}
+
+        frames = parse(await collect(SSEFrameEncoder(max_chars=1000, max_delay=10), events()))
+        assert [f["type"] for f in frames] == ["content", "error"]
+
+    @pytest.mark.asyncio
+    async def test_upstream_error_propagates_after_pending_content(self):
+        """Test that content received before an upstream failure is still sent"""
+        async def events():
+            yield {"type": "content", "content": "partial"}
+            raise RuntimeError("upstream failed")
+
+        frames = []
+        with pytest.raises(RuntimeError):
+            async for frame in SSEFrameEncoder(max_chars=1000, max_delay=10).encode(events()):
+                frames.append(frame)
+
+        assert parse(frames) == [{"type": "content", "content": "partial"}]
+
+    @pytest.mark.asyncio
+    async def test_client_disconnect_closes_upstream(self):
+        """Test that a disconnected client stops the upstream stream early"""
+        state = {"closed": False, "produced": 0, "polls": 0}
+
+        async def events():
+            try:
+                while True:
+                    state["produced"] += 1
+                    yield {"type": "content", "content": "token "}
+                    await asyncio.sleep(0.01)
+            finally:
+                state["closed"] = True
+
+        async def is_disconnected():
+            state["polls"] += 1
+            return state["polls"] >= 3
+
+        frames = []
+        with pytest.raises(ClientDisconnected):
+            async for frame in SSEFrameEncoder(max_chars=1000, max_delay=0.005).encode(
+                events(), is_disconnected=is_disconnected, poll_interval=0.02
+            ):
+                frames.append(frame)
+
+        assert frames
+        assert state["closed"] is True
+        produced = state["produced"]
+        await asyncio.sleep(0.05)
+        assert state["produced"] == produced
+
+
+class TestStreamMetricsCollector:
+    """Tests for streamed response outcome metrics"""
+
+    def test_records_aborted_streams(self):
+        """Test that aborts are counted with their duration and deltas"""
+        collector = StreamMetricsCollector()
+        for outcome in ["completed", "aborted", "aborted", "failed"]:
+            collector.stream_started("chat.stream")
+            collector.record_stream("chat.stream", outcome, duration=2.0, deltas=10)
+
+        metrics = collector.get_metrics()
+        chat = metrics["by_endpoint"]["chat.stream"]
+        assert metrics["active_streams"] == 0
+        assert chat["aborted"] == 2
+        assert chat["abort_rate"] == 0.5
+        assert chat["average_seconds_before_abort"] == 2.0
+        assert chat["deltas_before_abort"] == 20
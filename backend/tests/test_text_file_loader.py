@@ -0,0 +1,76 @@
+import pytest
+
+from backend.aimakerspace.text_utils import (
+    CharacterTextSplitter,
+    RecursiveTextSplitter,
+    TextFileLoader,
+    split_stream,
+)
+from backend.tests.test_text_splitter import make_text
+
+
+class TestStreamingTextFileLoader:
+    """Tests for memory-mapped, windowed loading of text files"""
+
+    @pytest.fixture
+    def corpus(self, tmp_path):
+        (tmp_path / "nested").mkdir()
+        (tmp_path / "a.txt").write_text("Grüße, 世界! " * 300 + make_text(4), encoding="utf-8")
+        (tmp_path / "nested" / "b.txt").write_text(make_text(6), encoding="utf-8")
+        (tmp_path / "empty.txt").write_bytes(b"")
+        return tmp_path
+
+    def test_windows_decode_across_character_boundaries(self, corpus):
+        """Test that multi-byte characters split between windows decode intact"""
+        loader = TextFileLoader(str(corpus / "a.txt"))
+        windows = list(loader.iter_windows(str(corpus / "a.txt"), window_bytes=7))
+
+        assert len(windows) > 100
+        assert "".join(windows) == (corpus / "a.txt").read_text(encoding="utf-8")
+        assert list(loader.iter_windows(str(corpus / "empty.txt"))) == []
+
+    def test_streamed_chunks_match_whole_file_chunks(self, corpus):
+        """Test that splitting window by window gives the chunks of the whole text"""
+        text = (corpus / "a.txt").read_text(encoding="utf-8")
+        splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+        windows = [text[i:i + 333] for i in range(0, len(text), 333)]
+
+        assert list(split_stream(splitter, windows)) == splitter.split(text)
+
+    @pytest.mark.parametrize("window", [1, 7, 239, 240, 241, 1000])
+    def test_windows_around_the_chunk_size(self, window):
+        """Test that windows smaller than, equal to and larger than a chunk give the whole text's chunks"""
+        text = make_text(2)
+        splitter = RecursiveTextSplitter(chunk_tokens=60, overlap_tokens=15)
+        windows = [text[i:i + window] for i in range(0, len(text), window)]
+
+        assert list(split_stream(splitter, windows)) == splitter.split(text)
+
+    @pytest.mark.parametrize("text, expected", [
+        # The first chunk looks ahead to a word that is still growing
+        ("xx xx xxxxxxxxxxxx\n", ["xx xx", "xx", "xxxxxxxxxxxx"]),
+        # Whitespace opening a paragraph counts towards its first sentence
+        ("aaaa bbbb.\n\n  xxxxxxx yyyyyyy.\nzz", ["aaaa bbbb.", "xxxxxxx", "yyyyyyy.\nzz"]),
+    ])
+    def test_single_character_windows(self, text, expected):
+        """Test that chunks are held back until no later text can change them"""
+        splitter = RecursiveTextSplitter(chunk_tokens=4, overlap_tokens=1)
+
+        assert list(split_stream(splitter, text)) == splitter.split(text) == expected
+
+    def test_recursive_chunks_are_not_cut_at_windows(self, corpus):
+        """Test that streamed recursive chunks still end on sentences and fit the budget"""
+        splitter = RecursiveTextSplitter(chunk_tokens=120, overlap_tokens=25)
+        loader = TextFileLoader(str(corpus / "nested"))
+
+        chunks = list(loader.iter_chunks(splitter, window_bytes=1000))
+
+        assert chunks == splitter.split(make_text(6))
+
+    def test_iter_chunks_covers_directory(self, corpus):
+        """Test that every .txt file under a directory is streamed"""
+        splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
+        chunks = list(TextFileLoader(str(corpus)).iter_chunks(splitter, window_bytes=256))
+
+        expected = sum(len(document) for document in TextFileLoader(str(corpus)).load_documents())
+        assert sum(len(chunk) for chunk in chunks) == expected
@@ -0,0 +1,60 @@
+import pytest
+
+from backend.aimakerspace.openai_utils.tokens import estimate_tokens
+from backend.aimakerspace.text_utils import CharacterTextSplitter, RecursiveTextSplitter
+
+
+def make_text(paragraphs: int = 12) -> str:
+    return "\n\n".join(
+        " ".join(
+            f"Paragraph {p} sentence {s} " + " ".join(f"w{p}{s}{i}" for i in range(12)) + "."
+            for s in range(6)
+        )
+        for p in range(paragraphs)
+    )
+
+
+class TestRecursiveTextSplitter:
+    """Tests for the token-budget splitter"""
+
+    @pytest.fixture
+    def splitter(self):
+        return RecursiveTextSplitter(chunk_tokens=120, overlap_tokens=25)
+
+    def test_chunks_fit_budget_and_end_on_sentences(self, splitter):
+        """Test that chunks stay within the token budget and never cut a sentence"""
+        chunks = splitter.split(make_text())
+
+        assert all(estimate_tokens(chunk) <= splitter.chunk_tokens for chunk in chunks)
+        assert all(chunk.endswith(".") for chunk in chunks)
+        assert all(chunk.startswith("Paragraph") for chunk in chunks)
+
+    def test_prefers_paragraph_boundaries(self):
+        """Test that a chunk full enough at a paragraph break ends there, without overlap"""
+        text = make_text(paragraphs=3)
+        chunks = RecursiveTextSplitter(chunk_tokens=180, overlap_tokens=25).split(text)
+
+        assert chunks == text.split("\n\n")
+
+    def test_overlap_repeats_whole_sentences(self, splitter):
+        """Test that consecutive chunks within a paragraph share whole sentences"""
+        chunks = splitter.split(make_text(paragraphs=1))
+        assert len(chunks) > 1
+        for previous, current in zip(chunks, chunks[1:]):
+            first_sentence = current.split(". ")[0] + "."
+            assert first_sentence in previous
+
+    def test_fewer_tokens_than_character_splitter(self):
+        """Test that the recursive splitter embeds less text for a similar chunk size"""
+        text = make_text(paragraphs=60)
+        recursive = RecursiveTextSplitter(chunk_tokens=400, overlap_tokens=40).split(text)
+        character = CharacterTextSplitter(chunk_size=1500, chunk_overlap=300).split(text)
+
+        assert sum(map(estimate_tokens, recursive)) < sum(map(estimate_tokens, character))
+
+    def test_oversized_word_is_cut(self, splitter):
+        """Test that text with no boundaries is still cut to the budget"""
+        chunks = splitter.split("x" * 2000)
+
+        assert "".join(chunks) == "x" * 2000
+        assert all(estimate_tokens(chunk) <= splitter.chunk_tokens for chunk in chunks)
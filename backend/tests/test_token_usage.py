@@ -0,0 +1,127 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backend.aimakerspace.openai_utils import embedding
+from backend.aimakerspace.openai_utils.chatmodel import usage_to_dict
+from backend.app.middleware.monitoring import TokenUsageCollector, api_key_id
+from backend.app.services import chat_service_stateless
+from backend.app.services.chat_service_stateless import StatelessChatService
+
+
+class TestTokenUsageCollector:
+    """Tests for per-key and per-endpoint token accounting"""
+
+    def test_usage_to_dict_reads_cached_tokens(self):
+        """Test normalization of an OpenAI usage object"""
+        usage = SimpleNamespace(
+            prompt_tokens=120,
+            completion_tokens=30,
+            total_tokens=150,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=64),
+        )
+        assert usage_to_dict(usage) == {
+            "prompt_tokens": 120,
+            "completion_tokens": 30,
+            "total_tokens": 150,
+            "cached_tokens": 64,
+        }
+        assert usage_to_dict(None) == {}
+
+    def test_aggregates_by_key_and_endpoint(self):
+        """Test that usage is counted in totals, per key and per endpoint"""
+        collector = TokenUsageCollector()
+        usage = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120, "cached_tokens": 50}
+
+        collector.record_usage(usage, "sk-key-one", "chat.message")
+        collector.record_usage(usage, "sk-key-one", "chat.stream")
+        collector.record_usage({}, "sk-key-one", "chat.stream")
+
+        metrics = collector.get_metrics()
+        assert metrics["totals"]["total_tokens"] == 240
+        assert metrics["totals"]["tokens_per_request"] == 120
+        assert metrics["totals"]["prompt_cache_hit_ratio"] == 0.5
+        assert metrics["by_endpoint"]["chat.stream"]["requests"] == 1
+        assert metrics["by_api_key"][api_key_id("sk-key-one")]["requests"] == 2
+        assert metrics["tokens_per_second"] > 0
+
+    def test_key_buckets_are_bounded(self):
+        """Test that inactive keys are folded into the shared bucket"""
+        collector = TokenUsageCollector(max_keys=2)
+        usage = {"prompt_tokens": 10, "total_tokens": 10}
+
+        for key in ["sk-a", "sk-b", "sk-c"]:
+            collector.record_usage(usage, key, "upload.pdf")
+
+        metrics = collector.get_metrics()
+        assert len(metrics["by_api_key"]) == 2
+        assert api_key_id("sk-a") not in metrics["by_api_key"]
+        assert metrics["other_api_keys"]["total_tokens"] == 10
+        assert metrics["totals"]["total_tokens"] == 30
+
+
+class FakeEmbeddingModel:
+    def __init__(self, embeddings_model_name=None):
+        self.last_usage = {}
+
+    async def async_get_embedding(self, text):
+        self.last_usage = {"prompt_tokens": 8, "total_tokens": 8}
+        return [1.0, 0.0]
+
+
+class FakeChatModel:
+    def __init__(self, model_name=None):
+        self.last_usage = {}
+
+    def run(self, messages, **kwargs):
+        self.last_usage = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+        return "An answer"
+
+    async def astream(self, messages, **kwargs):
+        # Usage only arrives with the final chunk
+        for chunk in ["An ", "answer ", "in ", "parts"]:
+            yield chunk
+        self.last_usage = {"prompt_tokens": 100, "completion_tokens": 4, "total_tokens": 104}
+
+
+class TestStatelessUsage:
+    """Tests for the token accounting of stateless chat requests"""
+
+    @pytest.mark.asyncio
+    async def test_non_streaming_call_is_counted_once(self, monkeypatch):
+        """Test that one stateless chat records the embedding and completion once each"""
+        collector = TokenUsageCollector()
+        monkeypatch.setattr(chat_service_stateless, "token_usage_collector", collector)
+        monkeypatch.setattr(chat_service_stateless, "ChatOpenAI", FakeChatModel)
+        monkeypatch.setattr(embedding, "EmbeddingModel", FakeEmbeddingModel)
+
+        await StatelessChatService().generate_response_with_context(
+            "What is this?", ["Some text."], [[1.0, 0.0]], [{"page": 1}], "sk-key-one"
+        )
+
+        metrics = collector.get_metrics()
+        assert metrics["totals"]["total_tokens"] == 128
+        assert metrics["by_api_key"][api_key_id("sk-key-one")]["total_tokens"] == 128
+        assert metrics["by_endpoint"]["stateless.chat"]["requests"] == 2
+        assert "stateless.stream" not in metrics["by_endpoint"]
+
+    @pytest.mark.asyncio
+    async def test_stream_cut_short_is_still_counted(self, monkeypatch):
+        """Test that a stream abandoned before its usage chunk records an estimate"""
+        collector = TokenUsageCollector()
+        monkeypatch.setattr(chat_service_stateless, "token_usage_collector", collector)
+        monkeypatch.setattr(chat_service_stateless, "ChatOpenAI", FakeChatModel)
+        monkeypatch.setattr(embedding, "EmbeddingModel", FakeEmbeddingModel)
+
+        stream = StatelessChatService().generate_stream_with_context(
+            "What is this?", ["Some text."], [[1.0, 0.0]], [{"page": 1}], "sk-key-one"
+        )
+        async for event in stream:
+            if event["type"] == "content":
+                break
+        await stream.aclose()
+
+        usage = collector.get_metrics()["by_endpoint"]["stateless.stream"]
+        assert usage["requests"] == 2
+        assert usage["completion_tokens"] == 1
+        assert usage["prompt_tokens"] > 8
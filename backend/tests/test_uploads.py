@@ -0,0 +1,169 @@
+import hashlib
+import io
+
+import pytest
+from fastapi import UploadFile
+from starlette.requests import Request
+
+from backend.app.core.config import settings
+from backend.app.core.uploads import StreamedFilePart, UploadTooLargeError, receive_upload
+from backend.app.main import app
+
+BOUNDARY = "test-boundary"
+
+
+def multipart_head(filename="paper.pdf"):
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="note"\r\n\r\nfirst draft\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+
+
+MULTIPART_TAIL = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class RequestBody:
+    """An ASGI receive that delivers a body in chunks and counts what was read"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.bytes_read = 0
+
+    async def __call__(self):
+        if not self.chunks:
+            return {"type": "http.disconnect"}
+        chunk = self.chunks.pop(0)
+        self.bytes_read += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": bool(self.chunks)}
+
+
+def upload_scope(path, headers):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+
+
+class CountingFile(io.BytesIO):
+    """A request body that records how much of it was read"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class TestReceiveUpload:
+    """Tests for streaming uploads with a size limit"""
+
+    @pytest.mark.asyncio
+    async def test_streams_to_destination_with_hash(self, tmp_path):
+        """Test that an upload is written to disk and hashed chunk by chunk"""
+        data = bytes(range(256)) * 1000
+        destination = tmp_path / "upload.pdf"
+
+        upload = await receive_upload(
+            UploadFile(io.BytesIO(data)), len(data), destination=destination, chunk_size=4096
+        )
+
+        assert upload.size_bytes == len(data)
+        assert upload.content_hash == hashlib.sha256(data).hexdigest()
+        assert upload.contents is None
+        assert destination.read_bytes() == data
+
+    @pytest.mark.asyncio
+    async def test_in_memory_upload(self):
+        """Test that without a destination the contents are returned"""
+        upload = await receive_upload(UploadFile(io.BytesIO(b"%PDF-1.4 body")), 1024)
+
+        assert upload.contents == b"%PDF-1.4 body"
+        assert upload.content_hash == hashlib.sha256(b"%PDF-1.4 body").hexdigest()
+
+    @pytest.mark.asyncio
+    async def test_oversized_upload_aborts_early(self, tmp_path):
+        """Test that reading stops at the limit and the partial file is removed"""
+        body = CountingFile(b"x" * 100_000)
+        destination = tmp_path / "upload.pdf"
+
+        with pytest.raises(UploadTooLargeError):
+            await receive_upload(UploadFile(body), 10_000, destination=destination, chunk_size=4096)
+
+        assert body.bytes_read <= 10_000 + 4096
+        assert not destination.exists()
+
+
+class TestStreamedUploads:
+    """Tests for reading multipart uploads as the request body arrives"""
+
+    @pytest.mark.asyncio
+    async def test_file_part_is_read_incrementally(self):
+        """Test that the file part is found and read across arbitrarily split body chunks"""
+        data = bytes(range(256)) * 300
+        body = multipart_head() + data + MULTIPART_TAIL
+        request = Request(
+            upload_scope("/", {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}),
+            RequestBody(body[i:i + 37] for i in range(0, len(body), 37))
+        )
+
+        file = await StreamedFilePart(request).start()
+        upload = await receive_upload(file, len(data), chunk_size=1000)
+
+        assert file.filename == "paper.pdf"
+        assert upload.contents == data
+
+    async def post_upload(self, monkeypatch, tmp_path, body, headers):
+        monkeypatch.setattr(settings, "max_upload_size_mb", 1)
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        headers = {
+            "content-type": f"multipart/form-data; boundary={BOUNDARY}",
+            "x-api-key": "sk-test-key-123",
+            **headers,
+        }
+        await app(upload_scope("/api/v1/upload/pdf", headers), body, send)
+        return messages[0]["status"]
+
+    @pytest.mark.asyncio
+    async def test_oversized_upload_rejected_before_body_is_read(self, monkeypatch, tmp_path):
+        """Test that a 413 comes back after about the limit, not after the whole body"""
+        chunk = b"x" * 64 * 1024
+        body = RequestBody([multipart_head()] + [chunk] * 80 + [MULTIPART_TAIL])
+
+        status = await self.post_upload(monkeypatch, tmp_path, body, {})
+
+        assert status == 413
+        assert body.bytes_read <= 1024 * 1024 + 3 * len(chunk)
+        assert len(body.chunks) > 50
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_declared_oversized_upload_is_not_read(self, monkeypatch, tmp_path):
+        """Test that a Content-Length past the limit is refused without reading the body"""
+        body = RequestBody([multipart_head(), b"x" * 64 * 1024])
+
+        status = await self.post_upload(monkeypatch, tmp_path, body, {"content-length": str(5 * 1024 * 1024)})
+
+        assert status == 413
+        assert body.bytes_read == 0
+